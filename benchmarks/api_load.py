@@ -0,0 +1,122 @@
+"""Load test for the banking HTTP API against an in-process server.
+
+Starts api.TestServer on a scratch database, opens a set of accounts, logs
+in to each, then posts deposits and withdrawals with their access tokens
+from many concurrent keep-alive clients:
+
+    python benchmarks/api_load.py --clients 32 --requests 200
+
+Reports throughput and latency percentiles; --output writes them as JSON.
+Nothing outside this process is contacted.
+"""
+import argparse
+import http.client
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+
+
+def _call(conn, method: str, path: str, body=None, token: str = None):
+    headers = {"Content-Type": "application/json"}
+    if token:
+        headers["Authorization"] = f"Bearer {token}"
+    conn.request(method, path, json.dumps(body) if body is not None else None, headers)
+    response = conn.getresponse()
+    return response.status, json.loads(response.read())
+
+
+def _percentile(values: list, fraction: float) -> float:
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+def run(clients: int, requests: int, accounts: int, workers: int) -> dict:
+    from api import TestServer
+    from service import BankingService
+
+    with TestServer(BankingService(), workers=workers) as server:
+        setup = http.client.HTTPConnection(server.host, server.port)
+        numbers = []
+        tokens = {}
+        for i in range(accounts):
+            status, account = _call(setup, "POST", "/accounts", {
+                "name": f"Load {i}", "email": f"load{i}@example.com", "bank_id": "LOAD",
+                "daily_limit": 1_000_000, "ifsc_code": "LOAD0001", "username": f"load{i}", "password": f"load-{i}",
+            })
+            numbers.append(account["account_number"])
+            status, login = _call(setup, "POST", "/login", {"username": f"load{i}", "password": f"load-{i}"})
+            tokens[account["account_number"]] = login["token"]
+        setup.close()
+
+        latencies = []
+        statuses = {}
+        lock = threading.Lock()
+
+        def client(index: int):
+            conn = http.client.HTTPConnection(server.host, server.port)
+            mine = []
+            seen = {}
+            for i in range(requests):
+                account_number = numbers[(index + i) % len(numbers)]
+                kind = "deposit" if i % 3 else "withdraw"
+                started = time.perf_counter()
+                status, _ = _call(conn, "POST", f"/accounts/{account_number}/transactions",
+                                  {"type": kind, "amount": 10, "idempotency_key": f"load:{index}:{i}"},
+                                  tokens[account_number])
+                mine.append(time.perf_counter() - started)
+                seen[status] = seen.get(status, 0) + 1
+            conn.close()
+            with lock:
+                latencies.extend(mine)
+                for status, count in seen.items():
+                    statuses[status] = statuses.get(status, 0) + count
+
+        threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+    return {
+        "clients": clients,
+        "requests": len(latencies),
+        "seconds": round(elapsed, 3),
+        "requests_per_second": round(len(latencies) / elapsed, 1),
+        "latency_p50_ms": round(_percentile(latencies, 0.5) * 1000, 2),
+        "latency_p95_ms": round(_percentile(latencies, 0.95) * 1000, 2),
+        "latency_mean_ms": round(statistics.mean(latencies) * 1000, 2),
+        "statuses": {str(status): count for status, count in sorted(statuses.items())},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=200, help="requests per client")
+    parser.add_argument("--accounts", type=int, default=64)
+    parser.add_argument("--workers", type=int, default=32, help="API thread pool size")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as scratch:
+        os.environ["BANK_DB_PATH"] = os.path.join(scratch, "load.db")
+        results = run(args.clients, args.requests, args.accounts, args.workers)
+
+    for name, value in results.items():
+        print(f"{name:<20} {value}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+"""Headless benchmark of the Streamlit app through AppTest.
+
+Drives the chat, account creation and transaction flows against the fake
+chat backend (CHAT_BACKEND=fake) on a scratch database, and reports:
+
+    rerun latency      every AppTest run, p50/p95
+    time to first token  streamed chat answers, p50/p95
+    flow time          one full account creation / deposit
+    throughput         chat messages per second across N concurrent sessions
+    memory per session Python heap retained per live chat session
+
+    python benchmarks/app_bench.py --output app.json
+    python benchmarks/app_bench.py --baseline app.json --threshold 0.25
+
+With --baseline the script exits with status 1 when a metric is worse than
+the baseline by more than the threshold. AppTest keeps a process-wide
+runtime, so concurrent sessions run in separate worker processes.
+"""
+import argparse
+import gc
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC = os.path.join(ROOT, "src")
+APP = os.path.join(SRC, "main.py")
+
+# Metrics where a larger number is an improvement; every other metric is a cost
+HIGHER_IS_BETTER = {"chat_messages_per_second"}
+
+QUESTIONS = [
+    "explain how upi compares with imps for savings goal {i}",
+    "what documents do I need to open a joint account with my spouse {i}",
+]
+
+
+def configure(scratch: str, latency: float, token_delay: float):
+    os.environ.update(
+        CHAT_BACKEND="fake",
+        FAKE_LLM_LATENCY=str(latency),
+        FAKE_LLM_TOKEN_DELAY=str(token_delay),
+        CHAT_WARM_UP="0",
+        BANK_DB_PATH=os.path.join(scratch, "bench.db"),
+        QR_CACHE_DIR=os.path.join(scratch, "qr"),
+    )
+    if SRC not in sys.path:
+        sys.path.insert(0, SRC)
+
+
+def _percentile(values: list, fraction: float):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+class Session:
+    """One AppTest browser session with every script run timed."""
+
+    def __init__(self, timings: list):
+        from streamlit.testing.v1 import AppTest
+
+        self.timings = timings
+        self.at = AppTest.from_file(APP, default_timeout=60)
+        self._run(self.at)
+
+    def _run(self, element):
+        started = time.perf_counter()
+        self.at = element.run()
+        self.timings.append(time.perf_counter() - started)
+        self._prune(self.at._tree)
+        if self.at.exception:
+            raise RuntimeError(f"App raised: {self.at.exception[0].message}")
+        return self.at
+
+    def _prune(self, node):
+        # A run that ends in st.rerun() leaves the widgets of the interrupted
+        # pass in AppTest's tree; they have no state and break later clicks
+        from streamlit.testing.v1.element_tree import Block, get_widget_state
+
+        for index, child in list(node.children.items()):
+            if isinstance(child, Block):
+                self._prune(child)
+            else:
+                try:
+                    get_widget_state(child)
+                except KeyError:
+                    del node.children[index]
+
+    def click(self, label: str):
+        return self._run(next(button for button in self.at.button if label in button.label).click())
+
+    def fill(self, index: int, value):
+        widgets = self.at.text_input if isinstance(value, str) else self.at.number_input
+        widgets[index].set_value(value)
+
+    def say(self, text: str):
+        return self._run(self.at.chat_input[0].set_value(text))
+
+
+def chat_flow(timings: list, messages: int, tag: str) -> Session:
+    session = Session(timings)
+    session.click("Chat with Assistant")
+    for i in range(messages):
+        session.say(QUESTIONS[i % len(QUESTIONS)].format(i=f"{tag}-{i}"))
+    return session
+
+
+def account_flow(timings: list, tag: str) -> str:
+    session = Session(timings)
+    session.click("Banking Services")
+    session.click("Create Account")
+    session.fill(0, "Bench User")
+    session.click("Continue")
+    session.fill(0, f"bench-{tag}@example.com")
+    session.click("Continue")
+    session.fill(0, "BENCH")
+    session.fill(0, 100000.0)
+    session.fill(1, "BENCH0001")
+    session.click("Continue")
+    session.fill(0, f"bench-{tag}")
+    session.fill(1, "password")
+    session.fill(2, "transaction")
+    session.click("Complete Account Creation")
+    return session.at.session_state["new_account"]
+
+
+def transaction_flow(timings: list, account_number: str):
+    session = Session(timings)
+    session.click("Banking Services")
+    session.click("Make Transaction")
+    session.click("Deposit")
+    session.fill(0, account_number)
+    session.fill(0, 250.0)
+    session.click("Confirm Transaction")
+
+
+def _chat_worker(args):
+    scratch, latency, token_delay, worker, sessions, messages = args
+    configure(scratch, latency, token_delay)
+    # Load the app once so imports don't count against throughput
+    Session([])
+    started = time.time()
+    for i in range(sessions):
+        chat_flow([], messages, f"w{worker}-s{i}")
+    return started, time.time(), sessions * messages
+
+
+def run(args, scratch: str) -> dict:
+    configure(scratch, args.latency, args.token_delay)
+    import streaming
+
+    results = {}
+
+    # Concurrent sessions, one AppTest runtime per worker process. This runs
+    # first: AppTest replaces __main__ here, which the pool needs intact.
+    context = multiprocessing.get_context("spawn")
+    jobs = [
+        (scratch, args.latency, args.token_delay, worker, args.sessions_per_worker, args.messages)
+        for worker in range(args.concurrency)
+    ]
+    with context.Pool(args.concurrency) as pool:
+        windows = pool.map(_chat_worker, jobs)
+    elapsed = max(end for _, end, _ in windows) - min(start for start, _, _ in windows)
+    results["chat_messages_per_second"] = sum(sent for _, _, sent in windows) / elapsed
+
+    # The first run in a process imports the app's dependencies, and the
+    # first chat message the chat stack; cold start is startup.py's concern
+    Session([])
+    import llm
+    llm.get_chat_resources()
+    timings = []
+    started = time.perf_counter()
+    chat_flow(timings, args.messages, "warm")
+    results["chat_session_seconds"] = time.perf_counter() - started
+    stats = streaming.stream_stats()
+    results["ttft_p50_ms"] = stats["ttft_p50"] * 1000
+    results["ttft_p95_ms"] = stats["ttft_p95"] * 1000
+
+    account_times = []
+    transaction_times = []
+    for i in range(args.flows):
+        started = time.perf_counter()
+        account_number = account_flow(timings, f"flow-{i}")
+        account_times.append(time.perf_counter() - started)
+        started = time.perf_counter()
+        transaction_flow(timings, account_number)
+        transaction_times.append(time.perf_counter() - started)
+    results["account_flow_seconds"] = _percentile(account_times, 0.5)
+    results["transaction_flow_seconds"] = _percentile(transaction_times, 0.5)
+
+    results["rerun_p50_ms"] = _percentile(timings, 0.5) * 1000
+    results["rerun_p95_ms"] = _percentile(timings, 0.95) * 1000
+
+    # Heap retained by live sessions; includes AppTest's own element tree
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    live = [chat_flow([], 2, f"mem-{i}") for i in range(args.memory_sessions)]
+    gc.collect()
+    retained = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    results["memory_per_session_kb"] = retained / len(live) / 1024
+
+    return {name: round(value, 3) for name, value in results.items()}
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    regressions = []
+    for name, value in results.items():
+        before = baseline.get(name)
+        if not before:
+            continue
+        if name in HIGHER_IS_BETTER:
+            worse = value < before * (1 - threshold)
+        else:
+            worse = value > before * (1 + threshold)
+        if worse:
+            regressions.append(f"{name}: {before} -> {value}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=5, help="chat messages per session")
+    parser.add_argument("--concurrency", type=int, default=4, help="concurrent session processes")
+    parser.add_argument("--sessions-per-worker", type=int, default=2)
+    parser.add_argument("--flows", type=int, default=5, help="account and transaction flows to time")
+    parser.add_argument("--memory-sessions", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.05, help="fake model time to first token")
+    parser.add_argument("--token-delay", type=float, default=0.005, help="fake model delay between tokens")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="allowed change for the worse as a fraction (default 0.25)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as scratch:
+        results = run(args, scratch)
+
+    for name, value in results.items():
+        print(f"{name:<26} {value}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"python": sys.version.split()[0], "results": results}, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.threshold)
+        for regression in regressions:
+            print(f"regression: {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""Scaling benchmark for bulk transaction import.
+
+Imports generated branch files of increasing size, each into a fresh
+scratch ledger of --accounts accounts, then uploads each one again so
+every row is looked up and found already posted:
+
+    python benchmarks/bulk_import_bench.py --rows 100000,300000,1000000
+
+Both should grow linearly with the file. The script exits with status 1
+when the time per row of either at the largest size is more than
+--max-slowdown times that at the smallest, so a lookup that turns
+quadratic fails the run instead of only getting slower. Index inserts
+cost a little more as the ledger grows, hence the allowance.
+
+Nothing outside this process is contacted.
+"""
+import argparse
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+
+
+def make_file(rows: int, accounts: int) -> bytes:
+    import numpy as np
+    import pandas as pd
+
+    rng = np.random.default_rng(7)
+    frame = pd.DataFrame({
+        "account_number": [f"BENCH{i:06d}" for i in rng.integers(0, accounts, rows)],
+        "type": np.where(rng.random(rows) < 0.3, "withdraw", "deposit"),
+        "amount": rng.integers(1, 500, rows),
+        "reference": [f"r{i}" for i in range(rows)],
+    })
+    out = io.StringIO()
+    frame.to_csv(out, index=False)
+    return out.getvalue().encode()
+
+
+def run_size(rows: int, accounts: int, scratch: str) -> dict:
+    from accounts import AccountStore
+    from bulk_import import BulkImporter
+    from ledger import Ledger
+
+    path = os.path.join(scratch, f"bulk-{rows}.db")
+    ledger = Ledger(path)
+    store = AccountStore(path)
+    # Enough balance and limit that nothing is rejected for money
+    for i in range(accounts):
+        ledger.open_account(f"BENCH{i:06d}", 1e12)
+        ledger.deposit(f"BENCH{i:06d}", 1e9)
+    data = make_file(rows, accounts)
+    importer = BulkImporter(ledger, store)
+
+    started = time.perf_counter()
+    result = importer.run(data, "bench.csv")
+    elapsed = time.perf_counter() - started
+    results = {
+        "rows": rows,
+        "accepted": result.accepted,
+        "seconds": elapsed,
+        "microseconds_per_row": elapsed / rows * 1e6,
+    }
+    started = time.perf_counter()
+    again = importer.run(data, "bench.csv")
+    elapsed = time.perf_counter() - started
+    results.update({
+        "reupload_accepted": again.accepted,
+        "reupload_seconds": elapsed,
+        "reupload_microseconds_per_row": elapsed / rows * 1e6,
+    })
+    return {name: round(value, 3) if isinstance(value, float) else value for name, value in results.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", default="100000,300000", help="comma-separated file sizes, smallest first")
+    parser.add_argument("--accounts", type=int, default=1000)
+    parser.add_argument("--max-slowdown", type=float, default=2.0,
+                        help="largest allowed ratio of time per row, largest size over smallest")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    args = parser.parse_args()
+    sizes = sorted(int(size) for size in args.rows.split(","))
+
+    runs = []
+    with tempfile.TemporaryDirectory() as scratch:
+        for size in sizes:
+            runs.append(run_size(size, args.accounts, scratch))
+            print(" ".join(f"{name}={value}" for name, value in runs[-1].items()))
+
+    print()
+    slowdown = 1.0
+    for measure in ("microseconds_per_row", "reupload_microseconds_per_row"):
+        growth = runs[-1][measure] / runs[0][measure]
+        print(f"{measure} grew {growth:.2f}x from {sizes[0]:,} to {sizes[-1]:,} rows")
+        slowdown = max(slowdown, growth)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"runs": runs, "slowdown": round(slowdown, 3)}, f, indent=2)
+    if len(sizes) > 1 and slowdown > args.max_slowdown:
+        print(f"Regression: more than the allowed {args.max_slowdown:g}x")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
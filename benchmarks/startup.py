@@ -0,0 +1,94 @@
+"""Cold-start benchmark for the app.
+
+Times, in fresh interpreters, how long it takes to import the app module and
+the chat stack it loads lazily. Results are written as JSON so they can be
+kept next to a release and compared against later runs:
+
+    python benchmarks/startup.py --output startup.json
+    python benchmarks/startup.py --baseline startup.json --threshold 0.2
+
+With --baseline the script exits with status 1 when a median regresses by
+more than the threshold.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC = os.path.join(ROOT, "src")
+
+# Statement each case runs after the interpreter is up
+CASES = {
+    "import_main": "import main",
+    "import_chat_stack": "import llm; llm.ChatResources(llm.create_chat_model(), 1, 1)",
+}
+
+TIMER = """
+import time
+started = time.perf_counter()
+{statement}
+print(time.perf_counter() - started)
+"""
+
+
+def run_case(statement: str, repeat: int) -> list:
+    # The hosted backend is built but never called
+    env = dict(os.environ, PYTHONPATH=SRC, CHAT_WARM_UP="0", CHAT_BACKEND="groq", GROQ_API_KEY="benchmark")
+    timings = []
+    for _ in range(repeat):
+        result = subprocess.run(
+            [sys.executable, "-c", TIMER.format(statement=statement)],
+            cwd=ROOT, env=env, capture_output=True, text=True, check=True
+        )
+        timings.append(float(result.stdout.strip().splitlines()[-1]))
+    return timings
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    regressions = []
+    for name, result in results.items():
+        before = baseline.get(name, {}).get("median")
+        if before and result["median"] > before * (1 + threshold):
+            regressions.append(f"{name}: {before:.3f}s -> {result['median']:.3f}s")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="allowed slowdown of a median as a fraction (default 0.2)")
+    args = parser.parse_args()
+
+    results = {}
+    for name, statement in CASES.items():
+        timings = run_case(statement, args.repeat)
+        results[name] = {
+            "median": statistics.median(timings),
+            "min": min(timings),
+            "max": max(timings),
+            "runs": timings,
+        }
+        print(f"{name:<20} median {results[name]['median']:.3f}s  min {results[name]['min']:.3f}s")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"python": sys.version.split()[0], "results": results}, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.threshold)
+        for regression in regressions:
+            print(f"regression: {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
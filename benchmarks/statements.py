@@ -0,0 +1,112 @@
+"""Benchmark of statements and analytics on a long account history.
+
+Fills one account on a scratch database with --entries ledger entries,
+spread over --days days, then times:
+
+    statement pages    first, middle and last page of the paged statement
+    date range         a one-day statement from the middle of the history
+    analytics          balance, limit utilization and daily/monthly totals
+    csv export         the whole statement streamed as CSV
+    posting            single deposits, which also update the totals
+
+    python benchmarks/statements.py --entries 100000 --output statements.json
+
+Nothing outside this process is contacted.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+
+BATCH = 10_000
+
+
+def _median_ms(func, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings) * 1000
+
+
+def fill(ledger, account_number: str, entries: int, days: int):
+    # Entries go in through the batch path, with their timestamps spread
+    # back over days so the daily totals have something to page through
+    from unittest import mock
+
+    start = time.time() - days * 86400
+    step = days * 86400 / entries
+    balance = 0
+    for offset in range(0, entries, BATCH):
+        count = min(BATCH, entries - offset)
+        batch = []
+        for i in range(count):
+            balance += 100
+            batch.append((account_number, "deposit", 100, balance, None))
+        version = ledger.snapshot([account_number])[account_number].version
+        with mock.patch("ledger.time.time", return_value=start + offset * step):
+            ledger.post_batch(batch, {account_number: (version, balance, count, 0)})
+
+
+def run(entries: int, days: int, repeat: int) -> dict:
+    from service import BankingService
+
+    service = BankingService()
+    account = service.create_account({
+        "name": "Statement Bench", "email": "statements@example.com", "bank_id": "BENCH",
+        "daily_limit": 1_000_000, "ifsc_code": "BENCH0001", "username": "statements",
+    })
+    number = account.account_number
+
+    started = time.perf_counter()
+    fill(service.ledger, number, entries, days)
+    results = {"fill_seconds": time.perf_counter() - started}
+
+    middle = entries // 2
+    middle_day = time.strftime("%Y-%m-%d", time.gmtime(time.time() - days * 86400 / 2))
+    results["first_page_ms"] = _median_ms(lambda: service.statement(number, None, 50), repeat)
+    results["middle_page_ms"] = _median_ms(lambda: service.statement(number, middle, 50), repeat)
+    results["last_page_ms"] = _median_ms(lambda: service.statement(number, 51, 50), repeat)
+    results["day_range_page_ms"] = _median_ms(
+        lambda: service.statement(number, None, 50, since=middle_day, until=middle_day), repeat
+    )
+    results["analytics_ms"] = _median_ms(lambda: service.account_analytics(number, 30, 12), repeat)
+
+    started = time.perf_counter()
+    size = sum(len(chunk) for chunk in service.statement_csv(number))
+    elapsed = time.perf_counter() - started
+    results["csv_rows_per_second"] = entries / elapsed
+    results["csv_megabytes"] = size / 1e6
+
+    results["deposit_ms"] = _median_ms(lambda: service.transact(number, "deposit", 1), repeat)
+    return {name: round(value, 3) for name, value in results.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--entries", type=int, default=100_000)
+    parser.add_argument("--days", type=int, default=365, help="days the history is spread over")
+    parser.add_argument("--repeat", type=int, default=20, help="runs per timed query")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as scratch:
+        os.environ["BANK_DB_PATH"] = os.path.join(scratch, "statements.db")
+        results = run(args.entries, args.days, args.repeat)
+
+    for name, value in results.items():
+        print(f"{name:<20} {value}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+import sqlite3
+import threading
+import time
+from typing import NamedTuple, Optional
+
+from db import connect, database_path
+
+ACCOUNT_PREFIX = "7"
+
+# Fields with a unique index, in the order the wizard collects them
+UNIQUE_FIELDS = ("email", "upi_id", "login_id", "username")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS accounts (
+    id INTEGER PRIMARY KEY,
+    account_number TEXT NOT NULL UNIQUE,
+    name TEXT NOT NULL,
+    email TEXT NOT NULL UNIQUE COLLATE NOCASE,
+    bank_id TEXT NOT NULL,
+    daily_limit REAL NOT NULL,
+    ifsc_code TEXT NOT NULL,
+    upi_id TEXT UNIQUE COLLATE NOCASE,
+    login_id TEXT UNIQUE,
+    agent_id TEXT,
+    username TEXT NOT NULL UNIQUE COLLATE NOCASE,
+    otp_access INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS accounts_agent ON accounts(agent_id);
+
+-- Password hashes only; see credentials.py
+CREATE TABLE IF NOT EXISTS account_credentials (
+    account_number TEXT NOT NULL REFERENCES accounts(account_number),
+    kind TEXT NOT NULL CHECK (kind IN ('login', 'transaction')),
+    hash TEXT NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (account_number, kind)
+) WITHOUT ROWID;
+"""
+
+COLUMNS = (
+    "account_number", "name", "email", "bank_id", "daily_limit", "ifsc_code",
+    "upi_id", "login_id", "agent_id", "username", "otp_access", "created_at",
+)
+
+
+class Account(NamedTuple):
+    account_number: str
+    name: str
+    email: str
+    bank_id: str
+    daily_limit: float
+    ifsc_code: str
+    upi_id: Optional[str]
+    login_id: Optional[str]
+    agent_id: Optional[str]
+    username: str
+    otp_access: bool
+    created_at: float
+
+
+class DuplicateAccountField(ValueError):
+    def __init__(self, field: str):
+        super().__init__(f"That {field.replace('_', ' ')} is already registered")
+        self.field = field
+
+
+def luhn_digit(digits: str) -> str:
+    total = 0
+    for i, digit in enumerate(reversed(digits)):
+        value = int(digit)
+        if i % 2 == 0:
+            value *= 2
+            if value > 9:
+                value -= 9
+        total += value
+    return str((10 - total % 10) % 10)
+
+
+def format_account_number(sequence: int) -> str:
+    body = f"{ACCOUNT_PREFIX}{sequence:08d}"
+    return body + luhn_digit(body)
+
+
+def is_valid_account_number(account_number: str) -> bool:
+    # Catches typos before they reach an index lookup
+    return (
+        len(account_number) == len(ACCOUNT_PREFIX) + 9
+        and account_number.isdigit()
+        and luhn_digit(account_number[:-1]) == account_number[-1]
+    )
+
+
+class AccountStore:
+    """Account repository with unique indexes on every identifying field.
+
+    Account numbers are derived from the row sequence plus a Luhn check
+    digit, so they can never collide.
+    """
+
+    def __init__(self, path: str = None):
+        self.path = path or database_path()
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        # Durable, as the ledger row for a new account commits with it
+        self._writer = connect(self.path, durable=True)
+        self._writer.executescript(SCHEMA)
+
+    def _reader(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = connect(self.path)
+        return conn
+
+    def exists(self, field: str, value: str) -> bool:
+        if field not in UNIQUE_FIELDS + ("account_number",):
+            raise ValueError(f"{field} is not an indexed account field")
+        row = self._reader().execute(f"SELECT 1 FROM accounts WHERE {field} = ?", (value,)).fetchone()
+        return row is not None
+
+    def get(self, account_number: str) -> Optional[Account]:
+        return self.find_by("account_number", account_number)
+
+    def find_by(self, field: str, value: str) -> Optional[Account]:
+        if field not in UNIQUE_FIELDS + ("account_number",):
+            raise ValueError(f"{field} is not an indexed account field")
+        row = self._reader().execute(
+            f"SELECT {', '.join(COLUMNS)} FROM accounts WHERE {field} = ?", (value,)
+        ).fetchone()
+        return _to_account(row) if row else None
+
+    def count_by_agent(self, agent_id: str) -> int:
+        row = self._reader().execute("SELECT COUNT(*) FROM accounts WHERE agent_id = ?", (agent_id,)).fetchone()
+        return row[0]
+
+    def credential(self, account_number: str, kind: str) -> Optional[str]:
+        row = self._reader().execute(
+            "SELECT hash FROM account_credentials WHERE account_number = ? AND kind = ?", (account_number, kind)
+        ).fetchone()
+        return row[0] if row else None
+
+    def with_credential(self, account_numbers, kind: str) -> set:
+        """Which of account_numbers have a credential of kind."""
+        conn = self._reader()
+        account_numbers = list(account_numbers)
+        found = set()
+        for start in range(0, len(account_numbers), 500):
+            chunk = account_numbers[start:start + 500]
+            found.update(row[0] for row in conn.execute(
+                f"SELECT account_number FROM account_credentials "
+                f"WHERE kind = ? AND account_number IN ({', '.join('?' * len(chunk))})",
+                (kind, *chunk)
+            ))
+        return found
+
+    def set_credential(self, account_number: str, kind: str, encoded: str):
+        with self._write_lock:
+            self._writer.execute(
+                "INSERT INTO account_credentials (account_number, kind, hash, updated_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(account_number, kind) DO UPDATE SET hash = excluded.hash, updated_at = excluded.updated_at",
+                (account_number, kind, encoded, time.time())
+            )
+
+    def create(self, data: dict, credentials: dict = None, on_create=None) -> Account:
+        """Insert the account, and its {kind: hash} credentials in the same transaction.
+
+        on_create(conn, account) runs inside that transaction too; if it
+        raises, nothing is written.
+        """
+        values = {column: data.get(column) or None for column in COLUMNS}
+        values["daily_limit"] = float(data["daily_limit"])
+        values["otp_access"] = 1 if data.get("otp_access") else 0
+        values["created_at"] = time.time()
+
+        with self._write_lock:
+            conn = self._writer
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                sequence = conn.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM accounts").fetchone()[0]
+                values["account_number"] = format_account_number(sequence)
+                conn.execute(
+                    f"INSERT INTO accounts (id, {', '.join(COLUMNS)}) VALUES (?, {', '.join('?' * len(COLUMNS))})",
+                    (sequence, *(values[column] for column in COLUMNS))
+                )
+                conn.executemany(
+                    "INSERT INTO account_credentials (account_number, kind, hash, updated_at) VALUES (?, ?, ?, ?)",
+                    (
+                        (values["account_number"], kind, encoded, values["created_at"])
+                        for kind, encoded in (credentials or {}).items()
+                    )
+                )
+                if on_create is not None:
+                    on_create(conn, _to_account(tuple(values[column] for column in COLUMNS)))
+                conn.execute("COMMIT")
+            except sqlite3.IntegrityError as e:
+                conn.execute("ROLLBACK")
+                # "UNIQUE constraint failed: accounts.email"
+                field = str(e).rsplit(".", 1)[-1]
+                if field in UNIQUE_FIELDS:
+                    raise DuplicateAccountField(field) from e
+                raise
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return _to_account(tuple(values[column] for column in COLUMNS))
+
+
+def _to_account(row) -> Account:
+    account = Account(*row)
+    return account._replace(otp_access=bool(account.otp_access))
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_account_store() -> AccountStore:
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = AccountStore()
+    return _store
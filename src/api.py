@@ -0,0 +1,441 @@
+"""HTTP/JSON API over the banking service.
+
+    python src/api.py --port 8080
+
+Routes:
+    GET  /health
+    POST /accounts                              create an account; "password" and "trxn_password" are hashed
+    POST /login                                 {"username", "password"}; returns an access token
+    GET  /accounts/{account_number}             account details and balance
+    POST /accounts/{account_number}/transactions  {"type", "amount", "idempotency_key", "trxn_password"}
+    GET  /accounts/{account_number}/statement   ?cursor&limit&since&until, newest first
+    GET  /accounts/{account_number}/statement.csv  ?since&until, streamed oldest first
+    GET  /accounts/{account_number}/analytics   ?days&months
+    GET  /agents/{agent_id}/analytics           ?days&months
+    POST /chat                                  {"session_id", "message", "priority"}
+    GET  /metrics                               Prometheus text, see metrics.py
+
+Query parameters are passed to handlers alongside the JSON body's fields.
+
+Every route under /accounts/{account_number}/ needs the token /login returned
+for that account, sent as "Authorization: Bearer <token>". Without it,
+GET /accounts/{account_number} leaves out the owner's contact details and
+balance.
+
+The server is plain asyncio with keep-alive connections. Service calls block
+on SQLite or the model, so they run on a thread pool sized by API_WORKERS
+while the event loop keeps accepting and parsing requests.
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from http import HTTPStatus
+from urllib.parse import parse_qsl, unquote
+
+import metrics
+from accounts import DuplicateAccountField
+from credentials import CredentialsBusy, InvalidCredentials
+from ledger import DailyLimitExceeded, IdempotencyConflict, InsufficientFunds, LedgerError, UnknownAccount
+from llm import ChatBusyError, ChatConfigError
+from service import AccessDenied, AuthenticationRequired, ValidationError, get_banking_service
+
+MAX_BODY_BYTES = 1 << 20
+MAX_HEADER_LINES = 100
+KEEP_ALIVE_TIMEOUT = 15
+
+# Who may call a route: anyone, only the owner of the account in its path,
+# or anyone with the owner seeing more
+PUBLIC = "public"
+OWNER = "owner"
+OWNER_SEES_ALL = "owner_sees_all"
+
+# Most specific first
+ERROR_STATUS = (
+    (ValidationError, HTTPStatus.BAD_REQUEST),
+    (AuthenticationRequired, HTTPStatus.UNAUTHORIZED),
+    (AccessDenied, HTTPStatus.FORBIDDEN),
+    (UnknownAccount, HTTPStatus.NOT_FOUND),
+    (DuplicateAccountField, HTTPStatus.CONFLICT),
+    (IdempotencyConflict, HTTPStatus.CONFLICT),
+    (InvalidCredentials, HTTPStatus.FORBIDDEN),
+    (InsufficientFunds, HTTPStatus.UNPROCESSABLE_ENTITY),
+    (DailyLimitExceeded, HTTPStatus.UNPROCESSABLE_ENTITY),
+    (LedgerError, HTTPStatus.BAD_REQUEST),
+    (ChatBusyError, HTTPStatus.SERVICE_UNAVAILABLE),
+    (ChatConfigError, HTTPStatus.SERVICE_UNAVAILABLE),
+    (CredentialsBusy, HTTPStatus.SERVICE_UNAVAILABLE),
+)
+
+
+API_REQUESTS = metrics.counter("api_requests_total", "HTTP API requests", ("method", "route", "status"))
+API_LATENCY = metrics.histogram("api_request_seconds", "HTTP API request latency", ("route",))
+API_IN_FLIGHT = metrics.gauge("api_requests_in_flight", "HTTP API requests being handled")
+
+
+class HTTPError(Exception):
+    def __init__(self, status: HTTPStatus, message: str = None):
+        super().__init__(message or status.phrase)
+        self.status = status
+
+
+class BankingAPI:
+    """Routes HTTP requests to a BankingService."""
+
+    def __init__(self, service=None, workers: int = 32):
+        self.service = service or get_banking_service()
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="api")
+        self.routes = [
+            ("GET", re.compile(r"/health"), self.health, PUBLIC),
+            ("POST", re.compile(r"/accounts"), self.create_account, PUBLIC),
+            ("POST", re.compile(r"/login"), self.login, PUBLIC),
+            ("GET", re.compile(r"/accounts/(\d+)"), self.get_account, OWNER_SEES_ALL),
+            ("POST", re.compile(r"/accounts/(\d+)/transactions"), self.transact, OWNER),
+            ("GET", re.compile(r"/accounts/(\d+)/statement"), self.statement, OWNER),
+            ("GET", re.compile(r"/accounts/(\d+)/statement\.csv"), self.statement_csv, OWNER),
+            ("GET", re.compile(r"/accounts/(\d+)/analytics"), self.account_analytics, OWNER),
+            ("GET", re.compile(r"/agents/([^/]+)/analytics"), self.agent_analytics, PUBLIC),
+            ("POST", re.compile(r"/chat"), self.chat, PUBLIC),
+            ("GET", re.compile(r"/metrics"), self.export_metrics, PUBLIC),
+        ]
+
+    # Handlers run on the thread pool and return (status, payload)
+
+    def health(self, body):
+        return HTTPStatus.OK, {"status": "ok"}
+
+    def create_account(self, body):
+        account = self.service.create_account(body)
+        return HTTPStatus.CREATED, account._asdict()
+
+    def login(self, body):
+        account = self.service.authenticate(body.get("username"), body.get("password"))
+        return HTTPStatus.OK, {**self.service.issue_token(account.account_number), "account": account._asdict()}
+
+    def get_account(self, body, account_number, owner=False):
+        return HTTPStatus.OK, self.service.get_account(account_number, owner=owner)
+
+    def transact(self, body, account_number):
+        posting = self.service.transact(
+            account_number, body.get("type"), body.get("amount"), body.get("idempotency_key"),
+            body.get("trxn_password")
+        )
+        # A replayed idempotency key returns the original posting
+        return HTTPStatus.OK if posting.duplicate else HTTPStatus.CREATED, posting._asdict()
+
+    def statement(self, body, account_number):
+        return HTTPStatus.OK, self.service.statement(
+            account_number, body.get("cursor"), body.get("limit", 50), body.get("since"), body.get("until")
+        )
+
+    def statement_csv(self, body, account_number):
+        chunks = self.service.statement_csv(account_number, body.get("since"), body.get("until"))
+        return HTTPStatus.OK, _Stream(chunks, "text/csv", f"statement-{account_number}.csv")
+
+    def account_analytics(self, body, account_number):
+        return HTTPStatus.OK, self.service.account_analytics(
+            account_number, body.get("days", 30), body.get("months", 12)
+        )
+
+    def agent_analytics(self, body, agent_id):
+        return HTTPStatus.OK, self.service.agent_analytics(
+            unquote(agent_id), body.get("days", 30), body.get("months", 12)
+        )
+
+    def export_metrics(self, body):
+        # Prometheus text exposition rather than JSON
+        return HTTPStatus.OK, _Text(metrics.render_prometheus())
+
+    def chat(self, body):
+        session_id = body.get("session_id")
+        if not session_id:
+            raise ValidationError("session_id is required")
+        return HTTPStatus.OK, self.service.chat(
+            str(session_id), body.get("message"), body.get("priority", "interactive")
+        )
+
+    async def dispatch(self, method: str, path: str, body: bytes, query: str = "", headers: dict = None):
+        allowed = False
+        for route_method, pattern, handler, access in self.routes:
+            match = pattern.fullmatch(path)
+            if match is None:
+                continue
+            if route_method != method:
+                allowed = True
+                continue
+            try:
+                payload = json.loads(body) if body else {}
+            except ValueError:
+                raise HTTPError(HTTPStatus.BAD_REQUEST, "Request body must be JSON")
+            if not isinstance(payload, dict):
+                raise HTTPError(HTTPStatus.BAD_REQUEST, "Request body must be a JSON object")
+            if query:
+                payload = {**dict(parse_qsl(query)), **payload}
+            if access != PUBLIC:
+                token = _bearer_token(headers or {})
+                if access == OWNER:
+                    self.service.authorize(token, match.group(1))
+                else:
+                    owner = token is not None and self.service.token_account(token) == match.group(1)
+                    handler = partial(handler, owner=owner)
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, handler, payload, *match.groups())
+        raise HTTPError(HTTPStatus.METHOD_NOT_ALLOWED if allowed else HTTPStatus.NOT_FOUND)
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                try:
+                    request = await asyncio.wait_for(_read_request(reader), KEEP_ALIVE_TIMEOUT)
+                except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+                    break
+                if request is None:
+                    break
+                method, path, query, headers, body = request
+                started = time.perf_counter()
+                with API_IN_FLIGHT.track():
+                    try:
+                        status, payload = await self.dispatch(method, path, body, query, headers)
+                    except HTTPError as e:
+                        status, payload = e.status, {"error": str(e)}
+                    except Exception as e:
+                        status = _error_status(e)
+                        payload = {"error": str(e) if status != HTTPStatus.INTERNAL_SERVER_ERROR else status.phrase}
+                if metrics.ENABLED:
+                    route = self.route_name(path)
+                    API_REQUESTS.inc(method=method, route=route, status=status.value)
+                    API_LATENCY.observe(time.perf_counter() - started, route=route)
+                keep_alive = headers.get("connection", "").lower() != "close"
+                if isinstance(payload, _Stream):
+                    keep_alive = await self.send_stream(writer, status, payload, keep_alive)
+                else:
+                    writer.write(_response(status, payload, keep_alive))
+                    await writer.drain()
+                if not keep_alive:
+                    break
+        except HTTPError as e:
+            writer.write(_response(e.status, {"error": str(e)}, keep_alive=False))
+        except (ConnectionError, asyncio.CancelledError):
+            # Client went away, or the server is shutting down
+            pass
+        finally:
+            writer.close()
+
+    async def send_stream(self, writer: asyncio.StreamWriter, status: HTTPStatus, payload: "_Stream",
+                          keep_alive: bool) -> bool:
+        """Send payload with chunked encoding, pulling each chunk on the thread pool.
+
+        Returns whether the connection can be kept alive afterwards.
+        """
+        loop = asyncio.get_running_loop()
+        headers = {"Transfer-Encoding": "chunked"}
+        if payload.filename:
+            headers["Content-Disposition"] = f'attachment; filename="{payload.filename}"'
+        writer.write(_head(status, payload.content_type, headers, keep_alive))
+        try:
+            while True:
+                chunk = await loop.run_in_executor(self.executor, next, payload.chunks, None)
+                if chunk is None:
+                    break
+                if chunk:
+                    data = chunk.encode()
+                    writer.write(f"{len(data):X}\r\n".encode("latin-1") + data + b"\r\n")
+                    await writer.drain()
+        except ConnectionError:
+            raise
+        except Exception:
+            # The status line is already sent; cutting the body short is all that's left
+            return False
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+        return keep_alive
+
+    def route_name(self, path: str) -> str:
+        # The pattern rather than the path, so account numbers don't become labels
+        for _, pattern, _, _ in self.routes:
+            if pattern.fullmatch(path):
+                return pattern.pattern
+        return "unmatched"
+
+    async def serve(self, host: str = "127.0.0.1", port: int = 8080) -> asyncio.AbstractServer:
+        return await asyncio.start_server(self.handle_connection, host, port, reuse_address=True)
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+
+
+async def _read_request(reader: asyncio.StreamReader):
+    request_line = await reader.readline()
+    if not request_line:
+        return None
+    try:
+        method, target, _ = request_line.decode("latin-1").split(" ", 2)
+    except ValueError:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, "Malformed request line")
+
+    headers = {}
+    for _ in range(MAX_HEADER_LINES):
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    else:
+        raise HTTPError(HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE)
+
+    if "chunked" in headers.get("transfer-encoding", "").lower():
+        raise HTTPError(HTTPStatus.LENGTH_REQUIRED, "Chunked request bodies are not supported")
+    try:
+        length = int(headers.get("content-length", "0"))
+    except ValueError:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, "Invalid Content-Length")
+    if length > MAX_BODY_BYTES:
+        raise HTTPError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE)
+    body = await reader.readexactly(length) if length else b""
+    path, _, query = target.partition("?")
+    return method.upper(), path.rstrip("/") or "/", query, headers, body
+
+
+def _bearer_token(headers: dict):
+    scheme, _, token = headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token.strip():
+        return None
+    return token.strip()
+
+
+def _error_status(error: Exception) -> HTTPStatus:
+    for error_type, status in ERROR_STATUS:
+        if isinstance(error, error_type):
+            return status
+    return HTTPStatus.INTERNAL_SERVER_ERROR
+
+
+class _Text(str):
+    """A handler result sent as plain text instead of JSON."""
+
+
+class _Stream:
+    """A handler result sent chunk by chunk from an iterator of str, for bodies too big to build up front."""
+
+    def __init__(self, chunks, content_type: str, filename: str = None):
+        self.chunks = iter(chunks)
+        self.content_type = content_type
+        self.filename = filename
+
+
+def _head(status: HTTPStatus, content_type: str, headers: dict, keep_alive: bool) -> bytes:
+    lines = [f"HTTP/1.1 {status.value} {status.phrase}", f"Content-Type: {content_type}"]
+    lines.extend(f"{name}: {value}" for name, value in headers.items())
+    lines.append(f"Connection: {'keep-alive' if keep_alive else 'close'}")
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+
+def _response(status: HTTPStatus, payload, keep_alive: bool = True) -> bytes:
+    if isinstance(payload, _Text):
+        body = payload.encode()
+        content_type = "text/plain; version=0.0.4"
+    else:
+        body = json.dumps(payload).encode()
+        content_type = "application/json"
+    headers = {"Content-Length": len(body)}
+    if status == HTTPStatus.UNAUTHORIZED:
+        headers["WWW-Authenticate"] = "Bearer"
+    return _head(status, content_type, headers, keep_alive) + body
+
+
+class TestServer:
+    """Runs the API on its own event loop thread, for tests and load runs.
+
+        with TestServer() as server:
+            urllib.request.urlopen(f"{server.url}/health")
+
+    Binds an ephemeral port on localhost unless one is given.
+    """
+
+    __test__ = False
+
+    def __init__(self, service=None, host: str = "127.0.0.1", port: int = 0, workers: int = 32):
+        self.api = BankingAPI(service, workers=workers)
+        self.host = host
+        self.port = port
+        self._loop = None
+        self._server = None
+        self._thread = None
+        self._ready = threading.Event()
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def start(self) -> "TestServer":
+        self._thread = threading.Thread(target=self._run, name="api-test-server", daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        return self
+
+    def _run(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._server = self._loop.run_until_complete(self.api.serve(self.host, self.port))
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._ready.set()
+        try:
+            self._loop.run_forever()
+        finally:
+            self._server.close()
+            # Drop idle keep-alive connections so the loop can close cleanly
+            connections = asyncio.all_tasks(self._loop)
+            for task in connections:
+                task.cancel()
+            self._loop.run_until_complete(asyncio.gather(*connections, return_exceptions=True))
+            self._loop.run_until_complete(self._server.wait_closed())
+            self._loop.close()
+
+    def stop(self):
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._loop = None
+        self.api.close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+async def serve_forever(host: str, port: int, workers: int):
+    api = BankingAPI(workers=workers)
+    metrics.start_exporters()
+    server = await api.serve(host, port)
+    print(f"Serving banking API on http://{host}:{port}")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        api.close()
+
+
+def main():
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Banking service HTTP/JSON API")
+    parser.add_argument("--host", default=os.getenv('API_HOST', '127.0.0.1'))
+    parser.add_argument("--port", type=int, default=int(os.getenv('API_PORT', '8080')))
+    parser.add_argument("--workers", type=int, default=int(os.getenv('API_WORKERS', '32')))
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve_forever(args.host, args.port, args.workers))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,268 @@
+import hashlib
+import io
+from concurrent.futures import Future
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+from accounts import get_account_store
+from ledger import MAX_CENTS, AccountSnapshot, StaleSnapshot, get_ledger
+
+CHUNK_ROWS = 100_000
+MAX_PASSES = 32
+# Times a chunk is validated again after other postings made it stale
+MAX_RETRIES = 8
+REQUIRED_COLUMNS = ("account_number", "type", "amount")
+
+TYPE_ALIASES = {
+    "deposit": "deposit",
+    "credit": "deposit",
+    "withdraw": "withdraw",
+    "withdrawal": "withdraw",
+    "debit": "withdraw",
+}
+
+
+class BulkImportError(ValueError):
+    pass
+
+
+class _Pending(NamedTuple):
+    future: object
+    chunk: pd.DataFrame
+    accepted: int
+    rejected: pd.DataFrame
+    overlay: dict
+    keys: set
+
+
+class ImportResult(NamedTuple):
+    total: int
+    accepted: int
+    rejected: int
+    report: bytes
+
+
+def read_chunks(data: bytes, filename: str, chunk_rows: int = CHUNK_ROWS):
+    """Yield DataFrames of at most chunk_rows rows from a CSV or Parquet file."""
+    if filename.lower().endswith(".parquet"):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise BulkImportError("Parquet import needs pyarrow installed; upload a CSV instead")
+        parquet = pq.ParquetFile(io.BytesIO(data))
+        for batch in parquet.iter_batches(batch_size=chunk_rows):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(
+            io.BytesIO(data),
+            chunksize=chunk_rows,
+            dtype={"account_number": str, "type": str, "reference": str},
+            skipinitialspace=True
+        )
+
+
+class BulkImporter:
+    """Validates and posts branch transaction files in vectorized chunks.
+
+    Each chunk is checked with pandas operations only: amount sign, known
+    account, balance and the rolling daily limit, using per-account
+    cumulative sums against a single ledger snapshot. Accepted rows of a
+    chunk are posted in one ledger transaction; rejected rows are streamed
+    into a CSV report.
+
+    A file can't carry transaction passwords, so withdrawals from accounts
+    that have one are rejected; they go through the single-withdrawal flow.
+    """
+
+    def __init__(self, ledger=None, accounts=None, chunk_rows: int = CHUNK_ROWS):
+        self.ledger = ledger or get_ledger()
+        self.accounts = accounts or get_account_store()
+        self.chunk_rows = chunk_rows
+
+    def run(self, data: bytes, filename: str) -> ImportResult:
+        # Default idempotency keys derive from the file, so re-uploading it posts nothing twice
+        digest = hashlib.sha256(data).hexdigest()[:16]
+        report = io.StringIO()
+        totals = [0, 0, 0]
+
+        def settle(pending):
+            good, bad, retried = self._settle(pending, digest)
+            totals[0] += len(pending.chunk)
+            totals[1] += good
+            if len(bad):
+                bad.to_csv(report, header=totals[2] == 0)
+                totals[2] += len(bad)
+            return retried
+
+        # While one chunk commits in the ledger writer the next one is validated
+        # against the balances that commit will leave behind
+        pending = None
+        offset = 0
+        for chunk in read_chunks(data, filename, self.chunk_rows):
+            missing = [column for column in REQUIRED_COLUMNS if column not in chunk.columns]
+            if missing:
+                raise BulkImportError(f"Missing required column(s): {', '.join(missing)}")
+            chunk.index = pd.RangeIndex(offset + 1, offset + len(chunk) + 1, name="row")
+            offset += len(chunk)
+
+            frame, reasons = self._validate(chunk, digest, pending)
+            if pending is not None and settle(pending):
+                frame, reasons = self._validate(chunk, digest)
+            pending = self._submit(chunk, frame, reasons)
+        if pending is not None:
+            settle(pending)
+        return ImportResult(totals[0], totals[1], totals[2], report.getvalue().encode())
+
+    def _settle(self, pending: _Pending, digest: str):
+        try:
+            pending.future.result()
+            return pending.accepted, pending.rejected, False
+        except StaleSnapshot:
+            pass
+        # Another session posted to the same accounts between validation and
+        # commit; the ledger refused the batch, so validate again against it
+        for _ in range(MAX_RETRIES):
+            frame, reasons = self._validate(pending.chunk, digest)
+            retry = self._submit(pending.chunk, frame, reasons)
+            try:
+                retry.future.result()
+                return retry.accepted, retry.rejected, True
+            except StaleSnapshot:
+                continue
+        rows = pending.chunk.index
+        raise BulkImportError(
+            f"Rows {rows[0]:,} to {rows[-1]:,} kept changing under other postings to the same accounts "
+            f"and were not imported. Earlier rows were posted; upload the file again to finish, "
+            f"and rows already posted will be skipped."
+        )
+
+    def _submit(self, chunk: pd.DataFrame, frame: pd.DataFrame, reasons: pd.Series) -> _Pending:
+        accepted = frame[reasons.isna()]
+        rejected = chunk.loc[reasons.notna()].copy()
+        rejected["reason"] = reasons[reasons.notna()]
+        future, overlay = self._post(accepted)
+        return _Pending(
+            future, chunk, len(accepted), rejected, overlay, set(zip(accepted["account_number"], accepted["key"]))
+        )
+
+    def _validate(self, chunk: pd.DataFrame, digest: str, pending: _Pending = None):
+        frame = pd.DataFrame(index=chunk.index)
+        frame["account_number"] = _clean(chunk["account_number"])
+        frame["kind"] = _clean(chunk["type"], str.lower).map(TYPE_ALIASES)
+        amount = pd.to_numeric(chunk["amount"], errors="coerce")
+        # Masked before the cast so inf or 1e300 can't wrap around int64
+        too_large = (amount * 100).abs() >= MAX_CENTS
+        frame["amount"] = (amount.mask(too_large) * 100).round().fillna(0).astype(np.int64)
+        if "reference" in chunk.columns:
+            keys = chunk["reference"].astype("string")
+            frame["key"] = ("ref:" + keys).where(keys.notna(), None)
+        else:
+            frame["key"] = None
+        unreferenced = frame["key"].isna()
+        generated = pd.Series(f"bulk:{digest}:" + frame.index.astype(str), index=frame.index)
+        frame["key"] = frame["key"].where(~unreferenced, generated)
+
+        reasons = pd.Series(None, index=frame.index, dtype=object)
+        reasons[frame["kind"].isna()] = "unknown transaction type"
+        reasons[reasons.isna() & too_large] = "amount is too large"
+        reasons[reasons.isna() & (amount.isna() | (frame["amount"] <= 0))] = "amount must be a positive number"
+        # A generated key changes with the file, so a corrected re-upload would post the withdrawal twice
+        reasons[reasons.isna() & unreferenced & (frame["kind"] == "withdraw")] = "withdrawal needs a reference"
+        # Keys are unique per account, so a reference may repeat across accounts
+        reasons[reasons.isna() & frame.duplicated(["account_number", "key"])] = "duplicate reference in file"
+
+        snapshots = self.ledger.snapshot(frame["account_number"].unique())
+        if pending is not None:
+            snapshots.update((account, state) for account, state in pending.overlay.items() if account in snapshots)
+        known = frame["account_number"].isin(snapshots.keys())
+        reasons[reasons.isna() & ~known] = "unknown account"
+        withdrawing = reasons.isna() & (frame["kind"] == "withdraw")
+        if withdrawing.any():
+            protected = self.accounts.with_credential(frame.loc[withdrawing, "account_number"].unique(), "transaction")
+            reasons[withdrawing & frame["account_number"].isin(protected)] = "transaction password required"
+
+        pairs = pd.MultiIndex.from_frame(frame[["account_number", "key"]])
+        already = self.ledger.existing_keys(pairs[reasons.isna().to_numpy()])
+        if pending is not None:
+            already.update(pending.keys)
+        if already:
+            reasons[reasons.isna() & pairs.isin(already)] = "already posted"
+
+        accounts = pd.DataFrame.from_dict(
+            snapshots, orient="index", columns=["balance", "daily_limit", "spent", "version"]
+        )
+        frame = frame.join(accounts, on="account_number")
+
+        frame["signed"] = np.where(frame["kind"] == "deposit", frame["amount"], -frame["amount"])
+        frame["withdrawn"] = np.where(frame["kind"] == "withdraw", frame["amount"], 0)
+
+        # Walk balances and daily spend forward per account with cumulative sums.
+        # Rejecting a row only helps the rows after it, so each pass rejects the
+        # first offending row per account and recomputes until none are left;
+        # past MAX_PASSES every remaining offender is rejected at once.
+        passes = 0
+        while True:
+            live = frame[reasons.isna()]
+            by_account = live.groupby("account_number", sort=False)
+            balance_after = live["balance"] + by_account["signed"].cumsum()
+            spent_after = live["spent"] + by_account["withdrawn"].cumsum()
+            overdrawn = balance_after < 0
+            over_limit = (live["withdrawn"] > 0) & (spent_after > live["daily_limit"])
+            offending = live[overdrawn | over_limit]
+            if offending.empty:
+                break
+            passes += 1
+            if passes < MAX_PASSES:
+                first = offending.groupby("account_number", sort=False).head(1).index
+            else:
+                first = offending.index
+            reasons[first] = np.where(overdrawn[first], "insufficient funds", "daily limit exceeded")
+
+        frame["balance_after"] = balance_after
+        return frame, reasons
+
+    def _post(self, accepted: pd.DataFrame):
+        """Queue accepted rows with the ledger writer without waiting for the commit.
+
+        Returns the commit future and the per-account snapshots the commit
+        will leave behind.
+        """
+        if accepted.empty:
+            future = Future()
+            future.set_result(0)
+            return future, {}
+        totals = accepted.groupby("account_number", sort=False).agg(
+            version=("version", "first"),
+            balance=("balance_after", "last"),
+            daily_limit=("daily_limit", "first"),
+            spent=("spent", "first"),
+            count=("amount", "size"),
+            withdrawn=("withdrawn", "sum"),
+        )
+        accounts = {}
+        overlay = {}
+        for account_number, row in zip(totals.index, totals.itertuples(index=False)):
+            accounts[account_number] = (int(row.version), int(row.balance), int(row.count), int(row.withdrawn))
+            overlay[account_number] = AccountSnapshot(
+                int(row.balance), int(row.daily_limit), int(row.spent + row.withdrawn), int(row.version + row.count)
+            )
+        entries = list(zip(
+            accepted["account_number"].tolist(),
+            accepted["kind"].tolist(),
+            accepted["amount"].astype(int).tolist(),
+            accepted["balance_after"].astype(int).tolist(),
+            accepted["key"].tolist(),
+        ))
+        return self.ledger.post_batch_async(entries, accounts), overlay
+
+
+def _clean(column: pd.Series, transform=None) -> pd.Series:
+    # Strip each distinct value once rather than every row
+    values = column.fillna("").astype(str)
+    uniques = values.unique()
+    cleaned = [value.strip() for value in uniques]
+    if transform is not None:
+        cleaned = [transform(value) for value in cleaned]
+    return values.map(dict(zip(uniques, cleaned)))
@@ -0,0 +1,217 @@
+import base64
+import hashlib
+import hmac
+import os
+import statistics
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import NamedTuple
+
+import metrics
+
+CREDENTIAL_SECONDS = metrics.histogram(
+    "credential_kdf_seconds", "Time spent in the password KDF, per call", ("operation",)
+)
+CREDENTIAL_QUEUE_WAIT = metrics.histogram(
+    "credential_queue_wait_seconds", "Time a KDF call waited for a free worker"
+)
+CREDENTIAL_REJECTED = metrics.counter(
+    "credential_rejected_total", "KDF calls refused because the queue was full"
+)
+
+
+class CredentialsBusy(RuntimeError):
+    pass
+
+
+class InvalidCredentials(ValueError):
+    pass
+
+
+class ScryptParams(NamedTuple):
+    """scrypt cost: N = 2**log_n, block size r, parallelism p.
+
+    Memory per call is about 128 * r * N bytes, 32 MiB at the defaults.
+    """
+
+    log_n: int = 15
+    r: int = 8
+    p: int = 1
+
+    @property
+    def maxmem(self) -> int:
+        # OpenSSL refuses calls over maxmem; allow exactly what these params need
+        return 128 * self.r * ((1 << self.log_n) + self.p + 2) + 1024
+
+
+SALT_BYTES = 16
+KEY_BYTES = 32
+
+
+def _b64(data: bytes) -> str:
+    return base64.b64encode(data).decode().rstrip("=")
+
+
+def _unb64(text: str) -> bytes:
+    return base64.b64decode(text + "=" * (-len(text) % 4))
+
+
+def _kdf(password: str, salt: bytes, params: ScryptParams) -> bytes:
+    return hashlib.scrypt(
+        password.encode(), salt=salt, n=1 << params.log_n, r=params.r, p=params.p,
+        maxmem=params.maxmem, dklen=KEY_BYTES
+    )
+
+
+def hash_password(password: str, params: ScryptParams = ScryptParams()) -> str:
+    """Salted scrypt hash as a self-describing string.
+
+    "$scrypt$ln=15,r=8,p=1$<salt>$<key>", so parameters can be raised later
+    without invalidating stored hashes.
+    """
+    salt = os.urandom(SALT_BYTES)
+    key = _kdf(password, salt, params)
+    return f"$scrypt$ln={params.log_n},r={params.r},p={params.p}${_b64(salt)}${_b64(key)}"
+
+
+def parse_hash(encoded: str):
+    try:
+        _, scheme, settings, salt, key = encoded.split("$")
+        if scheme != "scrypt":
+            raise ValueError(scheme)
+        values = dict(item.split("=") for item in settings.split(","))
+        params = ScryptParams(int(values["ln"]), int(values["r"]), int(values["p"]))
+        return params, _unb64(salt), _unb64(key)
+    except (KeyError, ValueError) as e:
+        raise ValueError("Not a recognised password hash") from e
+
+
+def verify_password(password: str, encoded: str) -> bool:
+    params, salt, key = parse_hash(encoded)
+    return hmac.compare_digest(_kdf(password, salt, params), key)
+
+
+def needs_rehash(encoded: str, params: ScryptParams) -> bool:
+    return parse_hash(encoded)[0] != params
+
+
+def calibrate(target_ms: float, r: int = 8, p: int = 1, max_log_n: int = 20, repeat: int = 3) -> list:
+    """Time each log_n up to the first one over target_ms.
+
+    Returns [(params, median_ms)]; the last entry within target is the
+    strongest setting that meets it on this machine.
+    """
+    timings = []
+    for log_n in range(10, max_log_n + 1):
+        params = ScryptParams(log_n, r, p)
+        runs = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            _kdf("calibration", b"\0" * SALT_BYTES, params)
+            runs.append((time.perf_counter() - started) * 1000)
+        timings.append((params, statistics.median(runs)))
+        if timings[-1][1] > target_ms:
+            break
+    return timings
+
+
+class CredentialService:
+    """Hashes and verifies passwords on a small, bounded worker pool.
+
+    The KDF is deliberately slow and memory-hard. Running it here keeps it
+    off callers' threads. workers caps the CPU and memory it uses: at most
+    workers calls run at once, and up to max_queue more wait. Past that,
+    calls fail fast with CredentialsBusy rather than queueing without
+    bound. hashlib.scrypt releases the GIL, so threads are enough.
+    """
+
+    def __init__(self, params: ScryptParams = ScryptParams(), workers: int = 2, max_queue: int = 64):
+        self.params = params
+        self.workers = workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="credentials")
+        self._slots = threading.BoundedSemaphore(workers + max_queue)
+        self._pending = 0
+        self._lock = threading.Lock()
+        # Recent call durations, for progress estimates
+        self._average = None
+        # Verifying against random bytes costs what a real check does and never matches
+        self._dummy = (
+            f"$scrypt$ln={params.log_n},r={params.r},p={params.p}"
+            f"${_b64(os.urandom(SALT_BYTES))}${_b64(os.urandom(KEY_BYTES))}"
+        )
+
+    def _submit(self, operation: str, func, *args) -> Future:
+        if not self._slots.acquire(blocking=False):
+            CREDENTIAL_REJECTED.inc()
+            raise CredentialsBusy("Too many sign-ins in progress, please try again in a moment")
+        with self._lock:
+            self._pending += 1
+        submitted = time.perf_counter()
+
+        def run():
+            started = time.perf_counter()
+            CREDENTIAL_QUEUE_WAIT.observe(started - submitted)
+            try:
+                return func(*args)
+            finally:
+                elapsed = time.perf_counter() - started
+                CREDENTIAL_SECONDS.observe(elapsed, operation=operation)
+                with self._lock:
+                    self._pending -= 1
+                    self._average = elapsed if self._average is None else 0.8 * self._average + 0.2 * elapsed
+                self._slots.release()
+
+        return self._executor.submit(run)
+
+    def hash_async(self, password: str) -> Future:
+        return self._submit("hash", hash_password, password, self.params)
+
+    def verify_async(self, password: str, encoded: str = None) -> Future:
+        """Check password against encoded; None (no such user) takes as long and fails."""
+        return self._submit("verify", verify_password, password, encoded or self._dummy)
+
+    def hash(self, password: str) -> str:
+        return self.hash_async(password).result()
+
+    def verify(self, password: str, encoded: str = None) -> bool:
+        return self.verify_async(password, encoded).result()
+
+    def expected_seconds(self) -> float:
+        """Rough time until every call queued so far has finished."""
+        with self._lock:
+            average = self._average or 0.2
+            pending = self._pending
+        return average * max(-(-pending // self.workers), 1)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "pending": self._pending,
+                "workers": self.workers,
+                "log_n": self.params.log_n,
+                "average_seconds": self._average,
+            }
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_credential_service() -> CredentialService:
+    global _service
+    if _service is None:
+        with _service_lock:
+            if _service is None:
+                _service = CredentialService(
+                    params=ScryptParams(
+                        log_n=int(os.getenv('CREDENTIAL_SCRYPT_LN', '15')),
+                        r=int(os.getenv('CREDENTIAL_SCRYPT_R', '8')),
+                        p=int(os.getenv('CREDENTIAL_SCRYPT_P', '1'))
+                    ),
+                    workers=int(os.getenv('CREDENTIAL_WORKERS', '2')),
+                    max_queue=int(os.getenv('CREDENTIAL_QUEUE_LIMIT', '64'))
+                )
+                metrics.register_collector("credentials", _service.stats)
+    return _service
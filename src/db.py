@@ -0,0 +1,25 @@
+import os
+import sqlite3
+
+
+def database_path() -> str:
+    return os.getenv('BANK_DB_PATH', 'bank.db')
+
+
+def connect(path: str = None, durable: bool = False) -> sqlite3.Connection:
+    """Open a connection to the bank database in WAL mode.
+
+    Connections run in autocommit mode; callers that write open their own
+    transactions with BEGIN IMMEDIATE so a batch is a single commit.
+
+    By default commits are not synced (synchronous=NORMAL): the database
+    survives a power loss intact, but the last commits may be gone. Writers
+    whose commits are confirmed to someone pass durable, which syncs the
+    WAL on every commit (synchronous=FULL); batching writes into one commit
+    keeps that to one fsync per batch.
+    """
+    conn = sqlite3.connect(path or database_path(), check_same_thread=False, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(f"PRAGMA synchronous={'FULL' if durable else 'NORMAL'}")
+    conn.execute("PRAGMA busy_timeout=5000")
+    return conn
@@ -0,0 +1,124 @@
+import hashlib
+import math
+import random
+import re
+import threading
+import time
+from collections import deque
+from typing import Iterator, List, Optional
+
+import httpx
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from pydantic import PrivateAttr
+
+DEFAULT_REPLIES = [
+    "I can help you with deposits, withdrawals and checking the status of a transaction. "
+    "Which of these would you like to do?",
+    "I can help you create a new bank account or manage your existing one. "
+    "Would you like to proceed with either of these?",
+    "I can help you create a new complaint, track an existing one, or delete a complaint. "
+    "What would you like to do?",
+    "I can only assist with transactions, account creation, agent management and complaints. "
+    "Is there something in those areas I can help you with?",
+]
+
+_TOKEN = re.compile(r"\S+\s*")
+
+
+class FakeProviderError(Exception):
+    """A provider error response, shaped like the hosted client's: status_code plus the HTTP response."""
+
+    def __init__(self, message: str, status_code: int, retry_after: float = None):
+        super().__init__(message)
+        self.status_code = status_code
+        # Rounded up, so a client that waits exactly this long is let in
+        headers = {"retry-after": f"{math.ceil(retry_after * 100) / 100:.2f}"} if retry_after is not None else {}
+        self.response = httpx.Response(status_code, headers=headers)
+
+
+class FakeStreamingChatModel(BaseChatModel):
+    """Deterministic local stand-in for the hosted chat model.
+
+    Streams one of a fixed set of replies word by word, chosen by a hash of
+    the latest message, after first_token_latency seconds and token_delay
+    seconds between tokens. Both delays vary by up to +/- jitter as a
+    fraction, from a generator seeded by the message, so a given prompt
+    always gets the same reply and the same timings.
+
+    To exercise throttling, requests_per_minute > 0 answers requests over
+    that rate, in a sliding minute, with a 429 and a Retry-After, and
+    error_rate fails that fraction of requests with a 503.
+    """
+
+    replies: List[str] = DEFAULT_REPLIES
+    first_token_latency: float = 0.2
+    token_delay: float = 0.02
+    jitter: float = 0.25
+    seed: int = 0
+    requests_per_minute: float = 0
+    error_rate: float = 0.0
+
+    _calls: deque = PrivateAttr(default_factory=deque)
+    _errors: random.Random = PrivateAttr(default=None)
+    _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-streaming"
+
+    def _pick(self, messages: List[BaseMessage]):
+        prompt = messages[-1].content if messages else ""
+        digest = hashlib.blake2b(f"{self.seed}\0{prompt}".encode(), digest_size=8).digest()
+        value = int.from_bytes(digest, "big")
+        return self.replies[value % len(self.replies)], random.Random(value)
+
+    def _delay(self, base: float, rng: random.Random):
+        if base > 0:
+            time.sleep(max(base * (1 + rng.uniform(-self.jitter, self.jitter)), 0))
+
+    def _admit(self):
+        with self._lock:
+            if self.error_rate:
+                if self._errors is None:
+                    self._errors = random.Random(self.seed)
+                if self._errors.random() < self.error_rate:
+                    raise FakeProviderError("Service unavailable", 503)
+            if self.requests_per_minute:
+                now = time.monotonic()
+                while self._calls and now - self._calls[0] >= 60:
+                    self._calls.popleft()
+                if len(self._calls) >= self.requests_per_minute:
+                    raise FakeProviderError(
+                        "Rate limit reached for requests", 429, retry_after=60 - (now - self._calls[0])
+                    )
+                self._calls.append(now)
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager=None,
+        **kwargs,
+    ) -> Iterator[ChatGenerationChunk]:
+        self._admit()
+        reply, rng = self._pick(messages)
+        self._delay(self.first_token_latency, rng)
+        for i, token in enumerate(_TOKEN.findall(reply)):
+            if i:
+                self._delay(self.token_delay, rng)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager is not None:
+                run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager=None,
+        **kwargs,
+    ) -> ChatResult:
+        text = "".join(chunk.message.content for chunk in self._stream(messages, stop, run_manager, **kwargs))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
@@ -0,0 +1,110 @@
+import time
+from collections import deque
+
+from session_store import Codec
+
+
+class Message:
+    __slots__ = ("seq", "content", "is_user", "created", "private", "_html")
+
+    def __init__(self, seq: int, content: str, is_user: bool, created: float, private: bool = False):
+        self.seq = seq
+        self.content = content
+        self.is_user = is_user
+        self.created = created
+        # Shown in this session but never written to the session store
+        self.private = private
+        self._html = None
+
+    @property
+    def timestamp(self) -> str:
+        return time.strftime("%H:%M", time.localtime(self.created))
+
+    @property
+    def html(self) -> str:
+        # Messages never change once added, so the markup is built once
+        if self._html is None:
+            message_class = "user-message" if self.is_user else "assistant-message"
+            self._html = f"""<div class="chat-message {message_class}">
+                {'You' if self.is_user else 'Assistant'}: {self.content}
+            </div>"""
+        return self._html
+
+
+class ChatHistory:
+    """Bounded chat history for one session.
+
+    Holds at most max_messages in a ring buffer; the oldest messages drop
+    off as new ones arrive. Every message gets an increasing sequence number
+    so renderers can ask for what was added since they last drew.
+    """
+
+    __slots__ = ("_messages", "_next_seq")
+
+    def __init__(self, max_messages: int = 200):
+        self._messages = deque(maxlen=max_messages)
+        self._next_seq = 1
+
+    def __len__(self):
+        return len(self._messages)
+
+    def __iter__(self):
+        return iter(self._messages)
+
+    @property
+    def last_seq(self) -> int:
+        return self._next_seq - 1
+
+    def append(self, content: str, is_user: bool = False, private: bool = False) -> Message:
+        message = Message(self._next_seq, content, is_user, time.time(), private)
+        self._next_seq += 1
+        self._messages.append(message)
+        return message
+
+    def clear(self):
+        self._messages.clear()
+
+    def to_state(self) -> dict:
+        return {
+            "next_seq": self._next_seq,
+            "messages": [[m.seq, m.content, m.is_user, m.created] for m in self._messages if not m.private],
+        }
+
+    @classmethod
+    def from_state(cls, state: dict, max_messages: int = 200) -> "ChatHistory":
+        history = cls(max_messages)
+        for seq, content, is_user, created in state["messages"]:
+            history._messages.append(Message(seq, content, is_user, created))
+        history._next_seq = state["next_seq"]
+        return history
+
+    def tail(self, count: int) -> list:
+        if count >= len(self._messages):
+            return list(self._messages)
+        return [self._messages[i] for i in range(len(self._messages) - count, len(self._messages))]
+
+    def since(self, seq: int) -> list:
+        # New messages are at the right end, so walk back until we pass seq
+        newer = []
+        for message in reversed(self._messages):
+            if message.seq <= seq:
+                break
+            newer.append(message)
+        newer.reverse()
+        return newer
+
+
+class HistoryCodec(Codec):
+    """Stores a ChatHistory in the session store."""
+
+    def __init__(self, max_messages: int = 200):
+        self.max_messages = max_messages
+
+    def version(self, history):
+        return (id(history), history.last_seq, len(history))
+
+    def dump(self, history):
+        return history.to_state()
+
+    def load(self, state):
+        return ChatHistory.from_state(state, self.max_messages)
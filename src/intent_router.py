@@ -0,0 +1,199 @@
+import os
+import re
+import threading
+from collections import Counter
+from typing import NamedTuple, Optional
+
+from accounts import is_valid_account_number
+
+_TOKEN = re.compile(r"[a-z]+|[$₹]|\d[\d,]*(?:\.\d+)?")
+_AMOUNT = re.compile(r"^\d[\d,]*(?:\.\d+)?$")
+# Shaped like an account number, which is never read as an amount
+_ACCOUNT_NUMBER = re.compile(r"^\d{10}$")
+
+# A number is only an amount next to a currency marker or straight after one
+# of these verbs; any other number ("deposit into 7000000013", "my 2
+# accounts") is left for the form to ask about
+CURRENCY_MARKERS = {"$", "₹", "usd", "dollar", "dollars", "rs", "inr", "rupee", "rupees"}
+AMOUNT_VERBS = {"deposit", "withdraw", "withdrawal", "put", "add", "out"}
+
+# Complaints about a flow ("my withdrawal failed") need the model, not a canned answer
+TROUBLE_WORDS = {"not", "t", "never", "failed", "fail", "problem", "issue", "wrong", "error", "stuck", "missing"}
+QUESTION_WORDS = {"how", "what", "why", "when", "where", "which", "who", "can", "could", "is", "are", "do", "does", "should"}
+
+# Phrase weights per intent. Multi-word phrases are matched as whole token runs.
+INTENT_PHRASES = {
+    "deposit": {
+        "deposit": 2, "deposits": 2, "make a deposit": 1, "put money": 2, "add money": 2, "add funds": 2,
+    },
+    "withdrawal": {
+        "withdraw": 2, "withdrawal": 2, "withdrawals": 2, "take out money": 2, "cash out": 2,
+    },
+    "account_creation": {
+        "open an account": 3, "open account": 3, "open a bank account": 3, "open a new account": 3,
+        "create an account": 3, "create account": 3, "create a bank account": 3, "new account": 3,
+        "sign up": 2, "register": 2,
+    },
+    "transaction_status": {
+        "transaction status": 3, "status of my transaction": 3, "track transaction": 3,
+        "track my transaction": 3, "check transaction": 3, "check my transaction": 3,
+        "pending transaction": 2, "did my transaction": 2,
+    },
+    "agent_management": {
+        "agent": 2, "agents": 2, "create agent": 1, "create an agent": 1, "add agent": 1, "manage agents": 1,
+    },
+    "complaints": {
+        "complaint": 2, "complaints": 2, "complain": 2, "grievance": 2,
+        "raise a complaint": 1, "file a complaint": 1, "track complaint": 1, "delete complaint": 1,
+    },
+    "greeting": {
+        "hi": 2, "hello": 2, "hey": 2, "good morning": 2, "good afternoon": 2, "good evening": 2,
+        "thanks": 2, "thank you": 2,
+    },
+    "out_of_scope": {
+        "loan": 2, "loans": 2, "mortgage": 2, "credit card": 2, "interest rate": 2, "stock": 2, "stocks": 2,
+        "crypto": 2, "bitcoin": 2, "insurance": 2, "invest": 2, "investment": 2, "tax": 2, "taxes": 2,
+        "weather": 3, "recipe": 3, "joke": 3, "movie": 3, "sports": 3, "news": 3,
+    },
+}
+
+CANNED_REPLIES = {
+    "deposit": "I can help you deposit money. Say \"deposit\" followed by an amount (for example \"deposit 500\"), or choose 🏦 Banking Services → 💳 Make Transaction from the main menu.",
+    "withdrawal": "I can help you withdraw money. Say \"withdraw\" followed by an amount (for example \"withdraw 500\"), or choose 🏦 Banking Services → 💳 Make Transaction from the main menu.",
+    "account_creation": "I can help you create a new bank account. Just say \"open an account\" and I'll start the setup, or choose 🏦 Banking Services → 📝 Create Account from the main menu.",
+    "transaction_status": "I can help you check the status of a transaction. Please share the transaction reference or the account number and approximate date of the transaction.",
+    "agent_management": "I can help you create a new agent or manage your existing agents. Would you like to create an agent or update an existing one?",
+    "complaints": "I can help you create a new complaint, track an existing one, or delete a complaint. What would you like to do?",
+    "greeting": "Hello! I can help with deposits and withdrawals, account creation, transaction status, agent management and complaints. What would you like to do?",
+    "out_of_scope": "I'm sorry, I can only assist with deposits and withdrawals, bank account creation, transaction status, agent management and complaints. Is there anything among these I can help you with?",
+}
+
+# Intents that can jump straight into a banking flow instead of replying
+ACTION_INTENTS = {"deposit", "withdrawal", "account_creation"}
+
+
+class Route(NamedTuple):
+    action: str  # "reply", "refuse", "switch" or "llm"
+    intent: Optional[str] = None
+    reply: Optional[str] = None
+    transaction_type: Optional[str] = None
+    amount: Optional[float] = None
+    account_number: Optional[str] = None
+    score: float = 0.0
+
+
+class IntentRouter:
+    """Keyword-trie intent classifier that runs in front of the LLM.
+
+    Confident matches on the bot's fixed set of intents are answered locally
+    or switched into the matching banking flow; anything ambiguous falls
+    through to the model.
+    """
+
+    def __init__(self, threshold: float = 2.0, margin: float = 1.0, max_tokens: int = 12):
+        self.threshold = threshold
+        self.margin = margin
+        self.max_tokens = max_tokens
+        self._trie = {}
+        for intent, phrases in INTENT_PHRASES.items():
+            for phrase, weight in phrases.items():
+                node = self._trie
+                for token in phrase.split():
+                    node = node.setdefault(token, {})
+                node.setdefault(None, []).append((intent, weight))
+        self._lock = threading.Lock()
+        self.decisions = Counter()
+        self.near_misses = Counter()
+
+    def score(self, tokens: list) -> Counter:
+        scores = Counter()
+        for start in range(len(tokens)):
+            node = self._trie
+            for token in tokens[start:]:
+                node = node.get(token)
+                if node is None:
+                    break
+                for intent, weight in node.get(None, ()):
+                    scores[intent] += weight
+        if len(scores) > 1:
+            # Greetings and thanks only count when nothing else was asked
+            scores.pop("greeting", None)
+        return scores
+
+    def route(self, text: str) -> Route:
+        lowered = text.lower().strip()
+        tokens = _TOKEN.findall(lowered)
+        route = self._classify(lowered, tokens)
+        with self._lock:
+            self.decisions[(route.action, route.intent)] += 1
+        return route
+
+    def _classify(self, lowered: str, tokens: list) -> Route:
+        if not tokens or len(tokens) > self.max_tokens or TROUBLE_WORDS.intersection(tokens):
+            return Route("llm")
+
+        scores = self.score(tokens)
+        if not scores:
+            return Route("llm")
+        ranked = scores.most_common(2)
+        intent, top = ranked[0]
+        runner_up = ranked[1][1] if len(ranked) > 1 else 0
+        if top < self.threshold or top - runner_up < self.margin:
+            with self._lock:
+                self.near_misses[intent] += 1
+            return Route("llm", intent=intent, score=top)
+
+        if intent == "out_of_scope":
+            return Route("refuse", intent=intent, reply=CANNED_REPLIES[intent], score=top)
+
+        amount = _amount(tokens)
+        is_question = lowered.endswith("?") or tokens[0] in QUESTION_WORDS
+        if intent in ACTION_INTENTS and (amount is not None or not is_question):
+            if intent == "account_creation":
+                return Route("switch", intent=intent, score=top)
+            numbers = [token for token in tokens if _ACCOUNT_NUMBER.match(token) and is_valid_account_number(token)]
+            return Route(
+                "switch",
+                intent=intent,
+                transaction_type="deposit" if intent == "deposit" else "withdraw",
+                amount=amount,
+                account_number=numbers[0] if numbers else None,
+                score=top
+            )
+
+        return Route("reply", intent=intent, reply=CANNED_REPLIES[intent], score=top)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "decisions": {f"{action}:{intent or '-'}": count for (action, intent), count in self.decisions.items()},
+                "near_misses": dict(self.near_misses),
+            }
+
+
+def _amount(tokens: list) -> Optional[float]:
+    for i, token in enumerate(tokens):
+        if not _AMOUNT.match(token) or _ACCOUNT_NUMBER.match(token):
+            continue
+        before = tokens[i - 1] if i else None
+        after = tokens[i + 1] if i + 1 < len(tokens) else None
+        if before in CURRENCY_MARKERS or after in CURRENCY_MARKERS or before in AMOUNT_VERBS:
+            return float(token.replace(",", ""))
+    return None
+
+
+_router = None
+_router_lock = threading.Lock()
+
+
+def get_intent_router() -> IntentRouter:
+    global _router
+    if _router is None:
+        with _router_lock:
+            if _router is None:
+                _router = IntentRouter(
+                    threshold=float(os.getenv('INTENT_ROUTER_THRESHOLD', '2.0')),
+                    margin=float(os.getenv('INTENT_ROUTER_MARGIN', '1.0')),
+                    max_tokens=int(os.getenv('INTENT_ROUTER_MAX_TOKENS', '12'))
+                )
+    return _router
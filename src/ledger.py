@@ -0,0 +1,563 @@
+import math
+import numbers
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import NamedTuple, Optional
+
+from db import connect, database_path
+
+# Rolling daily-limit window, kept as fixed-size spend buckets per account
+SPEND_WINDOW = 24 * 60 * 60
+SPEND_BUCKET = 15 * 60
+
+# Largest value an SQLite INTEGER holds, so the most cents an amount or balance can be
+MAX_CENTS = 2 ** 63 - 1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS ledger_accounts (
+    account_number TEXT PRIMARY KEY,
+    balance INTEGER NOT NULL DEFAULT 0,
+    daily_limit INTEGER NOT NULL,
+    entry_count INTEGER NOT NULL DEFAULT 0,
+    agent_id TEXT
+);
+
+CREATE TABLE IF NOT EXISTS ledger_entries (
+    id INTEGER PRIMARY KEY,
+    account_number TEXT NOT NULL REFERENCES ledger_accounts(account_number),
+    kind TEXT NOT NULL CHECK (kind IN ('deposit', 'withdraw')),
+    amount INTEGER NOT NULL CHECK (amount > 0),
+    balance_after INTEGER NOT NULL,
+    idempotency_key TEXT,
+    created_at REAL NOT NULL,
+    -- Keys are the client's, so they only have to be unique per account
+    UNIQUE (account_number, idempotency_key)
+);
+
+CREATE INDEX IF NOT EXISTS ledger_entries_account ON ledger_entries(account_number, id);
+
+CREATE TRIGGER IF NOT EXISTS ledger_entries_no_update BEFORE UPDATE ON ledger_entries
+BEGIN
+    SELECT RAISE(ABORT, 'ledger entries are append-only');
+END;
+
+CREATE TRIGGER IF NOT EXISTS ledger_entries_no_delete BEFORE DELETE ON ledger_entries
+BEGIN
+    SELECT RAISE(ABORT, 'ledger entries are append-only');
+END;
+
+CREATE TABLE IF NOT EXISTS ledger_spend (
+    account_number TEXT NOT NULL,
+    bucket INTEGER NOT NULL,
+    amount INTEGER NOT NULL,
+    PRIMARY KEY (account_number, bucket)
+) WITHOUT ROWID;
+
+-- Per account and per agent totals by UTC day and month, kept up to date
+-- by the writer in the same transaction as the entries they count
+CREATE TABLE IF NOT EXISTS ledger_totals (
+    scope TEXT NOT NULL CHECK (scope IN ('account', 'agent')),
+    key TEXT NOT NULL,
+    grain TEXT NOT NULL CHECK (grain IN ('day', 'month')),
+    period TEXT NOT NULL,
+    deposits INTEGER NOT NULL,
+    withdrawals INTEGER NOT NULL,
+    entries INTEGER NOT NULL,
+    closing_balance INTEGER,
+    first_id INTEGER NOT NULL,
+    last_id INTEGER NOT NULL,
+    PRIMARY KEY (scope, key, grain, period)
+) WITHOUT ROWID;
+"""
+
+GRAINS = {"day": "%Y-%m-%d", "month": "%Y-%m"}
+
+
+class LedgerError(ValueError):
+    pass
+
+
+class UnknownAccount(LedgerError):
+    pass
+
+
+class InsufficientFunds(LedgerError):
+    pass
+
+
+class DailyLimitExceeded(LedgerError):
+    pass
+
+
+class StaleSnapshot(LedgerError):
+    pass
+
+
+class IdempotencyConflict(LedgerError):
+    pass
+
+
+class AccountSnapshot(NamedTuple):
+    balance: int
+    daily_limit: int
+    spent: int
+    version: int
+
+
+class Posting(NamedTuple):
+    entry_id: int
+    account_number: str
+    kind: str
+    amount: float
+    balance: float
+    duplicate: bool = False
+
+
+class StatementLine(NamedTuple):
+    entry_id: int
+    created_at: float
+    kind: str
+    amount: float
+    balance: float
+
+
+class PeriodTotals(NamedTuple):
+    period: str
+    deposits: float
+    withdrawals: float
+    entries: int
+    # Balance after the period's last entry; accounts only
+    closing_balance: Optional[float]
+
+
+def _oldest_bucket(now: float) -> int:
+    # The partially expired bucket still counts, so the limit errs on the safe side
+    return int(now - SPEND_WINDOW) // SPEND_BUCKET
+
+
+def period_of(timestamp: float, grain: str) -> str:
+    return time.strftime(GRAINS[grain], time.gmtime(timestamp))
+
+
+def to_cents(amount: float) -> int:
+    if isinstance(amount, bool) or not isinstance(amount, numbers.Real) or not math.isfinite(amount):
+        raise LedgerError("Amount must be a finite number")
+    cents = round(amount * 100)
+    if abs(cents) > MAX_CENTS:
+        raise LedgerError("Amount is too large")
+    return int(cents)
+
+
+def from_cents(cents: int) -> float:
+    return cents / 100
+
+
+class Ledger:
+    """Append-only SQLite ledger with group-committed writes.
+
+    Every write goes through a single writer thread that drains the queue
+    into one transaction per batch, so many concurrent sessions share one
+    commit. Reads use their own connections and never wait on the writer.
+    """
+
+    def __init__(self, path: str = None, batch_size: int = 256, batch_wait: float = 0.002):
+        self.path = path or database_path()
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self._queue = queue.Queue()
+        self._local = threading.local()
+        conn = connect(self.path)
+        conn.executescript(SCHEMA)
+        conn.close()
+        self._writer = threading.Thread(target=self._run_writer, name="ledger-writer", daemon=True)
+        self._writer.start()
+
+    def open_account(self, account_number: str, daily_limit: float, agent_id: str = None):
+        return self._submit(("open", account_number, to_cents(daily_limit), agent_id))
+
+    def open_account_in(self, conn, account_number: str, daily_limit: float, agent_id: str = None):
+        """Open an account inside a transaction the caller holds on conn.
+
+        For stores that create the account row in the same database, so the
+        two commit or roll back together.
+        """
+        self._open(conn, account_number, to_cents(daily_limit), agent_id)
+
+    def _open(self, conn, account_number: str, daily_limit: int, agent_id):
+        conn.execute(
+            "INSERT INTO ledger_accounts (account_number, daily_limit, agent_id) VALUES (?, ?, ?) "
+            "ON CONFLICT(account_number) DO UPDATE SET daily_limit = excluded.daily_limit, "
+            "agent_id = excluded.agent_id",
+            (account_number, daily_limit, agent_id)
+        )
+
+    def deposit(self, account_number: str, amount: float, idempotency_key: str = None) -> Posting:
+        return self.post(account_number, "deposit", amount, idempotency_key)
+
+    def withdraw(self, account_number: str, amount: float, idempotency_key: str = None) -> Posting:
+        return self.post(account_number, "withdraw", amount, idempotency_key)
+
+    def post(self, account_number: str, kind: str, amount: float, idempotency_key: str = None) -> Posting:
+        cents = to_cents(amount)
+        if cents <= 0:
+            raise LedgerError("Amount must be greater than zero")
+        if idempotency_key is not None and not isinstance(idempotency_key, str):
+            raise LedgerError("Idempotency key must be a string")
+        return self._submit(("post", account_number, kind, cents, idempotency_key))
+
+    def balance(self, account_number: str) -> float:
+        row = self._reader().execute(
+            "SELECT balance FROM ledger_accounts WHERE account_number = ?", (account_number,)
+        ).fetchone()
+        if row is None:
+            raise UnknownAccount(f"Account {account_number} not found")
+        return from_cents(row[0])
+
+    def spent_today(self, account_number: str) -> float:
+        return from_cents(self._spent(self._reader(), account_number, time.time()))
+
+    def snapshot(self, account_numbers) -> dict:
+        """Balance, daily limit, rolling spend and version for many accounts.
+
+        Missing accounts are left out. All values are in cents.
+        """
+        conn = self._reader()
+        oldest = _oldest_bucket(time.time())
+        snapshots = {}
+        account_numbers = list(account_numbers)
+        for start in range(0, len(account_numbers), 500):
+            chunk = account_numbers[start:start + 500]
+            marks = ", ".join("?" * len(chunk))
+            spent = dict(conn.execute(
+                f"SELECT account_number, SUM(amount) FROM ledger_spend "
+                f"WHERE account_number IN ({marks}) AND bucket >= ? GROUP BY account_number",
+                (*chunk, oldest)
+            ).fetchall())
+            for account_number, balance, daily_limit, version in conn.execute(
+                f"SELECT account_number, balance, daily_limit, entry_count FROM ledger_accounts "
+                f"WHERE account_number IN ({marks})",
+                chunk
+            ):
+                snapshots[account_number] = AccountSnapshot(balance, daily_limit, spent.get(account_number, 0), version)
+        return snapshots
+
+    def statement(self, account_number: str, before_id: int = None, limit: int = 50,
+                  since: str = None, until: str = None) -> list:
+        """One page of an account's entries, newest first.
+
+        Paged by entry id rather than offset, so a page deep into a long
+        history costs the same as the first. since and until are UTC dates
+        (YYYY-MM-DD), resolved to entry ids through the daily totals.
+        """
+        low, high = self._id_range(account_number, since, until)
+        if before_id is not None:
+            high = min(high, before_id - 1)
+        rows = self._reader().execute(
+            "SELECT id, created_at, kind, amount, balance_after FROM ledger_entries "
+            "WHERE account_number = ? AND id BETWEEN ? AND ? ORDER BY id DESC LIMIT ?",
+            (account_number, low, high, limit)
+        ).fetchall()
+        return [_to_line(row) for row in rows]
+
+    def iter_statement(self, account_number: str, since: str = None, until: str = None, page_size: int = 1000):
+        """Every entry in range, oldest first, fetched a page at a time."""
+        low, high = self._id_range(account_number, since, until)
+        conn = self._reader()
+        while True:
+            rows = conn.execute(
+                "SELECT id, created_at, kind, amount, balance_after FROM ledger_entries "
+                "WHERE account_number = ? AND id BETWEEN ? AND ? ORDER BY id LIMIT ?",
+                (account_number, low, high, page_size)
+            ).fetchall()
+            if not rows:
+                return
+            yield [_to_line(row) for row in rows]
+            low = rows[-1][0] + 1
+
+    def totals(self, scope: str, key: str, grain: str, since: str = None, until: str = None) -> list:
+        """Totals per period, oldest first; since and until are periods of grain."""
+        rows = self._reader().execute(
+            "SELECT period, deposits, withdrawals, entries, closing_balance FROM ledger_totals "
+            "WHERE scope = ? AND key = ? AND grain = ? AND period BETWEEN ? AND ? ORDER BY period",
+            (scope, key, grain, since or "", until or "~")
+        ).fetchall()
+        return [
+            PeriodTotals(
+                period, from_cents(deposits), from_cents(withdrawals), entries,
+                from_cents(closing) if closing is not None else None
+            )
+            for period, deposits, withdrawals, entries, closing in rows
+        ]
+
+    def _id_range(self, account_number: str, since: str, until: str):
+        low, high = 0, 1 << 62
+        if since or until:
+            row = self._reader().execute(
+                "SELECT MIN(first_id), MAX(last_id) FROM ledger_totals "
+                "WHERE scope = 'account' AND key = ? AND grain = 'day' AND period BETWEEN ? AND ?",
+                (account_number, since or "", until or "~")
+            ).fetchone()
+            # No activity in range
+            if row[0] is None:
+                return 1, 0
+            low, high = row
+        return low, high
+
+    def existing_keys(self, pairs) -> set:
+        """The (account_number, idempotency_key) pairs that are already posted."""
+        # The pairs go into a temp table driving the join, so each one is a
+        # seek on the (account_number, idempotency_key) index. A row-value
+        # IN (VALUES ...) list scans the whole index once per query instead.
+        conn = self._reader()
+        conn.execute(
+            "CREATE TEMP TABLE IF NOT EXISTS wanted_keys (account_number TEXT NOT NULL, idempotency_key TEXT NOT NULL)"
+        )
+        conn.execute("BEGIN")
+        try:
+            conn.executemany("INSERT INTO wanted_keys VALUES (?, ?)", pairs)
+            # CROSS JOIN keeps wanted_keys as the outer loop
+            return set(conn.execute(
+                "SELECT e.account_number, e.idempotency_key FROM wanted_keys w CROSS JOIN ledger_entries e "
+                "ON e.account_number = w.account_number AND e.idempotency_key = w.idempotency_key"
+            ))
+        finally:
+            # Nothing here is kept; rolling back empties wanted_keys for the next call
+            conn.execute("ROLLBACK")
+
+    def post_batch(self, entries: list, accounts: dict):
+        """Post pre-validated entries in one transaction.
+
+        entries are (account_number, kind, amount, balance_after,
+        idempotency_key) tuples in cents. accounts maps each account to
+        (expected_version, final_balance, entry_count, withdrawn); if any
+        account moved since it was validated the batch raises StaleSnapshot
+        and nothing is written.
+        """
+        return self.post_batch_async(entries, accounts).result()
+
+    def post_batch_async(self, entries: list, accounts: dict) -> Future:
+        return self._enqueue(("batch", entries, accounts))
+
+    def _enqueue(self, request) -> Future:
+        future = Future()
+        self._queue.put((request, future))
+        return future
+
+    def _submit(self, request):
+        return self._enqueue(request).result()
+
+    def _reader(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = connect(self.path)
+        return conn
+
+    def _spent(self, conn, account_number: str, now: float) -> int:
+        # At most SPEND_WINDOW / SPEND_BUCKET rows, whatever the history size
+        row = conn.execute(
+            "SELECT COALESCE(SUM(amount), 0) FROM ledger_spend WHERE account_number = ? AND bucket >= ?",
+            (account_number, _oldest_bucket(now))
+        ).fetchone()
+        return row[0]
+
+    def _add_totals(self, conn, entries):
+        """Count (id, account, agent, kind, amount, balance_after, created_at) rows into the totals."""
+        totals = {}
+        for entry_id, account_number, agent_id, kind, amount, balance, created_at in entries:
+            deposit, withdrawal = (amount, 0) if kind == "deposit" else (0, amount)
+            for grain in GRAINS:
+                period = period_of(created_at, grain)
+                scopes = [("account", account_number, balance)]
+                if agent_id:
+                    scopes.append(("agent", agent_id, None))
+                for scope, key, closing in scopes:
+                    row = totals.get((scope, key, grain, period))
+                    if row is None:
+                        totals[scope, key, grain, period] = [deposit, withdrawal, 1, closing, entry_id, entry_id]
+                    else:
+                        row[0] += deposit
+                        row[1] += withdrawal
+                        row[2] += 1
+                        row[3] = closing
+                        row[5] = entry_id
+        # Entries arrive in id order, so the latest closing balance and last id win
+        conn.executemany(
+            "INSERT INTO ledger_totals "
+            "(scope, key, grain, period, deposits, withdrawals, entries, closing_balance, first_id, last_id) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT(scope, key, grain, period) DO UPDATE SET "
+            "deposits = deposits + excluded.deposits, withdrawals = withdrawals + excluded.withdrawals, "
+            "entries = entries + excluded.entries, closing_balance = excluded.closing_balance, "
+            "last_id = excluded.last_id",
+            (key + tuple(row) for key, row in totals.items())
+        )
+
+    def _run_writer(self):
+        # A posting is confirmed as soon as its batch commits, so the commit must reach disk
+        conn = connect(self.path, durable=True)
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.batch_wait
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._commit_batch(conn, batch)
+
+    def _commit_batch(self, conn, batch):
+        results = []
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for request, future in batch:
+                # A failed request is undone on its own without aborting the
+                # batch, whatever it raised; only a failed commit fails everyone
+                conn.execute("SAVEPOINT request")
+                try:
+                    results.append((future, self._apply(conn, request), None))
+                except Exception as e:
+                    conn.execute("ROLLBACK TO request")
+                    results.append((future, None, e))
+                conn.execute("RELEASE request")
+            conn.execute("COMMIT")
+        except Exception as e:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        for future, result, error in results:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+    def _apply(self, conn, request):
+        if request[0] == "batch":
+            return self._apply_batch(conn, request[1], request[2])
+
+        if request[0] == "open":
+            self._open(conn, *request[1:])
+            return None
+
+        _, account_number, kind, amount, idempotency_key = request
+        if idempotency_key is not None:
+            row = conn.execute(
+                "SELECT id, kind, amount, balance_after FROM ledger_entries "
+                "WHERE account_number = ? AND idempotency_key = ?",
+                (account_number, idempotency_key)
+            ).fetchone()
+            if row is not None:
+                entry_id, posted_kind, posted_amount, balance = row
+                if (posted_kind, posted_amount) != (kind, amount):
+                    raise IdempotencyConflict(
+                        f"Idempotency key {idempotency_key!r} was already used for a "
+                        f"{posted_kind} of ${from_cents(posted_amount):,.2f} on this account"
+                    )
+                return Posting(entry_id, account_number, kind, from_cents(amount), from_cents(balance), duplicate=True)
+
+        row = conn.execute(
+            "SELECT balance, daily_limit, agent_id FROM ledger_accounts WHERE account_number = ?", (account_number,)
+        ).fetchone()
+        if row is None:
+            raise UnknownAccount(f"Account {account_number} not found")
+        balance, daily_limit, agent_id = row
+
+        now = time.time()
+        if kind == "withdraw":
+            if amount > balance:
+                raise InsufficientFunds(f"Insufficient funds: available balance is ${from_cents(balance):,.2f}")
+            spent = self._spent(conn, account_number, now)
+            if spent + amount > daily_limit:
+                remaining = max(daily_limit - spent, 0)
+                raise DailyLimitExceeded(
+                    f"Daily limit exceeded: ${from_cents(remaining):,.2f} left of ${from_cents(daily_limit):,.2f}"
+                )
+            balance -= amount
+            bucket = int(now) // SPEND_BUCKET
+            conn.execute(
+                "INSERT INTO ledger_spend (account_number, bucket, amount) VALUES (?, ?, ?) "
+                "ON CONFLICT(account_number, bucket) DO UPDATE SET amount = amount + excluded.amount",
+                (account_number, bucket, amount)
+            )
+            conn.execute(
+                "DELETE FROM ledger_spend WHERE account_number = ? AND bucket < ?",
+                (account_number, _oldest_bucket(now))
+            )
+        else:
+            if balance + amount > MAX_CENTS:
+                raise LedgerError("Deposit would take the balance over the largest amount the ledger holds")
+            balance += amount
+
+        cursor = conn.execute(
+            "INSERT INTO ledger_entries (account_number, kind, amount, balance_after, idempotency_key, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (account_number, kind, amount, balance, idempotency_key, now)
+        )
+        conn.execute(
+            "UPDATE ledger_accounts SET balance = ?, entry_count = entry_count + 1 WHERE account_number = ?",
+            (balance, account_number)
+        )
+        self._add_totals(conn, [(cursor.lastrowid, account_number, agent_id, kind, amount, balance, now)])
+        return Posting(cursor.lastrowid, account_number, kind, from_cents(amount), from_cents(balance))
+
+    def _apply_batch(self, conn, entries, accounts):
+        agents = {}
+        for account_number, (version, _, _, _) in accounts.items():
+            row = conn.execute(
+                "SELECT entry_count, agent_id FROM ledger_accounts WHERE account_number = ?", (account_number,)
+            ).fetchone()
+            if row is None or row[0] != version:
+                raise StaleSnapshot(f"Account {account_number} changed while the batch was being validated")
+            agents[account_number] = row[1]
+
+        now = time.time()
+        bucket = int(now) // SPEND_BUCKET
+        # Ids are assigned here, so the totals know which entries they cover
+        first_id = conn.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM ledger_entries").fetchone()[0]
+        conn.executemany(
+            "INSERT INTO ledger_entries (id, account_number, kind, amount, balance_after, idempotency_key, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            ((first_id + i, *entry, now) for i, entry in enumerate(entries))
+        )
+        self._add_totals(conn, (
+            (first_id + i, account_number, agents.get(account_number), kind, amount, balance, now)
+            for i, (account_number, kind, amount, balance, _) in enumerate(entries)
+        ))
+        conn.executemany(
+            "UPDATE ledger_accounts SET balance = ?, entry_count = entry_count + ? WHERE account_number = ?",
+            ((balance, count, account_number) for account_number, (_, balance, count, _) in accounts.items())
+        )
+        conn.executemany(
+            "INSERT INTO ledger_spend (account_number, bucket, amount) VALUES (?, ?, ?) "
+            "ON CONFLICT(account_number, bucket) DO UPDATE SET amount = amount + excluded.amount",
+            (
+                (account_number, bucket, withdrawn)
+                for account_number, (_, _, _, withdrawn) in accounts.items()
+                if withdrawn
+            )
+        )
+        return len(entries)
+
+
+def _to_line(row) -> StatementLine:
+    entry_id, created_at, kind, amount, balance = row
+    return StatementLine(entry_id, created_at, kind, from_cents(amount), from_cents(balance))
+
+
+_ledger = None
+_ledger_lock = threading.Lock()
+
+
+def get_ledger() -> Ledger:
+    global _ledger
+    if _ledger is None:
+        with _ledger_lock:
+            if _ledger is None:
+                _ledger = Ledger()
+    return _ledger
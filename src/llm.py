@@ -0,0 +1,352 @@
+import os
+import threading
+import time
+from collections import deque
+
+import metrics
+from scheduler import INTERACTIVE, RateLimitScheduler, SchedulerFull, backoff, is_retryable, retry_after, status_code
+from session_store import Codec
+from memory import TokenBudgetMemory, count_tokens
+
+# The LangChain/Groq stack is imported on first use (or by warm_up_in_background)
+# so pages that never chat don't pay for it at cold start.
+
+SYSTEM_PROMPT = """You are a GamingPe Bot Banking Assistant, a specialized AI chatbot designed to assist users with specific banking features. You can only help with and discuss the following services:
+
+        1. Financial Transactions:
+        - Deposits and withdrawals
+        - Bank account creation and management
+        - Transaction status checking
+
+        2. User Management:
+        - Agent creation and management
+
+        3. Complaint Management:
+        - Creating complaints
+        - Tracking complaint status
+        - Deleting complaints
+
+        Important Guidelines:
+        - Only provide information about the features listed above
+        - If asked about anything outside these services, politely explain that you can only assist with the listed features
+        - Always maintain a helpful and professional tone
+        - Suggest appropriate services based on user queries
+        - Guide users through the available options
+        - Never share sensitive account information
+        - Always clarify if you need more information to assist properly
+
+        Example responses:
+        - For account queries: "I can help you create a new bank account or manage your existing one. Would you like to proceed with either of these?"
+        - For transactions: "I can assist you with deposits, withdrawals, or checking transaction status. Which service do you need?"
+        - For complaints: "I can help you create a new complaint, track an existing one, or delete a complaint. What would you like to do?"
+
+        Remember: You are specifically designed to handle these banking services and should not provide information about other banking features or services."""
+
+MEMORY_WINDOW = 5
+SYSTEM_PROMPT_TOKENS = count_tokens(SYSTEM_PROMPT)
+# How often a request waiting in the scheduler queue reports its place
+STATUS_INTERVAL = 0.5
+
+# Estimated prompt tokens of recent requests, process-wide
+_prompt_tokens = deque(maxlen=1000)
+_prompt_tokens_lock = threading.Lock()
+
+LLM_QUEUE_WAIT = metrics.histogram("llm_queue_wait_seconds", "Time waiting for the scheduler to admit a request")
+LLM_FIRST_CHUNK = metrics.histogram("llm_first_chunk_seconds", "Time from sending the prompt to the first streamed chunk")
+LLM_STREAM = metrics.histogram("llm_stream_seconds", "Time from sending the prompt to the end of the stream")
+LLM_IN_FLIGHT = metrics.gauge("llm_in_flight", "Model streams currently open")
+LLM_REQUESTS = metrics.counter("llm_requests_total", "Model requests by outcome", ("outcome",))
+LLM_RETRIES = metrics.counter("llm_retries_total", "Model requests retried after a provider error", ("status",))
+
+
+class ChatBusyError(RuntimeError):
+    pass
+
+
+class ChatConfigError(ValueError):
+    pass
+
+
+def create_chat_model():
+    """The chat model selected by CHAT_BACKEND.
+
+    "groq" (the default) is the hosted model. "fake" is a deterministic local
+    stand-in that streams canned replies with FAKE_LLM_LATENCY seconds to
+    the first token, FAKE_LLM_TOKEN_DELAY between tokens and FAKE_LLM_JITTER
+    relative variation, for tests and benchmarks without an API key.
+    FAKE_LLM_RPM and FAKE_LLM_ERROR_RATE make it throttle and fail like the
+    hosted model does under load.
+    """
+    backend = os.getenv('CHAT_BACKEND', 'groq')
+    if backend == 'fake':
+        from fake_llm import FakeStreamingChatModel
+
+        return FakeStreamingChatModel(
+            first_token_latency=float(os.getenv('FAKE_LLM_LATENCY', '0.2')),
+            token_delay=float(os.getenv('FAKE_LLM_TOKEN_DELAY', '0.02')),
+            jitter=float(os.getenv('FAKE_LLM_JITTER', '0.25')),
+            seed=int(os.getenv('FAKE_LLM_SEED', '0')),
+            requests_per_minute=float(os.getenv('FAKE_LLM_RPM', '0')),
+            error_rate=float(os.getenv('FAKE_LLM_ERROR_RATE', '0'))
+        )
+    if backend != 'groq':
+        raise ChatConfigError(f"Unknown CHAT_BACKEND {backend!r}; expected 'groq' or 'fake'")
+
+    groq_api_key = os.getenv('GROQ_API_KEY')
+    if not groq_api_key:
+        raise ChatConfigError("GROQ_API_KEY not found in environment variables")
+    from langchain_groq import ChatGroq
+
+    return ChatGroq(
+        groq_api_key=groq_api_key,
+        model_name=os.getenv('GROQ_MODEL', 'llama3-8b-8192'),
+        # Retries go through the scheduler, which knows about everyone else's
+        max_retries=0
+    )
+
+
+class ChatResources:
+    """Process-wide chat resources shared by every session.
+
+    Holds a single pooled chat model client, the compiled prompt chain and
+    the scheduler that decides when each session may stream from the model.
+    """
+
+    def __init__(self, llm, max_concurrency: int, acquire_timeout: float, requests_per_minute: float = 0,
+                 tokens_per_minute: float = 0, max_queue: int = 100, max_retries: int = 3,
+                 completion_tokens: int = 256):
+        from langchain_core.prompts import (
+            ChatPromptTemplate,
+            HumanMessagePromptTemplate,
+            MessagesPlaceholder,
+        )
+        from langchain_core.messages import SystemMessage
+
+        self.llm = llm
+        self.prompt = ChatPromptTemplate.from_messages([
+            SystemMessage(content=SYSTEM_PROMPT),
+            MessagesPlaceholder(variable_name="chat_history"),
+            HumanMessagePromptTemplate.from_template("{human_input}")
+        ])
+        self.chain = self.prompt | self.llm
+        self.max_concurrency = max_concurrency
+        self.acquire_timeout = acquire_timeout
+        self.max_retries = max_retries
+        # Reserved against the tokens-per-minute limit until the real size is known
+        self.completion_tokens = completion_tokens
+        self.scheduler = RateLimitScheduler(max_concurrency, requests_per_minute, tokens_per_minute, max_queue)
+
+    def admit(self, tokens: int, priority: int = INTERACTIVE, ticket=None):
+        """Wait for the scheduler to let a request through.
+
+        A generator: yields {"queued": position, "wait": seconds} every
+        STATUS_INTERVAL while in line, and returns the granted ticket.
+        """
+        try:
+            ticket = self.scheduler.submit(tokens, priority, ticket)
+        except SchedulerFull as e:
+            raise ChatBusyError(str(e)) from e
+        deadline = time.monotonic() + self.acquire_timeout
+        try:
+            while not self.scheduler.wait(ticket, min(STATUS_INTERVAL, max(deadline - time.monotonic(), 0))):
+                position, wait = self.scheduler.position(ticket)
+                # The estimate is a lower bound, so past the deadline it is hopeless
+                if time.monotonic() + wait >= deadline:
+                    raise ChatBusyError("The assistant is busy right now, please try again in a moment")
+                yield {"queued": position, "wait": wait}
+        except BaseException:
+            self.scheduler.cancel(ticket)
+            raise
+        return ticket
+
+
+_resources = None
+_resources_lock = threading.Lock()
+_warm_up_started = False
+
+
+def get_chat_resources() -> ChatResources:
+    global _resources
+    if _resources is None:
+        with _resources_lock:
+            if _resources is None:
+                # The hosted model's limits default to Groq's free tier; the
+                # local stand-in is unlimited unless asked otherwise
+                hosted = os.getenv('CHAT_BACKEND', 'groq') == 'groq'
+                _resources = ChatResources(
+                    llm=create_chat_model(),
+                    max_concurrency=int(os.getenv('CHAT_MAX_CONCURRENCY', '8')),
+                    acquire_timeout=float(os.getenv('CHAT_QUEUE_TIMEOUT', '30')),
+                    requests_per_minute=float(os.getenv('CHAT_RPM', '30' if hosted else '0')),
+                    tokens_per_minute=float(os.getenv('CHAT_TPM', '30000' if hosted else '0')),
+                    max_queue=int(os.getenv('CHAT_QUEUE_LIMIT', '100')),
+                    max_retries=int(os.getenv('CHAT_MAX_RETRIES', '3')),
+                    completion_tokens=int(os.getenv('CHAT_COMPLETION_TOKENS', '256'))
+                )
+                metrics.register_collector("llm_scheduler", _resources.scheduler.stats)
+    return _resources
+
+
+def create_memory():
+    # CHAT_MEMORY=window keeps the last MEMORY_WINDOW exchanges verbatim;
+    # the default token budget mode bounds prompt size regardless of verbosity
+    if os.getenv('CHAT_MEMORY', 'budget') == 'window':
+        from langchain.chains.conversation.memory import ConversationBufferWindowMemory
+
+        return ConversationBufferWindowMemory(
+            k=MEMORY_WINDOW,
+            memory_key="chat_history",
+            return_messages=True
+        )
+    return TokenBudgetMemory(
+        budget=int(os.getenv('CHAT_TOKEN_BUDGET', '1024')),
+        summary_budget=int(os.getenv('CHAT_SUMMARY_BUDGET', '256'))
+    )
+
+
+def prompt_token_stats() -> dict:
+    with _prompt_tokens_lock:
+        recent = list(_prompt_tokens)
+    return {
+        "requests": len(recent),
+        "mean": sum(recent) / len(recent) if recent else None,
+        "max": max(recent) if recent else None,
+    }
+
+
+def warm_up():
+    # Building the shared resources imports the whole chat stack; the window
+    # memory import is the one piece they don't pull in
+    try:
+        get_chat_resources()
+        if os.getenv('CHAT_MEMORY', 'budget') == 'window':
+            import langchain.chains.conversation.memory  # noqa: F401
+    except Exception:
+        # Chat setup errors are reported when chat is actually used
+        pass
+
+
+def warm_up_in_background():
+    """Import the chat stack on a daemon thread, once per process."""
+    global _warm_up_started
+    with _resources_lock:
+        if _warm_up_started:
+            return
+        _warm_up_started = True
+    threading.Thread(target=warm_up, name="chat-warm-up", daemon=True).start()
+
+
+class ChatSession:
+    """Per-session conversation state on top of the shared chat resources.
+
+    Only the memory lives in the session; the client, prompt and chain come
+    from the process-wide ChatResources.
+    """
+
+    def __init__(self, resources: ChatResources = None):
+        self.resources = resources or get_chat_resources()
+        self.memory = create_memory()
+        self.last_prompt_tokens = None
+        # Bumped whenever the memory changes, so savers can skip unchanged sessions
+        self.revision = 0
+
+    @classmethod
+    def restore(cls, state: dict, resources: ChatResources = None) -> "ChatSession":
+        session = cls(resources)
+        if state and hasattr(session.memory, "load_state"):
+            session.memory.load_state(state)
+        return session
+
+    def memory_state(self):
+        # Only the token-budget memory can be saved; window memory starts over
+        if hasattr(self.memory, "to_state"):
+            return self.memory.to_state()
+        return None
+
+    def history(self) -> list:
+        return self.memory.load_memory_variables({})["chat_history"]
+
+    def record(self, human_input: str, response: str):
+        self.memory.save_context({"human_input": human_input}, {"text": response})
+        self.revision += 1
+
+    def stream(self, inputs: dict, priority: int = INTERACTIVE):
+        """Yield {"text": chunk} as the answer streams in.
+
+        While the request waits for the scheduler it also yields
+        {"queued": position, "wait": seconds}, and before a retry after a
+        429 or 5xx from the provider {"retry": attempt, "wait": seconds}.
+        Errors after the first chunk are not retried.
+        """
+        human_input = inputs["human_input"]
+        history = self.history()
+        self.last_prompt_tokens = (
+            SYSTEM_PROMPT_TOKENS
+            + sum(count_tokens(message.content) for message in history)
+            + count_tokens(human_input)
+        )
+        with _prompt_tokens_lock:
+            _prompt_tokens.append(self.last_prompt_tokens)
+
+        resources = self.resources
+        ticket = None
+        parts = []
+        for attempt in range(resources.max_retries + 1):
+            with LLM_QUEUE_WAIT.time():
+                try:
+                    ticket = yield from resources.admit(
+                        self.last_prompt_tokens + resources.completion_tokens, priority, ticket
+                    )
+                except ChatBusyError:
+                    LLM_REQUESTS.inc(outcome="busy")
+                    raise
+            outcome = "error"
+            started = time.perf_counter()
+            try:
+                with LLM_IN_FLIGHT.track():
+                    for chunk in resources.chain.stream({"chat_history": history, "human_input": human_input}):
+                        if chunk.content:
+                            if not parts:
+                                LLM_FIRST_CHUNK.observe(time.perf_counter() - started)
+                            parts.append(chunk.content)
+                            yield {"text": chunk.content}
+                outcome = "ok"
+            except GeneratorExit:
+                outcome = "abandoned"
+                raise
+            except Exception as e:
+                if parts or attempt == resources.max_retries or not is_retryable(e):
+                    raise
+                outcome = "retried"
+                code = status_code(e)
+                delay = retry_after(e) or backoff(attempt)
+                if code == 429:
+                    # Everyone waits, not only this request
+                    resources.scheduler.throttle(delay)
+            finally:
+                used = self.last_prompt_tokens + count_tokens("".join(parts)) if outcome == "ok" else None
+                resources.scheduler.release(ticket, used)
+                LLM_REQUESTS.inc(outcome=outcome)
+                LLM_STREAM.observe(time.perf_counter() - started)
+            if outcome == "ok":
+                break
+            LLM_RETRIES.inc(status=code)
+            yield {"retry": attempt + 1, "wait": delay}
+            if code != 429:
+                # A throttled retry waits in the scheduler queue instead
+                time.sleep(delay)
+
+        self.record(human_input, "".join(parts))
+
+
+class ChatSessionCodec(Codec):
+    """Stores a ChatSession's memory in the session store."""
+
+    def version(self, session):
+        return (id(session), session.revision)
+
+    def dump(self, session):
+        return session.memory_state()
+
+    def load(self, state):
+        return ChatSession.restore(state, get_chat_resources())
@@ -1,26 +1,51 @@
 import streamlit as st
+import streamlit.components.v1 as components
 import os
-from datetime import datetime
+import re
+import secrets
+import sqlite3
 import uuid
 import time
-from langchain.chains import LLMChain
-from langchain_core.prompts import (
-    ChatPromptTemplate,
-    HumanMessagePromptTemplate,
-    MessagesPlaceholder,
-)
-from langchain_core.messages import SystemMessage
-from langchain.chains.conversation.memory import ConversationBufferWindowMemory
-from langchain_groq import ChatGroq
+from functools import wraps
 from dotenv import load_dotenv
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+from llm import ChatSession, ChatSessionCodec, get_chat_resources, warm_up_in_background
+from accounts import DuplicateAccountField, is_valid_account_number
+from credentials import CredentialsBusy
+from service import MAX_DAILY_LIMIT, get_banking_service
+from history import ChatHistory, HistoryCodec
+import metrics
+from qr import get_qr_cache
+from session_store import Codec, SessionSync, get_session_store, scoped_sid
+from streaming import StreamRenderer
 
 # Load environment variables
 load_dotenv()
 
+# Chat history kept per session, and how many messages are drawn per page
+HISTORY_LIMIT = int(os.getenv('CHAT_HISTORY_LIMIT', '200'))
+HISTORY_PAGE_SIZE = 20
+STATEMENT_PAGE_SIZE = 25
+
+APP_RERUN = metrics.histogram("app_rerun_seconds", "Full script run of the Streamlit app")
+APP_HANDLER = metrics.histogram("app_handler_seconds", "Mode handler run, including fragment reruns", ("handler",))
+CHAT_INIT_FAILURES = metrics.counter("chat_init_failures_total", "Sessions whose chatbot could not be created")
+
+def streamlit_sessions():
+    from streamlit.runtime import Runtime
+    if not Runtime.exists():
+        return {}
+    # The session manager has no public accessor on the runtime
+    manager = Runtime.instance()._session_mgr
+    return {"active": manager.num_active_sessions(), "total": manager.num_sessions()}
+
+metrics.register_collector("streamlit_sessions", streamlit_sessions)
+
 class BankingMode:
     CHAT = "chat"
     ACCOUNT = "account"
     TRANSACTION = "transaction"
+    STATEMENTS = "statements"
 
 def local_css():
     st.markdown("""
@@ -51,86 +76,161 @@ def local_css():
         </style>
     """, unsafe_allow_html=True)
 
+def render_messages(messages):
+    # One markdown element for the whole block, built from per-message cached HTML
+    if messages:
+        st.markdown("\n".join(message.html for message in messages), unsafe_allow_html=True)
+
+def show_history():
+    history = st.session_state.messages
+    visible = st.session_state.get('history_visible', HISTORY_PAGE_SIZE)
+    if len(history) > visible:
+        if st.button("⬆️ Show older messages"):
+            st.session_state.history_visible = visible + HISTORY_PAGE_SIZE
+            st.rerun()
+    render_messages(history.tail(visible))
+    st.session_state.rendered_seq = history.last_seq
+
+def rerun_fragment():
+    # Steps within a mode only rerun their own fragment. A fragment that is
+    # running as part of a full-app run can't scope its rerun, so fall back.
+    ctx = get_script_run_ctx()
+    st.rerun(scope="fragment" if ctx and ctx.fragment_ids_this_run else "app")
+
+# session_state kept in the shared session store, so a reconnect to any
+# replica resumes the wizard and the conversation. The codecs live in
+# imported modules: an instance of a class defined here would keep this
+# run's whole script namespace alive for the life of the session.
+# Account details (account_data, new_account, transaction_account and
+# private messages) stay in memory only
+PERSISTED_KEYS = {
+    'mode': Codec(),
+    'show_services': Codec(),
+    'history_visible': Codec(),
+    'account_step': Codec(),
+    'transaction_step': Codec(),
+    'transaction_type': Codec(),
+    'transaction_amount': Codec(),
+    'transaction_key': Codec(),
+    'messages': HistoryCodec(HISTORY_LIMIT),
+    'chatbot': ChatSessionCodec(),
+}
+# Only restored when the conversation actually reaches the model
+LAZY_KEYS = ('chatbot',)
+
+SESSION_COOKIE = "bank_session"
+
+def set_session_cookie(token: str, max_age: int):
+    # Streamlit can't set cookies itself, but a zero-height component frame
+    # is same-origin with the app and can
+    components.html(f"""<script>
+        parent.document.cookie = "{SESSION_COOKIE}={token}; Max-Age={max_age}; Path=/; SameSite=Strict"
+            + (parent.location.protocol === "https:" ? "; Secure" : "");
+    </script>""", height=0)
+
+def session_sync() -> SessionSync:
+    sync = st.session_state.get('session_sync')
+    if sync is None:
+        # The session token rides in a cookie, which the browser sends to
+        # whichever replica serves the reconnect but never puts in a link
+        token = st.context.cookies.get(SESSION_COOKIE, '')
+        if not re.fullmatch(r"[0-9a-f]{32}", token):
+            token = secrets.token_hex(16)
+            set_session_cookie(token, int(get_session_store().ttl))
+        if 'sid' in st.query_params:
+            # Links from when the id was in the URL; it is no longer honoured
+            del st.query_params['sid']
+        # The cookie is shared by every tab, so each tab also keeps an id of
+        # its own in the URL, where a reload or reconnect finds it again.
+        # It is useless without the cookie, so it needn't be secret
+        tab = st.query_params.get('tab', '')
+        if not re.fullmatch(r"[0-9a-f]{8}", tab):
+            tab = st.query_params['tab'] = secrets.token_hex(4)
+        sid = scoped_sid(token, tab)
+        sync = st.session_state.session_sync = SessionSync(get_session_store(), sid, PERSISTED_KEYS)
+        sync.restore(st.session_state, [key for key in PERSISTED_KEYS if key not in LAZY_KEYS])
+    return sync
+
+def persist_session(func):
+    # Fragment reruns skip the end of main(), so handlers save state themselves
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        try:
+            return func(*args, **kwargs)
+        finally:
+            session_sync().persist(st.session_state)
+    return wrapper
+
+def show_wait(placeholder, status: dict):
+    # Queue position and retries replace a bare error when the model is
+    # rate limited; the first streamed chunk overwrites the notice
+    wait = max(round(status["wait"]), 1)
+    if "retry" in status:
+        placeholder.markdown(f"⏳ The assistant is handling a lot of requests, retrying in about {wait}s...")
+    elif status["queued"] > 1:
+        placeholder.markdown(f"⏳ You're number {status['queued']} in line, about {wait}s to go...")
+    else:
+        placeholder.markdown(f"⏳ You're next, about {wait}s to go...")
+
+def wait_with_progress(futures, label: str):
+    # The KDF runs on the credential pool; polling it here keeps the page
+    # live with a rough progress bar instead of a frozen form
+    futures = list(futures)
+    expected = get_banking_service().credentials.expected_seconds()
+    started = time.perf_counter()
+    bar = st.progress(0.0, text=label)
+    while not all(future.done() for future in futures):
+        bar.progress(min((time.perf_counter() - started) / expected, 0.95), text=label)
+        time.sleep(0.05)
+    bar.empty()
+    return [future.result() for future in futures]
+
+def show_period_totals(analytics: dict):
+    if analytics["daily"]:
+        st.write("#### Last 30 days")
+        st.bar_chart(analytics["daily"], x="period", y=["deposits", "withdrawals"])
+    if analytics["monthly"]:
+        st.write("#### Monthly totals")
+        columns = ["period", "deposits", "withdrawals", "entries"]
+        if analytics["monthly"][0]["closing_balance"] is not None:
+            columns.append("closing_balance")
+        st.dataframe(
+            [{column: row[column] for column in columns} for row in analytics["monthly"]],
+            hide_index=True,
+            use_container_width=True
+        )
+
 class BankingAssistant:
     def __init__(self):
         if 'mode' not in st.session_state:
             st.session_state.mode = None
         if 'messages' not in st.session_state:
-            st.session_state.messages = []
+            st.session_state.messages = ChatHistory(HISTORY_LIMIT)
         if 'account_data' not in st.session_state:
             st.session_state.account_data = {}
-        if 'chatbot' not in st.session_state:
-            try:
-                st.session_state.chatbot = self.initialize_chatbot()
-            except Exception as e:
-                st.error(f"Error initializing chatbot: {str(e)}")
+
+    def restored_chatbot(self):
+        session_sync().restore(st.session_state, LAZY_KEYS)
+        return st.session_state.get('chatbot')
 
     def initialize_chatbot(self):
-        groq_api_key = os.getenv('GROQ_API_KEY')
-        if not groq_api_key:
-            raise ValueError("GROQ_API_KEY not found in environment variables")
-            
-        groq_chat = ChatGroq(
-            groq_api_key=groq_api_key,
-            model_name='llama3-8b-8192'
-        )
-        
-        system_prompt = """You are a GamingPe Bot Banking Assistant, a specialized AI chatbot designed to assist users with specific banking features. You can only help with and discuss the following services:
-
-        1. Financial Transactions:
-        - Deposits and withdrawals
-        - Bank account creation and management
-        - Transaction status checking
-
-        2. User Management:
-        - Agent creation and management
-
-        3. Complaint Management:
-        - Creating complaints
-        - Tracking complaint status
-        - Deleting complaints
-
-        Important Guidelines:
-        - Only provide information about the features listed above
-        - If asked about anything outside these services, politely explain that you can only assist with the listed features
-        - Always maintain a helpful and professional tone
-        - Suggest appropriate services based on user queries
-        - Guide users through the available options
-        - Never share sensitive account information
-        - Always clarify if you need more information to assist properly
-
-        Example responses:
-        - For account queries: "I can help you create a new bank account or manage your existing one. Would you like to proceed with either of these?"
-        - For transactions: "I can assist you with deposits, withdrawals, or checking transaction status. Which service do you need?"
-        - For complaints: "I can help you create a new complaint, track an existing one, or delete a complaint. What would you like to do?"
-
-        Remember: You are specifically designed to handle these banking services and should not provide information about other banking features or services."""
-        
-        memory = ConversationBufferWindowMemory(
-            k=5,
-            memory_key="chat_history",
-            return_messages=True
-        )
-        
-        prompt = ChatPromptTemplate.from_messages([
-            SystemMessage(content=system_prompt),
-            MessagesPlaceholder(variable_name="chat_history"),
-            HumanMessagePromptTemplate.from_template("{human_input}")
-        ])
-        
-        return LLMChain(
-            llm=groq_chat,
-            prompt=prompt,
-            verbose=False,
-            memory=memory
-        )
+        # The client and prompt are shared process-wide; only memory is per session
+        return ChatSession(get_chat_resources())
+
+    def add_message(self, content: str, is_user: bool = False, private: bool = False):
+        st.session_state.messages.append(content, is_user, private)
+
+    def show_new_messages(self):
+        # Messages added since the last full-app run, shown on fragment reruns
+        render_messages(st.session_state.messages.since(st.session_state.get('rendered_seq', 0)))
 
-    def add_message(self, content: str, is_user: bool = False):
-        st.session_state.messages.append({
-            "content": content,
-            "is_user": is_user,
-            "timestamp": datetime.now().strftime("%H:%M")
-        })
+    def show_account_qr(self):
+        # QR of the account just created, rendered locally and cached by content
+        account_number = st.session_state.get('new_account')
+        if account_number:
+            image = get_qr_cache().png(account_number, size=150)
+            st.image(image, caption=f"Account {account_number}", width=150)
+            st.download_button("Download QR code", image, file_name=f"account-{account_number}.png", mime="image/png")
 
     def show_feature_selection(self):
         # Show introduction text
@@ -145,6 +245,7 @@ class BankingAssistant:
         - Create new bank accounts
         - Handle deposits and withdrawals
         - Manage transactions
+        - View statements and account analytics
         
         💬 **Interactive Chat Support**
         - Answer your banking questions
@@ -160,172 +261,144 @@ class BankingAssistant:
         
         with col1:
             if st.button("🏦 Banking Services", use_container_width=True, help="Access account creation and transaction services"):
+                # The services list renders below in this same run, no rerun needed
                 st.session_state.show_services = True
-                st.rerun()
-                
+
         with col2:
             if st.button("💬 Chat with Assistant", use_container_width=True, help="Start a conversation with the banking assistant"):
                 st.session_state.mode = BankingMode.CHAT
                 self.add_message("How can I help you with your banking questions?", is_user=False)
                 st.rerun()
-        
+
         # Show services selection if the services button was clicked
-        if hasattr(st.session_state, 'show_services') and st.session_state.show_services:
+        if st.session_state.show_services:
             st.write("### Select a Banking Service:")
-            service_col1, service_col2 = st.columns(2)
-            
+            service_col1, service_col2, service_col3 = st.columns(3)
+
             with service_col1:
                 if st.button("📝 Create Account", use_container_width=True, help="Create a new bank account"):
                     st.session_state.mode = BankingMode.ACCOUNT
+                    st.session_state.account_step = 'name'
+                    st.session_state.account_data = {}
                     self.add_message("Let's create your account! What's your full name?", is_user=False)
                     st.session_state.show_services = False
                     st.rerun()
-                    
+
             with service_col2:
                 if st.button("💳 Make Transaction", use_container_width=True, help="Make a deposit or withdrawal"):
                     st.session_state.mode = BankingMode.TRANSACTION
+                    st.session_state.transaction_step = None
                     self.add_message("Would you like to make a deposit or withdrawal?", is_user=False)
                     st.session_state.show_services = False
                     st.rerun()
-                    st.session_state.mode = BankingMode.TRANSACTION
-                    self.add_message("Would you like to make a deposit or withdrawal?", is_user=False)
-                    st.session_state.show_services = False
-                    st.rerun()
-                    st.session_state.mode = BankingMode.TRANSACTION
-                    self.add_message("Would you like to make a deposit or withdrawal?", is_user=False)
-                    st.session_state.show_services = False
-                    st.rerun()
-                    st.session_state.mode = BankingMode.TRANSACTION
-                    self.add_message("Would you like to make a deposit or withdrawal?", is_user=False)
-                    st.session_state.show_services = False
-                    st.rerun()
-                    st.session_state.mode = BankingMode.TRANSACTION
-                    self.add_message("Would you like to make a deposit or withdrawal?", is_user=False)
-                    st.session_state.show_services = False
-                    st.rerun()
-                    st.session_state.mode = BankingMode.TRANSACTION
-                    self.add_message("Would you like to make a deposit or withdrawal?", is_user=False)
-                    st.session_state.show_services = False
-                    st.rerun()
-                    st.session_state.mode = BankingMode.TRANSACTION
-                    self.add_message("Would you like to make a deposit or withdrawal?", is_user=False)
-                    st.session_state.show_services = False
-                    st.rerun()
-                    st.session_state.mode = BankingMode.TRANSACTION
-                    self.add_message("Would you like to make a deposit or withdrawal?", is_user=False)
-                    st.session_state.show_services = False
-                    st.rerun()
-                    st.session_state.mode = BankingMode.TRANSACTION
-                    self.add_message("Would you like to make a deposit or withdrawal?", is_user=False)
-                    st.session_state.show_services = False
-                    st.rerun()
-                    st.session_state.mode = BankingMode.TRANSACTION
-                    self.add_message("Would you like to make a deposit or withdrawal?", is_user=False)
-                    st.session_state.show_services = False
-                    st.rerun()
-                    st.session_state.mode = BankingMode.TRANSACTION
-                    self.add_message("Would you like to make a deposit or withdrawal?", is_user=False)
-                    st.session_state.show_services = False
-                    st.rerun()
-                    st.session_state.mode = BankingMode.TRANSACTION
-                    self.add_message("Would you like to make a deposit or withdrawal?", is_user=False)
-                    st.session_state.show_services = False
-                    st.rerun()
-                    st.session_state.mode = BankingMode.TRANSACTION
-                    self.add_message("Would you like to make a deposit or withdrawal?", is_user=False)
-                    st.session_state.show_services = False
-                    st.rerun()
-                    st.session_state.mode = BankingMode.TRANSACTION
-                    self.add_message("Would you like to make a deposit or withdrawal?", is_user=False)
-                    st.session_state.show_services = False
-                    st.rerun()
-                    st.session_state.mode = BankingMode.TRANSACTION
-                    self.add_message("Would you like to make a deposit or withdrawal?", is_user=False)
-                    st.session_state.show_services = False
-                    st.rerun()
-                    st.session_state.mode = BankingMode.TRANSACTION
-                    self.add_message("Would you like to make a deposit or withdrawal?", is_user=False)
-                    st.session_state.show_services = False
-                    st.rerun()
-                    st.session_state.mode = BankingMode.TRANSACTION
-                    self.add_message("Would you like to make a deposit or withdrawal?", is_user=False)
-                    st.session_state.show_services = False
-                    st.rerun()
-                    st.session_state.mode = BankingMode.TRANSACTION
-                    self.add_message("Would you like to make a deposit or withdrawal?", is_user=False)
-                    st.session_state.show_services = False
-                    st.rerun()
-                    st.session_state.mode = BankingMode.TRANSACTION
-                    self.add_message("Would you like to make a deposit or withdrawal?", is_user=False)
-                    st.session_state.show_services = False
-                    st.rerun()
-                    st.session_state.mode = BankingMode.TRANSACTION
-                    self.add_message("Would you like to make a deposit or withdrawal?", is_user=False)
-                    st.session_state.show_services = False
-                    st.rerun()
-                    st.session_state.mode = BankingMode.TRANSACTION
-                    self.add_message("Would you like to make a deposit or withdrawal?", is_user=False)
-                    st.session_state.show_services = False
-                    st.rerun()
-                    st.session_state.mode = BankingMode.TRANSACTION
-                    self.add_message("Would you like to make a deposit or withdrawal?", is_user=False)
-                    st.session_state.show_services = False
-                    st.rerun()
-                    st.session_state.mode = BankingMode.TRANSACTION
-                    self.add_message("Would you like to make a deposit or withdrawal?", is_user=False)
-                    st.session_state.show_services = False
-                    st.rerun()
-                    st.session_state.mode = BankingMode.TRANSACTION
-                    self.add_message("Would you like to make a deposit or withdrawal?", is_user=False)
-                    st.session_state.show_services = False
-                    st.rerun()
-                    st.session_state.mode = BankingMode.TRANSACTION
-                    self.add_message("Would you like to make a deposit or withdrawal?", is_user=False)
-                    st.session_state.show_services = False
-                    st.rerun()
-                    st.session_state.mode = BankingMode.TRANSACTION
-                    self.add_message("Would you like to make a deposit or withdrawal?", is_user=False)
+
+            with service_col3:
+                if st.button("📊 Statements", use_container_width=True, help="Account statements and analytics"):
+                    st.session_state.mode = BankingMode.STATEMENTS
+                    st.session_state.statement_account = None
+                    self.add_message("Log in to see your account statement, or enter an agent ID for their totals.", is_user=False)
                     st.session_state.show_services = False
                     st.rerun()
 
+    @st.fragment
+    @persist_session
+    @metrics.timed(APP_HANDLER, handler="chat")
     def handle_chat(self):
+        self.show_new_messages()
+        # Keep the live exchange above the input box
+        conversation = st.container()
         user_input = st.chat_input("Ask me anything about banking...")
-        
-        if user_input:
-            # Add user message to chat history
-            self.add_message(user_input, is_user=True)
-            with st.chat_message("user"):
-                st.markdown(user_input)
-
-            try:
-                with st.chat_message("assistant"):
-                    # Initialize an empty string to store the full response
-                    full_response = ""
-                    # Create a placeholder for the streaming response
-                    message_placeholder = st.empty()
-                    
-                    # Stream the response
-                    for chunk in st.session_state.chatbot.stream({"human_input": user_input}):
-                        if "text" in chunk:
-                            full_response += chunk["text"]
-                            # Update the placeholder with the accumulated response
-                            message_placeholder.markdown(full_response)
-                    
-                    # Add the complete response to chat history
-                    self.add_message(full_response, is_user=False)
 
-            except Exception as e:
-                st.error(f"Error getting response: {str(e)}")
+        if user_input:
+            with conversation:
+                # Add user message to chat history
+                self.add_message(user_input, is_user=True)
+                with st.chat_message("user"):
+                    st.markdown(user_input)
+
+                # Known intents are answered locally without a model round-trip
+                route = get_banking_service().route(user_input)
+                if route.action == "switch":
+                    self.start_flow(route)
+                    st.rerun()
+                elif route.action in ("reply", "refuse"):
+                    with st.chat_message("assistant"):
+                        st.markdown(route.reply)
+                    chatbot = self.restored_chatbot()
+                    if chatbot is not None:
+                        chatbot.record(user_input, route.reply)
+                    self.add_message(route.reply, is_user=False)
+                else:
+                    self.ask_assistant(user_input)
 
         if st.button("⬅️ Back to Main Menu"):
             st.session_state.mode = None
-            st.session_state.messages = []
+            st.session_state.messages.clear()
+            st.session_state.history_visible = HISTORY_PAGE_SIZE
             st.rerun()
 
+    def start_flow(self, route):
+        if route.intent == "account_creation":
+            st.session_state.mode = BankingMode.ACCOUNT
+            st.session_state.account_step = 'name'
+            st.session_state.account_data = {}
+            self.add_message("Let's create your account! What's your full name?", is_user=False)
+        else:
+            st.session_state.mode = BankingMode.TRANSACTION
+            st.session_state.transaction_step = 'amount'
+            st.session_state.transaction_type = route.transaction_type
+            st.session_state.transaction_amount = route.amount
+            st.session_state.transaction_account = route.account_number
+            verb = "deposit" if route.transaction_type == "deposit" else "withdraw"
+            self.add_message(f"How much would you like to {verb}?", is_user=False)
+
+    def ask_assistant(self, user_input: str):
+        # Sessions that never reach the model never hold conversation memory
+        if self.restored_chatbot() is None:
+            try:
+                st.session_state.chatbot = self.initialize_chatbot()
+            except Exception as e:
+                CHAT_INIT_FAILURES.inc()
+                st.error(f"Error initializing chatbot: {str(e)}")
+                return
+
+        try:
+            with st.chat_message("assistant"):
+                # Create a placeholder for the streaming response
+                message_placeholder = st.empty()
+                # Buffer chunks and update the placeholder on a time/size cadence;
+                # cached answers arrive as a single chunk
+                renderer = StreamRenderer(message_placeholder)
+                chunks = get_banking_service().ask_stream(
+                    st.session_state.chatbot, user_input, on_status=lambda status: show_wait(message_placeholder, status)
+                )
+                # The spinner covers the wait for the model or for another
+                # session already asking the same question
+                with st.spinner("Thinking..."):
+                    renderer.write(next(chunks, ""))
+                for text in chunks:
+                    renderer.write(text)
+                full_response = renderer.close()
+
+                # Add the complete response to chat history
+                self.add_message(full_response, is_user=False)
+
+        except Exception as e:
+            st.error(f"Error getting response: {str(e)}")
+
+    @st.fragment
+    @persist_session
+    @metrics.timed(APP_HANDLER, handler="account")
     def handle_account_creation(self):
-        if 'account_step' not in st.session_state:
+        self.show_new_messages()
+        # account_data isn't persisted, so a wizard resumed past its first
+        # step on a new connection starts over
+        if not st.session_state.get('account_step') or (
+            st.session_state.account_step != 'name' and not st.session_state.account_data
+        ):
             st.session_state.account_step = 'name'
             st.session_state.account_data = {}
+        service = get_banking_service()
 
         if st.session_state.account_step == 'name':
             name = st.text_input("Full Name")
@@ -333,124 +406,345 @@ class BankingAssistant:
                 if name:
                     st.session_state.account_data['name'] = name
                     st.session_state.account_step = 'email'
-                    self.add_message(f"Thanks {name}! Please enter your email:", is_user=False)
-                    st.rerun()
+                    self.add_message(f"Thanks {name}! Please enter your email:", is_user=False, private=True)
+                    rerun_fragment()
 
         elif st.session_state.account_step == 'email':
             email = st.text_input("Email Address")
             if st.button("Continue"):
                 if email and '@' in email:
-                    st.session_state.account_data['email'] = email
-                    st.session_state.account_step = 'bank_details'
-                    self.add_message("Please enter your banking details:", is_user=False)
-                    st.rerun()
+                    try:
+                        service.check_available('email', email)
+                    except DuplicateAccountField as e:
+                        st.error(str(e))
+                    else:
+                        st.session_state.account_data['email'] = email
+                        st.session_state.account_step = 'bank_details'
+                        self.add_message("Please enter your banking details:", is_user=False)
+                        rerun_fragment()
 
         elif st.session_state.account_step == 'bank_details':
-            col1, col2 = st.columns(2)
-            with col1:
-                bank_id = st.text_input("Bank ID")
-                daily_limit = st.number_input("Daily Transaction Limit", min_value=0.0, step=1000.0)
-                ifsc_code = st.text_input("IFSC Code")
-
-            with col2:
-                upi_id = st.text_input("UPI ID")
-                login_id = st.text_input("Login ID")
-                agent_id = st.text_input("Agent ID")
-
-            if st.button("Continue"):
+            # A form submits all fields in one rerun instead of one per field
+            with st.form("bank_details"):
+                col1, col2 = st.columns(2)
+                with col1:
+                    bank_id = st.text_input("Bank ID")
+                    daily_limit = st.number_input(
+                        "Daily Transaction Limit", min_value=0.0, max_value=float(MAX_DAILY_LIMIT), step=1000.0
+                    )
+                    ifsc_code = st.text_input("IFSC Code")
+
+                with col2:
+                    upi_id = st.text_input("UPI ID")
+                    login_id = st.text_input("Login ID")
+                    agent_id = st.text_input("Agent ID")
+
+                submitted = st.form_submit_button("Continue")
+
+            if submitted:
                 if bank_id and daily_limit > 0 and ifsc_code:
-                    st.session_state.account_data.update({
-                        'bank_id': bank_id,
-                        'daily_limit': daily_limit,
-                        'ifsc_code': ifsc_code,
-                        'upi_id': upi_id,
-                        'login_id': login_id,
-                        'agent_id': agent_id
-                    })
-                    st.session_state.account_step = 'security'
-                    self.add_message("Please set up your security credentials:", is_user=False)
-                    st.rerun()
+                    try:
+                        service.check_available('upi_id', upi_id)
+                        service.check_available('login_id', login_id)
+                    except DuplicateAccountField as e:
+                        st.error(str(e))
+                    else:
+                        st.session_state.account_data.update({
+                            'bank_id': bank_id,
+                            'daily_limit': daily_limit,
+                            'ifsc_code': ifsc_code,
+                            'upi_id': upi_id,
+                            'login_id': login_id,
+                            'agent_id': agent_id
+                        })
+                        st.session_state.account_step = 'security'
+                        self.add_message("Please set up your security credentials:", is_user=False)
+                        rerun_fragment()
 
         elif st.session_state.account_step == 'security':
-            col1, col2 = st.columns(2)
-            with col1:
-                username = st.text_input("Username")
-                password = st.text_input("Password", type="password")
+            with st.form("security"):
+                col1, col2 = st.columns(2)
+                with col1:
+                    username = st.text_input("Username")
+                    password = st.text_input("Password", type="password")
 
-            with col2:
-                trxn_password = st.text_input("Transaction Password", type="password")
-                otp_access = st.checkbox("Enable OTP Access")
+                with col2:
+                    trxn_password = st.text_input("Transaction Password", type="password")
+                    otp_access = st.checkbox("Enable OTP Access")
+
+                submitted = st.form_submit_button("Complete Account Creation")
 
-            if st.button("Complete Account Creation"):
+            if submitted:
                 if username and password and trxn_password:
-                    account_number = str(uuid.uuid4())[:8]
-                    qrcode_url = f"https://api.qrserver.com/v1/create-qr-code/?size=150x150&data={account_number}"
-                    
-                    st.session_state.account_data.update({
-                        'account_number': account_number,
-                        'username': username,
-                        'password': password,
-                        'trxn_password': trxn_password,
-                        'otp_access': otp_access,
-                        'qrcode_url': qrcode_url
-                    })
-
-                    success_message = f"""Account created successfully! 🎉
-                    Account Number: {account_number}
-                    Name: {st.session_state.account_data['name']}
-                    Email: {st.session_state.account_data['email']}
-                    Bank ID: {st.session_state.account_data['bank_id']}
-                    Daily Limit: ${st.session_state.account_data['daily_limit']:,.2f}
-                    IFSC Code: {st.session_state.account_data['ifsc_code']}
-                    UPI ID: {st.session_state.account_data['upi_id']}
-                    Username: {username}"""
-
-                    self.add_message(success_message, is_user=False)
-                    st.session_state.account_step = None
-                    st.session_state.account_data = {}
-                    st.session_state.mode = None
-                    st.rerun()
+                    try:
+                        # Checked before hashing so a taken name costs no KDF time
+                        service.check_available('username', username)
+                        credentials = service.hash_credentials({'login': password, 'transaction': trxn_password})
+                        wait_with_progress(credentials.values(), "Securing your credentials...")
+                        account = service.create_account(
+                            {**st.session_state.account_data, 'username': username, 'otp_access': otp_access},
+                            credentials
+                        )
+                    except (ValueError, CredentialsBusy) as e:
+                        st.error(str(e))
+                    else:
+                        account_number = account.account_number
+                        st.session_state.account_data.update({
+                            'account_number': account_number,
+                            'username': username,
+                            'otp_access': otp_access
+                        })
+
+                        success_message = f"""Account created successfully! 🎉
+                        Account Number: {account_number}
+                        Name: {st.session_state.account_data['name']}
+                        Email: {st.session_state.account_data['email']}
+                        Bank ID: {st.session_state.account_data['bank_id']}
+                        Daily Limit: ${st.session_state.account_data['daily_limit']:,.2f}
+                        IFSC Code: {st.session_state.account_data['ifsc_code']}
+                        UPI ID: {st.session_state.account_data['upi_id']}
+                        Username: {username}"""
+
+                        self.add_message(success_message, is_user=False, private=True)
+                        st.session_state.account_step = None
+                        st.session_state.account_data = {}
+                        st.session_state.new_account = account_number
+                        st.session_state.mode = None
+                        st.rerun()
 
         if st.button("⬅️ Back to Main Menu"):
             st.session_state.mode = None
             st.session_state.account_step = None
             st.session_state.account_data = {}
-            st.session_state.messages = []
+            st.session_state.messages.clear()
+            st.session_state.history_visible = HISTORY_PAGE_SIZE
             st.rerun()
 
+    @st.fragment
+    @persist_session
+    @metrics.timed(APP_HANDLER, handler="transaction")
     def handle_transaction(self):
-        if 'transaction_step' not in st.session_state:
-            col1, col2 = st.columns(2)
+        self.show_new_messages()
+        if not st.session_state.get('transaction_step'):
+            col1, col2, col3 = st.columns(3)
             with col1:
                 if st.button("Deposit"):
                     st.session_state.transaction_step = 'amount'
                     st.session_state.transaction_type = 'deposit'
                     self.add_message("How much would you like to deposit?", is_user=False)
-                    st.rerun()
+                    rerun_fragment()
             with col2:
                 if st.button("Withdraw"):
                     st.session_state.transaction_step = 'amount'
                     st.session_state.transaction_type = 'withdraw'
                     self.add_message("How much would you like to withdraw?", is_user=False)
-                    st.rerun()
-        
+                    rerun_fragment()
+            with col3:
+                if st.button("Bulk Import", help="Post a branch spreadsheet of deposits and withdrawals"):
+                    st.session_state.transaction_step = 'bulk'
+                    st.session_state.bulk_result = None
+                    self.add_message("Upload a CSV or Parquet file with account_number, type, amount and reference columns. Every withdrawal needs its own reference so a corrected file can be uploaded again without posting it twice. Withdrawals from accounts with a transaction password are rejected; make those one at a time.", is_user=False)
+                    rerun_fragment()
+
+        elif st.session_state.transaction_step == 'bulk':
+            uploaded = st.file_uploader("Transactions file", type=["csv", "parquet"])
+            if st.button("Import Transactions", disabled=uploaded is None):
+                # pandas is only needed here, so it isn't loaded for every session
+                from bulk_import import BulkImportError, BulkImporter
+                try:
+                    with st.spinner("Importing transactions..."):
+                        st.session_state.bulk_result = BulkImporter().run(uploaded.getvalue(), uploaded.name)
+                except (BulkImportError, ValueError) as e:
+                    st.error(f"Could not import {uploaded.name}: {str(e)}")
+                except sqlite3.Error:
+                    st.error(f"Could not import {uploaded.name}: the ledger is unavailable, please try again shortly")
+
+            result = st.session_state.get('bulk_result')
+            if result is not None:
+                st.success(f"Posted {result.accepted:,} of {result.total:,} transactions")
+                if result.rejected:
+                    st.warning(f"{result.rejected:,} rows were rejected")
+                    st.download_button(
+                        "Download rejection report",
+                        data=result.report,
+                        file_name="rejected_transactions.csv",
+                        mime="text/csv"
+                    )
+
         elif st.session_state.transaction_step == 'amount':
-            amount = st.number_input("Amount", min_value=0.0, step=100.0)
+            # One key per attempt, so a repeated confirm across reruns posts only once
+            if not st.session_state.get('transaction_key'):
+                st.session_state.transaction_key = uuid.uuid4().hex
+
+            account_number = st.text_input(
+                "Account Number",
+                value=st.session_state.get('transaction_account') or ""
+            ).strip()
+            # Nothing about the account is shown before the transaction is
+            # confirmed; only a mistyped number is caught early
+            if len(account_number) == 10 and not is_valid_account_number(account_number):
+                st.warning("That account number doesn't look right, please check it")
+            amount = st.number_input(
+                "Amount",
+                min_value=0.0,
+                step=100.0,
+                value=st.session_state.get('transaction_amount') or 0.0
+            )
+            withdrawing = st.session_state.transaction_type == 'withdraw'
+            if withdrawing:
+                trxn_password = st.text_input("Transaction Password", type="password")
             if st.button("Confirm Transaction"):
-                success_message = f"""Transaction successful! 🎉
-                Type: {st.session_state.transaction_type.title()}
-                Amount: ${amount:,.2f}"""
-                self.add_message(success_message, is_user=False)
-                st.session_state.transaction_step = None
-                st.session_state.mode = None
-                st.rerun()
+                if account_number and amount > 0:
+                    service = get_banking_service()
+                    try:
+                        check = None
+                        if withdrawing:
+                            check = service.check_transaction_password(account_number, trxn_password)
+                            wait_with_progress([check], "Checking your transaction password...")
+                        posting = service.transact(
+                            account_number,
+                            st.session_state.transaction_type,
+                            amount,
+                            idempotency_key=st.session_state.transaction_key,
+                            trxn_password=check
+                        )
+                    except (ValueError, CredentialsBusy) as e:
+                        st.error(str(e))
+                    else:
+                        success_message = f"""Transaction successful! 🎉
+                Reference: {posting.entry_id}
+                Type: {posting.kind.title()}
+                Amount: ${posting.amount:,.2f}"""
+                        # Anyone with the number can deposit, so only a
+                        # withdrawal shows what is left
+                        if withdrawing:
+                            success_message += f"""
+                Balance: ${posting.balance:,.2f}"""
+                        self.add_message(success_message, is_user=False, private=True)
+                        st.session_state.transaction_step = None
+                        st.session_state.transaction_key = None
+                        st.session_state.transaction_amount = None
+                        st.session_state.transaction_account = None
+                        st.session_state.mode = None
+                        st.rerun()
 
         if st.button("⬅️ Back to Main Menu"):
             st.session_state.mode = None
             st.session_state.transaction_step = None
-            st.session_state.messages = []
+            st.session_state.transaction_key = None
+            st.session_state.transaction_amount = None
+            st.session_state.transaction_account = None
+            st.session_state.bulk_result = None
+            st.session_state.messages.clear()
+            st.session_state.history_visible = HISTORY_PAGE_SIZE
+            st.rerun()
+
+    @st.fragment
+    @persist_session
+    @metrics.timed(APP_HANDLER, handler="statements")
+    def handle_statements(self):
+        self.show_new_messages()
+        service = get_banking_service()
+        view = st.radio("View", ["Account", "Agent"], horizontal=True)
+        if view == "Account":
+            self.show_account_statement(service)
+        else:
+            self.show_agent_analytics(service)
+
+        if st.button("⬅️ Back to Main Menu"):
+            st.session_state.mode = None
+            st.session_state.statement_account = None
+            st.session_state.messages.clear()
+            st.session_state.history_visible = HISTORY_PAGE_SIZE
             st.rerun()
 
+    def show_account_statement(self, service):
+        # Statements are only shown for the account the holder logged in to;
+        # the login stays in memory and is never persisted
+        account_number = st.session_state.get('statement_account')
+        if account_number is None:
+            with st.form("statement_login"):
+                username = st.text_input("Username")
+                password = st.text_input("Password", type="password")
+                submitted = st.form_submit_button("Log In")
+            if submitted:
+                try:
+                    account = service.authenticate(username.strip(), password)
+                except (ValueError, CredentialsBusy) as e:
+                    st.error(str(e))
+                else:
+                    st.session_state.statement_account = account.account_number
+                    st.session_state.statement_cursors = [None]
+                    rerun_fragment()
+            return
+        col1, col2 = st.columns([3, 1])
+        col1.caption(f"Account {account_number}")
+        with col2:
+            if st.button("Log Out"):
+                st.session_state.statement_account = None
+                rerun_fragment()
+
+        # Every figure here comes from totals kept as entries are posted
+        analytics = service.account_analytics(account_number)
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Balance", f"${analytics['balance']:,.2f}")
+        col2.metric("Spent in the last 24h", f"${analytics['spent_today']:,.2f}")
+        col3.metric("Daily limit", f"${analytics['daily_limit']:,.2f}")
+        utilization = analytics['limit_utilization'] or 0.0
+        st.progress(min(utilization, 1.0), text=f"{utilization:.0%} of the daily limit used")
+        show_period_totals(analytics)
+
+        st.write("#### Statement")
+        cursors = st.session_state.statement_cursors
+        page = service.statement(account_number, cursors[-1], STATEMENT_PAGE_SIZE)
+        if not page["lines"]:
+            st.caption("No transactions yet")
+            return
+        st.dataframe(
+            [
+                {
+                    "Reference": line["entry_id"],
+                    "Date (UTC)": time.strftime("%Y-%m-%d %H:%M", time.gmtime(line["created_at"])),
+                    "Type": line["kind"].title(),
+                    "Amount": line["amount"] if line["kind"] == "deposit" else -line["amount"],
+                    "Balance": line["balance"],
+                }
+                for line in page["lines"]
+            ],
+            hide_index=True,
+            use_container_width=True
+        )
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            if st.button("Newer", disabled=len(cursors) == 1):
+                cursors.pop()
+                rerun_fragment()
+        with col2:
+            if st.button("Older", disabled=page["next_cursor"] is None):
+                cursors.append(page["next_cursor"])
+                rerun_fragment()
+        with col3:
+            # Built only on request; the service streams it a page at a time
+            if st.button("Prepare CSV export"):
+                st.download_button(
+                    "Download statement CSV",
+                    data="".join(service.statement_csv(account_number)),
+                    file_name=f"statement-{account_number}.csv",
+                    mime="text/csv"
+                )
+
+    def show_agent_analytics(self, service):
+        agent_id = st.text_input("Agent ID").strip()
+        if not agent_id:
+            return
+        analytics = service.agent_analytics(agent_id)
+        recent = analytics["daily"]
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Accounts", f"{analytics['accounts']:,}")
+        col2.metric("Deposits, last 30 days", f"${sum(row['deposits'] for row in recent):,.2f}")
+        col3.metric("Withdrawals, last 30 days", f"${sum(row['withdrawals'] for row in recent):,.2f}")
+        show_period_totals(analytics)
+
 def main():
     st.set_page_config(
         page_title="Banking Assistant",
@@ -458,9 +752,13 @@ def main():
         initial_sidebar_state="collapsed"
     )
     local_css()
+    metrics.start_exporters()
 
     st.title("💬 GamingPe Banking Assistant")
 
+    # Resume this browser session's state before anything reads it
+    session_sync()
+
     # Initialize the assistant
     assistant = BankingAssistant()
     
@@ -469,17 +767,16 @@ def main():
         st.session_state.show_services = False
 
     # Display chat history
-    for message in st.session_state.messages:
-        message_class = "user-message" if message["is_user"] else "assistant-message"
-        st.markdown(
-            f"""<div class="chat-message {message_class}">
-                {'You' if message["is_user"] else 'Assistant'}: {message["content"]}
-            </div>""",
-            unsafe_allow_html=True
-        )
+    show_history()
 
-    # Handle different modes
+    # The new account's QR code stays up until another mode is entered
+    if st.session_state.mode is not None:
+        st.session_state.new_account = None
+
+    # Handle different modes; each handler is a fragment that reruns on its own
+    # until the mode changes
     if st.session_state.mode is None:
+        assistant.show_account_qr()
         assistant.show_feature_selection()
     elif st.session_state.mode == BankingMode.CHAT:
         assistant.handle_chat()
@@ -487,6 +784,17 @@ def main():
         assistant.handle_account_creation()
     elif st.session_state.mode == BankingMode.TRANSACTION:
         assistant.handle_transaction()
+    elif st.session_state.mode == BankingMode.STATEMENTS:
+        assistant.handle_statements()
+
+    # The page is on screen; load the chat stack off the script thread
+    if os.getenv('CHAT_WARM_UP', '1') == '1':
+        warm_up_in_background()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    with APP_RERUN.time():
+        try:
+            main()
+        finally:
+            # Runs after st.rerun() too; the store writes it behind the rerun
+            session_sync().persist(st.session_state)
\ No newline at end of file
@@ -0,0 +1,104 @@
+import re
+from collections import deque
+
+_TOKEN = re.compile(r"\w+|[^\w\s]")
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s")
+
+# Words kept from each side of a turn when it is folded into the summary
+SUMMARY_WORDS = 24
+
+
+def count_tokens(text: str) -> int:
+    # Local estimate: one token per word or punctuation mark, plus one per
+    # extra six characters of a long word. Close enough to budget with.
+    return sum(1 + len(piece) // 6 for piece in _TOKEN.findall(text))
+
+
+def _clip(text: str, words: int) -> str:
+    parts = text.split()
+    if len(parts) <= words:
+        return " ".join(parts)
+    return " ".join(parts[:words]) + " ..."
+
+
+class TokenBudgetMemory:
+    """Conversation memory held under a hard token budget.
+
+    Recent turns are kept verbatim. When they no longer fit, the oldest turn
+    is folded into a running summary: one compact line per turn, appended
+    rather than regenerated, with the oldest lines dropped once the summary
+    has its own budget spent. The summary is returned as a message after the
+    fixed system prompt, so the system prompt stays a stable, cacheable prefix.
+    """
+
+    def __init__(self, budget: int = 1024, summary_budget: int = 256):
+        self.budget = budget
+        self.summary_budget = min(summary_budget, budget)
+        self.turns = deque()
+        self.summary = deque()
+        self.turn_tokens = 0
+        self.summary_tokens = 0
+
+    @property
+    def tokens(self) -> int:
+        return self.turn_tokens + self.summary_tokens
+
+    def load_memory_variables(self, inputs: dict) -> dict:
+        from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+
+        messages = []
+        if self.summary:
+            lines = "\n".join(line for line, _ in self.summary)
+            messages.append(SystemMessage(content=f"Summary of the earlier conversation:\n{lines}"))
+        for human, ai, _ in self.turns:
+            messages.append(HumanMessage(content=human))
+            messages.append(AIMessage(content=ai))
+        return {"chat_history": messages}
+
+    def save_context(self, inputs: dict, outputs: dict):
+        human = inputs["human_input"]
+        ai = outputs["text"]
+        tokens = count_tokens(human) + count_tokens(ai)
+        self.turns.append((human, ai, tokens))
+        self.turn_tokens += tokens
+        while self.turns and self.tokens > self.budget:
+            self._fold(self.turns.popleft())
+
+    def to_state(self) -> dict:
+        return {
+            "turns": [list(turn) for turn in self.turns],
+            "summary": [list(line) for line in self.summary],
+        }
+
+    def load_state(self, state: dict):
+        self.clear()
+        for line, tokens in state["summary"]:
+            self.summary.append((line, tokens))
+            self.summary_tokens += tokens
+        for human, ai, tokens in state["turns"]:
+            self.turns.append((human, ai, tokens))
+            self.turn_tokens += tokens
+        # The budgets may have been lowered since the state was saved
+        while self.turns and self.tokens > self.budget:
+            self._fold(self.turns.popleft())
+        while self.summary and self.summary_tokens > self.summary_budget:
+            _, dropped = self.summary.popleft()
+            self.summary_tokens -= dropped
+
+    def clear(self):
+        self.turns.clear()
+        self.summary.clear()
+        self.turn_tokens = 0
+        self.summary_tokens = 0
+
+    def _fold(self, turn):
+        human, ai, tokens = turn
+        self.turn_tokens -= tokens
+        answer = _SENTENCE_END.split(ai.strip(), 1)[0]
+        line = f"- User: {_clip(human, SUMMARY_WORDS)} / Assistant: {_clip(answer, SUMMARY_WORDS)}"
+        line_tokens = count_tokens(line)
+        self.summary.append((line, line_tokens))
+        self.summary_tokens += line_tokens
+        while self.summary and self.summary_tokens > self.summary_budget:
+            _, dropped = self.summary.popleft()
+            self.summary_tokens -= dropped
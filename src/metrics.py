@@ -0,0 +1,462 @@
+"""Process-wide counters, gauges and latency histograms.
+
+Recording is off unless METRICS_ENABLED=1; while off every record call
+returns after one flag check, so instrumentation can stay on hot paths.
+Metrics are exported as Prometheus text (METRICS_PORT, or the API's
+/metrics route) and/or a JSON line every METRICS_LOG_INTERVAL seconds.
+METRICS_PROFILE=1 additionally runs a sampling profiler whose collapsed
+stacks are served at /profile.
+"""
+import json
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter as _Tally
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+ENABLED = os.getenv('METRICS_ENABLED', '0') == '1'
+
+_NAME_INVALID = re.compile(r"[^a-zA-Z0-9_]")
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_metrics = {}
+_collectors = {}
+_registry_lock = threading.Lock()
+
+
+def set_enabled(flag: bool):
+    global ENABLED
+    ENABLED = flag
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(label, "")) for label in self.labels)
+
+    def _label_text(self, key: tuple, extra: str = "") -> str:
+        pairs = [f'{label}="{_escape(value)}"' for label, value in zip(self.labels, key)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        if not ENABLED:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            return [(f"{self.name}{self._label_text(key)}", value) for key, value in self._values.items()]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        if not ENABLED:
+            return
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels):
+        if not ENABLED:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def track(self, **labels):
+        """Context manager counting the block as in flight while it runs."""
+        if not ENABLED:
+            return _NOOP
+        return _InFlight(self, labels)
+
+    def samples(self):
+        with self._lock:
+            return [(f"{self.name}{self._label_text(key)}", value) for key, value in self._values.items()]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        if not ENABLED:
+            return
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # Per-bucket counts (last one is +Inf), then sum
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            counts = state[0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            else:
+                counts[-1] += 1
+            state[1] += value
+
+    def time(self, **labels):
+        """Context manager observing how long the block takes."""
+        if not ENABLED:
+            return _NOOP
+        return _Timer(self, labels)
+
+    def samples(self):
+        lines = []
+        with self._lock:
+            items = [(key, list(state[0]), state[1]) for key, state in self._values.items()]
+        for key, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                extra = f'le="{le}"'
+                lines.append((f"{self.name}_bucket{self._label_text(key, extra)}", cumulative))
+            lines.append((f"{self.name}_sum{self._label_text(key)}", total))
+            lines.append((f"{self.name}_count{self._label_text(key)}", cumulative))
+        return lines
+
+    def summary(self) -> dict:
+        """Count, mean and approximate p50/p95 per label set, for the JSON log."""
+        with self._lock:
+            items = [(key, list(state[0]), state[1]) for key, state in self._values.items()]
+        result = {}
+        for key, counts, total in items:
+            count = sum(counts)
+            result[",".join(key) or "all"] = {
+                "count": count,
+                "mean": total / count if count else None,
+                "p50": self._quantile(counts, count, 0.5),
+                "p95": self._quantile(counts, count, 0.95),
+            }
+        return result
+
+    def _quantile(self, counts: list, count: int, fraction: float):
+        # Upper bound of the bucket holding the quantile
+        if not count:
+            return None
+        seen = 0
+        for bound, bucket in zip(self.buckets + (float("inf"),), counts):
+            seen += bucket
+            if seen >= count * fraction:
+                return bound
+        return float("inf")
+
+
+class _Timer:
+    __slots__ = ("histogram", "labels", "started")
+
+    def __init__(self, histogram: Histogram, labels: dict):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started, **self.labels)
+
+
+class _InFlight:
+    __slots__ = ("gauge", "labels")
+
+    def __init__(self, gauge: Gauge, labels: dict):
+        self.gauge = gauge
+        self.labels = labels
+
+    def __enter__(self):
+        self.gauge.inc(**self.labels)
+        return self
+
+    def __exit__(self, *exc):
+        self.gauge.dec(**self.labels)
+
+
+class _NoOp:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+_NOOP = _NoOp()
+
+
+def _register(cls, name: str, help: str, labels: tuple, **kwargs):
+    # Get-or-create, so modules Streamlit re-executes on every rerun can
+    # declare their metrics at top level
+    metric = _metrics.get(name)
+    if metric is None:
+        with _registry_lock:
+            metric = _metrics.get(name)
+            if metric is None:
+                metric = _metrics[name] = cls(name, help, labels, **kwargs)
+    return metric
+
+
+def counter(name: str, help: str, labels: tuple = ()) -> Counter:
+    return _register(Counter, name, help, labels)
+
+
+def gauge(name: str, help: str, labels: tuple = ()) -> Gauge:
+    return _register(Gauge, name, help, labels)
+
+
+def histogram(name: str, help: str, labels: tuple = (), buckets: tuple = DEFAULT_BUCKETS) -> Histogram:
+    return _register(Histogram, name, help, labels, buckets=buckets)
+
+
+def timed(metric: Histogram, **labels):
+    """Decorator observing each call's duration in metric."""
+    def decorate(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not ENABLED:
+                return func(*args, **kwargs)
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                metric.observe(time.perf_counter() - started, **labels)
+        return wrapper
+    return decorate
+
+
+def register_collector(prefix: str, collect):
+    """Export the numeric values of collect() as gauges named prefix_key.
+
+    Collectors run only at export time, so existing stats() functions can be
+    exported without touching their hot paths.
+    """
+    with _registry_lock:
+        _collectors[prefix] = collect
+
+
+def _collected() -> dict:
+    values = {}
+    for prefix, collect in list(_collectors.items()):
+        try:
+            stats = collect()
+        except Exception:
+            continue
+        for key, value in (stats or {}).items():
+            name = _NAME_INVALID.sub("_", f"{prefix}_{key}")
+            if isinstance(value, dict):
+                # One level of breakdown, e.g. decisions per intent, becomes a label
+                for part, count in value.items():
+                    if _is_number(count):
+                        values[f'{name}{{key="{_escape(str(part))}"}}'] = count
+            elif _is_number(value):
+                values[name] = value
+    return values
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def render_prometheus() -> str:
+    lines = []
+    for metric in sorted(_metrics.values(), key=lambda metric: metric.name):
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(f"{name} {_number(value)}" for name, value in metric.samples())
+    typed = set()
+    for name, value in sorted(_collected().items()):
+        family = name.split("{", 1)[0]
+        if family not in typed:
+            typed.add(family)
+            lines.append(f"# TYPE {family} gauge")
+        lines.append(f"{name} {_number(value)}")
+    return "\n".join(lines) + "\n"
+
+
+def snapshot() -> dict:
+    result = {"time": time.time()}
+    for metric in _metrics.values():
+        if isinstance(metric, Histogram):
+            result[metric.name] = metric.summary()
+        else:
+            with metric._lock:
+                result[metric.name] = {",".join(key) or "all": value for key, value in metric._values.items()}
+    result.update(_collected())
+    return result
+
+
+def _number(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class SamplingProfiler:
+    """Statistical profiler sampling every thread's stack on an interval.
+
+    Samples are kept as collapsed stacks ("outer;inner;leaf count"), the
+    input format of flamegraph tools. Sampling costs one sys._current_frames()
+    walk per interval and nothing on the profiled threads themselves.
+    """
+
+    def __init__(self, interval: float = 0.01, max_depth: int = 64):
+        self.interval = interval
+        self.max_depth = max_depth
+        self.samples = 0
+        self._stacks = _Tally()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self) -> "SamplingProfiler":
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            with self._lock:
+                for ident, frame in frames.items():
+                    if ident == own:
+                        continue
+                    self._stacks[self._collapse(frame)] += 1
+                self.samples += 1
+
+    def _collapse(self, frame) -> str:
+        names = []
+        while frame is not None and len(names) < self.max_depth:
+            code = frame.f_code
+            names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+            frame = frame.f_back
+        return ";".join(reversed(names))
+
+    def collapsed(self, reset: bool = False) -> str:
+        with self._lock:
+            stacks = self._stacks.most_common()
+            if reset:
+                self._stacks.clear()
+                self.samples = 0
+        return "".join(f"{stack} {count}\n" for stack, count in stacks)
+
+
+_profiler = None
+_exporters_started = False
+
+
+def profile(seconds: float = None) -> str:
+    """Collapsed stacks from the running profiler, or from a fresh one run for seconds."""
+    if seconds is None and _profiler is not None:
+        return _profiler.collapsed()
+    profiler = SamplingProfiler().start()
+    time.sleep(min(seconds or 5.0, 60.0))
+    profiler.stop()
+    return profiler.collapsed()
+
+
+class _ExportHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == "/metrics":
+            body = render_prometheus()
+            content_type = "text/plain; version=0.0.4"
+        elif url.path == "/metrics.json":
+            body = json.dumps(snapshot())
+            content_type = "application/json"
+        elif url.path == "/profile":
+            seconds = parse_qs(url.query).get("seconds")
+            body = profile(float(seconds[0]) if seconds else None)
+            content_type = "text/plain"
+        else:
+            self.send_error(404)
+            return
+        data = body.encode()
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _log_forever(interval: float, path: str):
+    while True:
+        time.sleep(interval)
+        line = json.dumps(snapshot(), default=str)
+        if path:
+            with open(path, "a") as f:
+                f.write(line + "\n")
+        else:
+            print(line, file=sys.stderr, flush=True)
+
+
+def start_exporters():
+    """Start the configured exporters and profiler, once per process."""
+    global _exporters_started, _profiler
+    if _exporters_started:
+        return
+    with _registry_lock:
+        if _exporters_started:
+            return
+        _exporters_started = True
+
+    port = os.getenv('METRICS_PORT')
+    if port:
+        server = ThreadingHTTPServer((os.getenv('METRICS_HOST', '127.0.0.1'), int(port)), _ExportHandler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name="metrics-exporter", daemon=True).start()
+
+    interval = float(os.getenv('METRICS_LOG_INTERVAL', '0'))
+    if interval > 0:
+        threading.Thread(
+            target=_log_forever, args=(interval, os.getenv('METRICS_LOG_FILE')),
+            name="metrics-log", daemon=True
+        ).start()
+
+    if os.getenv('METRICS_PROFILE', '0') == '1':
+        _profiler = SamplingProfiler(float(os.getenv('METRICS_PROFILE_INTERVAL', '0.01'))).start()
@@ -0,0 +1,147 @@
+import hashlib
+import io
+import os
+import threading
+from collections import OrderedDict
+
+import segno
+
+# Bumped when rendering changes so old cached images are not served
+RENDER_VERSION = 1
+QUIET_ZONE = 4
+
+
+def render_png(payload: str, size: int) -> bytes:
+    """Render payload as a QR code PNG about size pixels square."""
+    qr = segno.make(payload, error="m")
+    modules, _ = qr.symbol_size(scale=1, border=QUIET_ZONE)
+    buffer = io.BytesIO()
+    qr.save(buffer, kind="png", scale=max(1, size // modules), border=QUIET_ZONE)
+    return buffer.getvalue()
+
+
+class QRCache:
+    """Content-addressed cache of rendered QR codes.
+
+    Images are keyed by a hash of payload, size and renderer version. A small
+    in-memory LRU sits in front of a directory of PNG files that is itself
+    bounded, evicting the least recently used file; both survive payloads
+    being rendered again by any session.
+    """
+
+    def __init__(self, directory: str, max_entries: int = 256, max_files: int = 4096):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.max_files = max_files
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(directory, exist_ok=True)
+        # Least recently used first, as on the last run
+        files = [entry for entry in os.scandir(directory) if entry.name.endswith(".png")]
+        files.sort(key=lambda entry: entry.stat().st_mtime)
+        self._files = OrderedDict((entry.name[:-4], None) for entry in files)
+
+    def make_key(self, payload: str, size: int) -> str:
+        return hashlib.sha256(f"{RENDER_VERSION}\0{size}\0{payload}".encode()).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.png")
+
+    def png(self, payload: str, size: int = 150) -> bytes:
+        key = self.make_key(payload, size)
+        with self._lock:
+            image = self._entries.get(key)
+            if image is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return image
+            on_disk = key in self._files
+
+        image = self._read(key) if on_disk else None
+        with self._lock:
+            if image is not None:
+                self.disk_hits += 1
+            else:
+                self.misses += 1
+        if image is None:
+            image = render_png(payload, size)
+            self._write(key, image)
+
+        with self._lock:
+            self._entries[key] = image
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            if key in self._files:
+                self._files.move_to_end(key)
+        return image
+
+    def _read(self, key: str):
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                image = f.read()
+            os.utime(path)
+        except OSError:
+            with self._lock:
+                self._files.pop(key, None)
+            return None
+        return image
+
+    def _write(self, key: str, image: bytes):
+        path = self._path(key)
+        # Write then rename so a reader never sees half a file
+        temporary = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(temporary, "wb") as f:
+                f.write(image)
+            os.replace(temporary, path)
+        except OSError:
+            # The disk tier is best effort; the image is still served from memory
+            return
+        evicted = []
+        with self._lock:
+            self._files[key] = None
+            self._files.move_to_end(key)
+            while len(self._files) > self.max_files:
+                evicted.append(self._files.popitem(last=False)[0])
+                self.evictions += 1
+        for old in evicted:
+            try:
+                os.remove(self._path(old))
+            except OSError:
+                pass
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "files": len(self._files),
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": round((self.hits + self.disk_hits) / lookups, 3) if lookups else None,
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_qr_cache() -> QRCache:
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = QRCache(
+                    directory=os.getenv('QR_CACHE_DIR', '.qr_cache'),
+                    max_entries=int(os.getenv('QR_CACHE_SIZE', '256')),
+                    max_files=int(os.getenv('QR_CACHE_FILES', '4096'))
+                )
+    return _cache
@@ -0,0 +1,148 @@
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+_PUNCTUATION = re.compile(r"[^\w\s]")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize(text: str) -> str:
+    # "How do I make a deposit?" and "how do i make a deposit" share an entry
+    text = _PUNCTUATION.sub(" ", text.lower())
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+class Flight:
+    """A single in-progress LLM call that other sessions can wait on."""
+
+    def __init__(self, key: str):
+        self.key = key
+        self.followers = 0
+        self.started = time.monotonic()
+        self._done = threading.Event()
+        self._value = None
+
+    def wait(self, timeout: float = None):
+        # Returns None if the leader failed or timed out
+        self._done.wait(timeout)
+        return self._value
+
+
+class ResponseCache:
+    """Bounded LRU + TTL cache of assistant answers.
+
+    Keys combine the normalized user input with a fingerprint of the recent
+    conversation window. Identical requests that arrive while the first one
+    is still streaming are merged onto that call instead of hitting the model.
+    """
+
+    def __init__(self, max_entries: int = 512, ttl: float = 3600.0, context_messages: int = 2):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.context_messages = context_messages
+        self._entries = OrderedDict()
+        self._flights = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.merged = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.saved_seconds = 0.0
+
+    def make_key(self, user_input: str, history: list) -> str:
+        digest = hashlib.blake2b(digest_size=16)
+        recent = history[-self.context_messages:] if self.context_messages else []
+        for message in recent:
+            digest.update(message.type.encode())
+            digest.update(b"\x00")
+            digest.update(normalize(message.content).encode())
+            digest.update(b"\x01")
+        digest.update(b"\x02")
+        digest.update(normalize(user_input).encode())
+        return digest.hexdigest()
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at, cost = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            self.saved_seconds += cost
+            return value
+
+    def join(self, key: str) -> tuple:
+        """Join the in-flight call for key, or start one.
+
+        Returns (flight, is_leader). The leader must finish the flight with
+        complete() or abandon(); followers wait() on it.
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                flight.followers += 1
+                self.merged += 1
+                return flight, False
+            flight = Flight(key)
+            self._flights[key] = flight
+            self.misses += 1
+            return flight, True
+
+    def complete(self, flight: Flight, value: str):
+        cost = time.monotonic() - flight.started
+        with self._lock:
+            self._flights.pop(flight.key, None)
+            if value:
+                self.saved_seconds += cost * flight.followers
+                self._entries[flight.key] = (value, time.monotonic() + self.ttl, cost)
+                self._entries.move_to_end(flight.key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+        flight._value = value or None
+        flight._done.set()
+
+    def abandon(self, flight: Flight):
+        with self._lock:
+            self._flights.pop(flight.key, None)
+        flight._done.set()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses + self.merged
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "merged": self.merged,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_ratio": (self.hits + self.merged) / lookups if lookups else 0.0,
+                "saved_seconds": round(self.saved_seconds, 3),
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> ResponseCache:
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ResponseCache(
+                    max_entries=int(os.getenv('CHAT_CACHE_SIZE', '512')),
+                    ttl=float(os.getenv('CHAT_CACHE_TTL', '3600')),
+                    context_messages=int(os.getenv('CHAT_CACHE_CONTEXT_MESSAGES', '2'))
+                )
+    return _cache
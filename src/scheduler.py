@@ -0,0 +1,259 @@
+import heapq
+import itertools
+import random
+import threading
+import time
+
+# Lower runs first; a chat someone is watching outranks batch work
+INTERACTIVE = 0
+BACKGROUND = 10
+
+PRIORITIES = {"interactive": INTERACTIVE, "background": BACKGROUND}
+
+
+class SchedulerFull(RuntimeError):
+    pass
+
+
+class TokenBucket:
+    """Allowance that refills at rate per second up to capacity.
+
+    A limit of N per minute is a bucket of capacity N refilling at N/60, so
+    a quiet period allows a burst of up to a minute's worth.
+    """
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60
+        self.level = self.capacity
+        self._updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_for(self, amount: float, now: float) -> float:
+        """Seconds until amount is available; 0 when it is now."""
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) / self.rate
+
+    def take(self, amount: float, now: float):
+        self._refill(now)
+        self.level -= min(amount, self.capacity)
+
+    def give(self, amount: float, now: float):
+        # Corrections after the fact; the level may go negative on overuse
+        self._refill(now)
+        self.level = min(self.capacity, self.level + amount)
+
+    def drain(self, now: float):
+        self._refill(now)
+        self.level = min(self.level, 0.0)
+
+
+class Ticket:
+    """One request's place in the scheduler queue."""
+
+    __slots__ = ("priority", "seq", "tokens", "enqueued", "granted", "attempts")
+
+    def __init__(self, priority: int, seq: int, tokens: int):
+        self.priority = priority
+        self.seq = seq
+        self.tokens = tokens
+        self.enqueued = time.monotonic()
+        self.granted = False
+        self.attempts = 0
+
+    def __lt__(self, other):
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class RateLimitScheduler:
+    """Process-wide admission control in front of the chat model.
+
+    Requests queue by priority, then arrival, and are let through when a
+    concurrency slot is free and the provider's requests-per-minute and
+    tokens-per-minute allowances, modelled as token buckets, cover them.
+    A limit of 0 is not enforced. When the provider throttles anyway,
+    throttle() holds every grant until its retry-after has passed.
+
+    There is no dispatcher thread: waiters re-check the head of the queue
+    whenever a slot is released, the state changes, or the buckets are due
+    to have refilled.
+    """
+
+    def __init__(self, max_concurrency: int, requests_per_minute: float = 0, tokens_per_minute: float = 0,
+                 max_queue: int = 100):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.in_flight = 0
+        self.granted = 0
+        self.rejected = 0
+        self.throttled = 0
+        self._queue = []
+        self._seq = itertools.count()
+        self._paused_until = 0.0
+        self._cond = threading.Condition()
+
+    def submit(self, tokens: int, priority: int = INTERACTIVE, ticket: Ticket = None) -> Ticket:
+        """Queue a request for tokens; pass ticket back in to retry it in its old place."""
+        with self._cond:
+            if len(self._queue) >= self.max_queue:
+                self.rejected += 1
+                raise SchedulerFull("The assistant is busy right now, please try again in a moment")
+            if ticket is None:
+                ticket = Ticket(priority, next(self._seq), tokens)
+            ticket.granted = False
+            heapq.heappush(self._queue, ticket)
+            self._dispatch(time.monotonic())
+        return ticket
+
+    def wait(self, ticket: Ticket, timeout: float) -> bool:
+        """Block up to timeout seconds for ticket to be let through."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while not ticket.granted:
+                now = time.monotonic()
+                if now >= deadline:
+                    return False
+                ready_in = self._dispatch(now)
+                if ticket.granted:
+                    break
+                self._cond.wait(min(deadline - now, ready_in if ready_in is not None else deadline - now))
+        return True
+
+    def cancel(self, ticket: Ticket):
+        with self._cond:
+            if ticket.granted:
+                self._release(ticket, None)
+            elif ticket in self._queue:
+                self._queue.remove(ticket)
+                heapq.heapify(self._queue)
+                self._dispatch(time.monotonic())
+            self._cond.notify_all()
+
+    def release(self, ticket: Ticket, used_tokens: int = None):
+        """Free ticket's slot; used_tokens corrects the token estimate it was let in with."""
+        with self._cond:
+            self._release(ticket, used_tokens)
+            self._cond.notify_all()
+
+    def _release(self, ticket: Ticket, used_tokens):
+        ticket.granted = False
+        self.in_flight -= 1
+        now = time.monotonic()
+        if self.tokens is not None and used_tokens is not None:
+            self.tokens.give(ticket.tokens - used_tokens, now)
+        self._dispatch(now)
+
+    def throttle(self, delay: float):
+        """The provider pushed back: let nothing through for delay seconds."""
+        with self._cond:
+            now = time.monotonic()
+            self.throttled += 1
+            self._paused_until = max(self._paused_until, now + delay)
+            # Whatever the model thought was left clearly isn't
+            if self.requests is not None:
+                self.requests.drain(now)
+            if self.tokens is not None:
+                self.tokens.drain(now)
+
+    def _wait_at_head(self, ticket: Ticket, now: float) -> float:
+        wait = max(self._paused_until - now, 0.0)
+        if self.requests is not None:
+            wait = max(wait, self.requests.wait_for(1, now))
+        if self.tokens is not None:
+            wait = max(wait, self.tokens.wait_for(ticket.tokens, now))
+        return wait
+
+    def _dispatch(self, now: float):
+        # Grants from the head of the queue only, so a large request is not
+        # starved by smaller ones behind it. Returns seconds until the head
+        # could go, or None when only a release can unblock it.
+        while self._queue and self.in_flight < self.max_concurrency:
+            head = self._queue[0]
+            wait = self._wait_at_head(head, now)
+            if wait > 0:
+                return wait
+            heapq.heappop(self._queue)
+            if self.requests is not None:
+                self.requests.take(1, now)
+            if self.tokens is not None:
+                self.tokens.take(head.tokens, now)
+            head.granted = True
+            head.attempts += 1
+            self.in_flight += 1
+            self.granted += 1
+            self._cond.notify_all()
+        return None
+
+    def position(self, ticket: Ticket):
+        """(place in line counting from 1, estimated seconds to go) for a waiting ticket."""
+        with self._cond:
+            if ticket.granted or ticket not in self._queue:
+                return 0, 0.0
+            now = time.monotonic()
+            ahead = [queued for queued in self._queue if queued < ticket]
+            # The buckets must cover everything ahead of ticket, and ticket itself
+            wait = max(self._paused_until - now, 0.0)
+            if self.requests is not None:
+                self.requests._refill(now)
+                wait = max(wait, (len(ahead) + 1 - self.requests.level) / self.requests.rate)
+            if self.tokens is not None:
+                self.tokens._refill(now)
+                needed = sum(queued.tokens for queued in ahead) + ticket.tokens
+                wait = max(wait, (needed - self.tokens.level) / self.tokens.rate)
+            return len(ahead) + 1, max(wait, 0.0)
+
+    def stats(self) -> dict:
+        with self._cond:
+            now = time.monotonic()
+            stats = {
+                "queued": len(self._queue),
+                "in_flight": self.in_flight,
+                "granted": self.granted,
+                "rejected": self.rejected,
+                "throttled": self.throttled,
+                "paused_seconds": max(self._paused_until - now, 0.0),
+            }
+            if self.requests is not None:
+                self.requests._refill(now)
+                stats["requests_available"] = self.requests.level
+            if self.tokens is not None:
+                self.tokens._refill(now)
+                stats["tokens_available"] = self.tokens.level
+            return stats
+
+
+def status_code(error: BaseException):
+    """HTTP status of a provider error, if it carries one."""
+    code = getattr(error, "status_code", None)
+    if code is None:
+        code = getattr(getattr(error, "response", None), "status_code", None)
+    return code if isinstance(code, int) else None
+
+
+def is_retryable(error: BaseException) -> bool:
+    code = status_code(error)
+    return code == 429 or (code is not None and code >= 500)
+
+
+def retry_after(error: BaseException):
+    """Seconds the provider asked us to wait, from a Retry-After header."""
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    value = headers.get("retry-after") if hasattr(headers, "get") else None
+    try:
+        return max(float(value), 0.0) if value is not None else None
+    except ValueError:
+        return None
+
+
+def backoff(attempt: int, base: float = 0.5, cap: float = 20.0) -> float:
+    # Full jitter: anywhere up to the exponential step, so throttled clients
+    # don't come back in lockstep
+    return random.uniform(0, min(cap, base * 2 ** attempt))
@@ -0,0 +1,513 @@
+import csv
+import hashlib
+import hmac
+import io
+import math
+import os
+import re
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from functools import wraps
+
+import metrics
+from accounts import UNIQUE_FIELDS, Account, DuplicateAccountField, get_account_store, is_valid_account_number
+from credentials import CredentialsBusy, InvalidCredentials, get_credential_service, needs_rehash
+from intent_router import get_intent_router
+from ledger import Posting, UnknownAccount, from_cents, get_ledger, period_of
+from llm import ChatSession, get_chat_resources, prompt_token_stats
+from response_cache import get_response_cache
+from scheduler import INTERACTIVE, PRIORITIES
+from streaming import stream_stats
+
+# How long a caller waits on an identical in-flight question before asking itself
+CACHE_FLIGHT_TIMEOUT = 60
+
+REQUIRED_ACCOUNT_FIELDS = ("name", "email", "bank_id", "daily_limit", "ifsc_code", "username")
+MAX_DAILY_LIMIT = 1_000_000_000
+# Optional account fields that are stored or hashed as text
+ACCOUNT_TEXT_FIELDS = (
+    "name", "email", "bank_id", "ifsc_code", "upi_id", "login_id", "agent_id", "username",
+    "password", "trxn_password",
+)
+TRANSACTION_KINDS = ("deposit", "withdraw")
+# Credential kind -> the field its password arrives in
+CREDENTIAL_FIELDS = {"login": "password", "transaction": "trxn_password"}
+STATEMENT_PAGE_LIMIT = 500
+STATEMENT_CSV_COLUMNS = ("entry_id", "date", "type", "amount", "balance")
+# get_account fields only the account's owner is shown
+PRIVATE_ACCOUNT_FIELDS = ("email", "upi_id", "login_id", "username", "balance", "spent_today")
+_DATE = re.compile(r"\d{4}-\d{2}-\d{2}")
+
+
+SERVICE_CALLS = metrics.histogram("service_call_seconds", "Banking service operation latency", ("operation",))
+SERVICE_ERRORS = metrics.counter("service_errors_total", "Banking service operations that raised", ("operation", "error"))
+CHAT_SESSIONS = metrics.gauge("service_chat_sessions", "Chat sessions held for API clients")
+
+metrics.register_collector("response_cache", lambda: get_response_cache().stats())
+metrics.register_collector("intent_router", lambda: get_intent_router().stats())
+metrics.register_collector("chat_stream", stream_stats)
+metrics.register_collector("prompt_tokens", prompt_token_stats)
+
+
+class ValidationError(ValueError):
+    pass
+
+
+class AuthenticationRequired(ValueError):
+    """The request needs an access token and came without a valid one."""
+
+
+class AccessDenied(ValueError):
+    """The access token is for a different account."""
+
+
+def _text(value, name: str):
+    # API clients can send any JSON type; only strings go on to the stores
+    if value is not None and not isinstance(value, str):
+        raise ValidationError(f"{name} must be a string")
+    return value
+
+
+def _instrumented(operation: str):
+    timer = metrics.timed(SERVICE_CALLS, operation=operation)
+
+    def decorate(func):
+        timed = timer(func)
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            try:
+                return timed(*args, **kwargs)
+            except Exception as e:
+                SERVICE_ERRORS.inc(operation=operation, error=type(e).__name__)
+                raise
+        return wrapper
+    return decorate
+
+
+class BankingService:
+    """Account, transaction and chat operations with no UI attached.
+
+    The Streamlit app and the HTTP API are both thin clients of this class.
+    Every method is blocking and safe to call from many threads at once;
+    per-conversation chat state is either passed in by the caller or kept
+    here in a bounded table keyed by session id.
+    """
+
+    def __init__(self, accounts=None, ledger=None, credentials=None, max_sessions: int = 1000,
+                 token_secret: bytes = None, token_ttl: float = 3600):
+        self.accounts = accounts or get_account_store()
+        self.ledger = ledger or get_ledger()
+        self.credentials = credentials or get_credential_service()
+        self.max_sessions = max_sessions
+        # Without a configured secret, tokens only hold for this process
+        self.token_secret = token_secret or secrets.token_bytes(32)
+        self.token_ttl = token_ttl
+        self._sessions = OrderedDict()
+        self._sessions_lock = threading.Lock()
+
+    # Accounts
+
+    def check_available(self, field: str, value: str):
+        if field not in UNIQUE_FIELDS:
+            raise ValidationError(f"{field} is not a unique account field")
+        _text(value, field)
+        if value and self.accounts.exists(field, value):
+            raise DuplicateAccountField(field)
+
+    def hash_credentials(self, passwords: dict) -> dict:
+        """Start hashing {kind: password} on the credential pool; returns {kind: Future}.
+
+        Callers that can do something else meanwhile hash early and pass the
+        futures to create_account.
+        """
+        unknown = set(passwords) - set(CREDENTIAL_FIELDS)
+        if unknown:
+            raise ValidationError(f"Unknown credential kind(s): {', '.join(sorted(unknown))}")
+        return {kind: self.credentials.hash_async(password) for kind, password in passwords.items() if password}
+
+    @_instrumented("create_account")
+    def create_account(self, data: dict, credentials: dict = None) -> Account:
+        """Validate and store a new account.
+
+        credentials maps kind to a hash, or to a Future of one from
+        hash_credentials. Without it, any "password" and "trxn_password" in
+        data are hashed here; the plain passwords are never stored.
+        """
+        for field in ACCOUNT_TEXT_FIELDS:
+            _text(data.get(field), field)
+        missing = [field for field in REQUIRED_ACCOUNT_FIELDS if not data.get(field)]
+        if missing:
+            raise ValidationError(f"Missing required field(s): {', '.join(missing)}")
+        if '@' not in str(data["email"]):
+            raise ValidationError("Email address is not valid")
+        try:
+            daily_limit = float(data["daily_limit"])
+        except (TypeError, ValueError):
+            raise ValidationError("Daily limit must be a number")
+        if not math.isfinite(daily_limit):
+            raise ValidationError("Daily limit must be a number")
+        if daily_limit <= 0:
+            raise ValidationError("Daily limit must be greater than zero")
+        if daily_limit > MAX_DAILY_LIMIT:
+            raise ValidationError(f"Daily limit can be at most ${MAX_DAILY_LIMIT:,}")
+
+        if credentials is None:
+            credentials = self.hash_credentials({kind: data.get(field) for kind, field in CREDENTIAL_FIELDS.items()})
+        hashes = {
+            kind: value.result() if isinstance(value, Future) else value for kind, value in credentials.items()
+        }
+
+        # The ledger row commits with the account row, so an account can't
+        # exist without somewhere to post to
+        return self.accounts.create(
+            {**data, "daily_limit": daily_limit}, hashes,
+            on_create=lambda conn, account: self.ledger.open_account_in(
+                conn, account.account_number, account.daily_limit, account.agent_id
+            )
+        )
+
+    def _verify(self, account_number, kind: str, password: str, encoded) -> Future:
+        check = self.credentials.verify_async(password or "", encoded)
+        if encoded is not None and needs_rehash(encoded, self.credentials.params):
+            check.add_done_callback(lambda done: self._rehash(done, account_number, kind, password))
+        return check
+
+    def _rehash(self, check: Future, account_number: str, kind: str, password: str):
+        # Moves a hash made at an older cost to the current one while the password is at hand
+        if check.exception() is not None or not check.result():
+            return
+        try:
+            hashed = self.credentials.hash_async(password)
+        except CredentialsBusy:
+            # Left for a later sign-in
+            return
+
+        def store(done: Future):
+            if done.exception() is None:
+                self.accounts.set_credential(account_number, kind, done.result())
+        hashed.add_done_callback(store)
+
+    @_instrumented("authenticate")
+    def authenticate(self, username: str, password: str) -> Account:
+        _text(username, "username")
+        _text(password, "password")
+        account = self.accounts.find_by("username", username) if username else None
+        # Unknown users still pay for a verification, so timing doesn't reveal them
+        encoded = self.accounts.credential(account.account_number, "login") if account else None
+        if not self._verify(account and account.account_number, "login", password, encoded).result():
+            raise InvalidCredentials("Username or password is incorrect")
+        return account
+
+    def _token_signature(self, claim: str) -> str:
+        return hmac.new(self.token_secret, claim.encode(), hashlib.sha256).hexdigest()
+
+    def issue_token(self, account_number: str) -> dict:
+        """A signed access token for account_number, valid for token_ttl seconds."""
+        expires_at = int(time.time() + self.token_ttl)
+        claim = f"{account_number}.{expires_at}"
+        return {"token": f"{claim}.{self._token_signature(claim)}", "expires_at": expires_at}
+
+    def token_account(self, token: str) -> str:
+        """The account number token was issued for; raises if it is forged or expired."""
+        claim, _, signature = (token or "").rpartition(".")
+        account_number, _, expires_at = claim.partition(".")
+        if not (signature and hmac.compare_digest(signature, self._token_signature(claim))):
+            raise AuthenticationRequired("Access token is invalid; log in again")
+        if int(expires_at) < time.time():
+            raise AuthenticationRequired("Access token has expired; log in again")
+        return account_number
+
+    def authorize(self, token: str, account_number: str):
+        """Raise unless token was issued for account_number."""
+        if not token:
+            raise AuthenticationRequired("Log in first and send the access token")
+        if self.token_account(token) != account_number:
+            raise AccessDenied("That access token is for a different account")
+
+    def check_transaction_password(self, account_number: str, password: str) -> Future:
+        """Start checking a withdrawal's transaction password; a Future of whether it passed.
+
+        Accounts opened without a transaction password always pass.
+        """
+        encoded = self.accounts.credential(account_number, "transaction")
+        if encoded is None:
+            passed = Future()
+            passed.set_result(True)
+            return passed
+        return self._verify(account_number, "transaction", password, encoded)
+
+    def find_account(self, account_number: str):
+        if not is_valid_account_number(account_number):
+            return None
+        return self.accounts.get(account_number)
+
+    @_instrumented("get_account")
+    def get_account(self, account_number: str, owner: bool = True) -> dict:
+        """Account details and balance; anyone but the owner gets them without PRIVATE_ACCOUNT_FIELDS."""
+        account = self.find_account(account_number)
+        if account is None:
+            raise UnknownAccount(f"Account {account_number} not found")
+        if not owner:
+            return {field: value for field, value in account._asdict().items() if field not in PRIVATE_ACCOUNT_FIELDS}
+        return {
+            **account._asdict(),
+            "balance": self.ledger.balance(account_number),
+            "spent_today": self.ledger.spent_today(account_number),
+        }
+
+    # Transactions
+
+    @_instrumented("transact")
+    def transact(self, account_number: str, kind: str, amount, idempotency_key: str = None,
+                 trxn_password=None) -> Posting:
+        """Post a deposit or withdrawal.
+
+        Withdrawals need the account's transaction password, if it has one:
+        the password itself, or the Future from check_transaction_password.
+        """
+        if kind not in TRANSACTION_KINDS:
+            raise ValidationError(f"Transaction type must be one of: {', '.join(TRANSACTION_KINDS)}")
+        try:
+            amount = float(amount)
+        except (TypeError, ValueError):
+            raise ValidationError("Amount must be a number")
+        if not math.isfinite(amount):
+            raise ValidationError("Amount must be a number")
+        if not account_number:
+            raise ValidationError("Account number is required")
+        _text(account_number, "account_number")
+        _text(idempotency_key, "idempotency_key")
+        if kind == "withdraw":
+            check = trxn_password
+            if not isinstance(check, Future):
+                check = self.check_transaction_password(account_number, _text(trxn_password, "trxn_password"))
+            if not check.result():
+                raise InvalidCredentials("Transaction password is incorrect")
+        return self.ledger.post(account_number, kind, amount, idempotency_key=idempotency_key)
+
+    # Statements and analytics
+
+    def _date(self, value, name: str):
+        if value in (None, ""):
+            return None
+        if not _DATE.fullmatch(str(value)):
+            raise ValidationError(f"{name} must be a date as YYYY-MM-DD")
+        return str(value)
+
+    def _require_account(self, account_number: str):
+        if self.find_account(account_number) is None:
+            raise UnknownAccount(f"Account {account_number} not found")
+
+    @_instrumented("statement")
+    def statement(self, account_number: str, cursor=None, limit=50, since=None, until=None) -> dict:
+        """A page of entries, newest first, with running balance.
+
+        Pass the returned next_cursor back for the page after; it is None on
+        the last page.
+        """
+        try:
+            limit = int(limit)
+            cursor = int(cursor) if cursor not in (None, "") else None
+        except (TypeError, ValueError, OverflowError):
+            raise ValidationError("cursor and limit must be whole numbers")
+        if not 1 <= limit <= STATEMENT_PAGE_LIMIT:
+            raise ValidationError(f"limit must be between 1 and {STATEMENT_PAGE_LIMIT}")
+        self._require_account(account_number)
+        lines = self.ledger.statement(
+            account_number, cursor, limit, self._date(since, "since"), self._date(until, "until")
+        )
+        return {
+            "account_number": account_number,
+            "lines": [line._asdict() for line in lines],
+            "next_cursor": lines[-1].entry_id if len(lines) == limit else None,
+        }
+
+    def statement_csv(self, account_number: str, since=None, until=None):
+        """Yield the statement as CSV text, oldest first, one chunk per page of entries."""
+        since, until = self._date(since, "since"), self._date(until, "until")
+        self._require_account(account_number)
+
+        def chunks():
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(STATEMENT_CSV_COLUMNS)
+            for page in self.ledger.iter_statement(account_number, since, until):
+                for line in page:
+                    writer.writerow((
+                        line.entry_id,
+                        time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(line.created_at)),
+                        line.kind,
+                        f"{line.amount:.2f}",
+                        f"{line.balance:.2f}",
+                    ))
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+            if buffer.tell():
+                yield buffer.getvalue()
+
+        # Validation above runs now, not when the first chunk is pulled
+        return chunks()
+
+    @_instrumented("account_analytics")
+    def account_analytics(self, account_number: str, days: int = 30, months: int = 12) -> dict:
+        """Balance, daily-limit utilization and daily and monthly totals, read from the kept aggregates."""
+        self._require_account(account_number)
+        snapshot = self.ledger.snapshot([account_number]).get(account_number)
+        if snapshot is None:
+            raise UnknownAccount(f"Account {account_number} not found")
+        daily_limit = from_cents(snapshot.daily_limit)
+        totals = self._period_totals("account", account_number, days, months)
+        for row in totals["daily"]:
+            row["limit_utilization"] = row["withdrawals"] / daily_limit if daily_limit else None
+        return {
+            "account_number": account_number,
+            "balance": from_cents(snapshot.balance),
+            "daily_limit": daily_limit,
+            "spent_today": from_cents(snapshot.spent),
+            "limit_utilization": snapshot.spent / snapshot.daily_limit if snapshot.daily_limit else None,
+            **totals,
+        }
+
+    @_instrumented("agent_analytics")
+    def agent_analytics(self, agent_id: str, days: int = 30, months: int = 12) -> dict:
+        agent_id = (agent_id or "").strip()
+        if not agent_id:
+            raise ValidationError("Agent ID is required")
+        return {
+            "agent_id": agent_id,
+            "accounts": self.accounts.count_by_agent(agent_id),
+            **self._period_totals("agent", agent_id, days, months),
+        }
+
+    def _period_totals(self, scope: str, key: str, days: int, months: int) -> dict:
+        try:
+            days, months = int(days), int(months)
+        except (TypeError, ValueError, OverflowError):
+            raise ValidationError("days and months must be whole numbers")
+        if not (1 <= days <= 366 and 1 <= months <= 120):
+            raise ValidationError("days must be between 1 and 366 and months between 1 and 120")
+        now = time.time()
+        today = time.gmtime(now)
+        # Months counted from year 0, so stepping back crosses years cleanly
+        first_month = today.tm_year * 12 + today.tm_mon - 1 - (months - 1)
+        since_day = period_of(now - (days - 1) * 86400, "day")
+        since_month = f"{first_month // 12:04d}-{first_month % 12 + 1:02d}"
+        return {
+            "daily": [row._asdict() for row in self.ledger.totals(scope, key, "day", since=since_day)],
+            "monthly": [row._asdict() for row in self.ledger.totals(scope, key, "month", since=since_month)],
+        }
+
+    # Chat
+
+    def route(self, text: str):
+        return get_intent_router().route(text)
+
+    def ask_stream(self, chat: ChatSession, text: str, priority: int = INTERACTIVE, on_status=None):
+        """Yield the assistant's answer to text in chunks.
+
+        Answers come from the shared response cache when possible, and a
+        question already being asked by another caller is waited on rather
+        than sent to the model twice. on_status, if given, is called with
+        the stream's queue and retry updates while the model is waited on.
+        """
+        cache = get_response_cache()
+        key = cache.make_key(text, chat.history())
+
+        response = cache.get(key)
+        if response is None:
+            flight, is_leader = cache.join(key)
+            if not is_leader:
+                response = flight.wait(timeout=CACHE_FLIGHT_TIMEOUT)
+
+        if response is not None:
+            chat.record(text, response)
+            yield response
+            return
+
+        parts = []
+        try:
+            for chunk in chat.stream({"human_input": text}, priority):
+                if "text" in chunk:
+                    parts.append(chunk["text"])
+                    yield chunk["text"]
+                elif on_status is not None:
+                    on_status(chunk)
+        except BaseException:
+            if is_leader:
+                cache.abandon(flight)
+            raise
+        if is_leader:
+            cache.complete(flight, "".join(parts))
+
+    def chat_session(self, session_id: str):
+        """The conversation and its lock for session_id, created on first use."""
+        with self._sessions_lock:
+            entry = self._sessions.get(session_id)
+            if entry is not None:
+                self._sessions.move_to_end(session_id)
+                return entry
+        entry = (ChatSession(get_chat_resources()), threading.Lock())
+        with self._sessions_lock:
+            entry = self._sessions.setdefault(session_id, entry)
+            self._sessions.move_to_end(session_id)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+            CHAT_SESSIONS.set(len(self._sessions))
+        return entry
+
+    @_instrumented("chat")
+    def chat(self, session_id: str, text: str, priority: str = "interactive") -> dict:
+        text = (_text(text, "message") or "").strip()
+        if not text:
+            raise ValidationError("Message is required")
+        if not isinstance(priority, str) or priority not in PRIORITIES:
+            raise ValidationError(f"Priority must be one of: {', '.join(PRIORITIES)}")
+
+        route = self.route(text)
+        reply = {
+            "action": route.action,
+            "intent": route.intent,
+            "reply": route.reply,
+            "transaction_type": route.transaction_type,
+            "amount": route.amount,
+        }
+        if route.action == "switch":
+            # Flows are driven by the client; tell it which one to start
+            return reply
+
+        if route.action in ("reply", "refuse"):
+            # Canned answers still belong in the conversation, if there is one
+            with self._sessions_lock:
+                entry = self._sessions.get(session_id)
+            if entry is not None:
+                with entry[1]:
+                    entry[0].record(text, route.reply)
+            return reply
+
+        chat, lock = self.chat_session(session_id)
+        with lock:
+            reply["reply"] = "".join(self.ask_stream(chat, text, PRIORITIES[priority]))
+        return reply
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_banking_service() -> BankingService:
+    global _service
+    if _service is None:
+        with _service_lock:
+            if _service is None:
+                _service = BankingService(
+                    max_sessions=int(os.getenv('CHAT_API_SESSIONS', '1000')),
+                    # Replicas behind one load balancer need the same secret
+                    token_secret=os.getenv('API_TOKEN_SECRET', '').encode() or None,
+                    token_ttl=float(os.getenv('API_TOKEN_TTL', '3600'))
+                )
+    return _service
@@ -0,0 +1,335 @@
+import atexit
+import hashlib
+import json
+import os
+import threading
+import time
+import zlib
+
+from db import connect, database_path
+
+# Values at least this large are stored deflated
+COMPRESS_MIN_BYTES = 512
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS session_state (
+    sid TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value BLOB NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (sid, key)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS session_state_updated ON session_state(updated_at);
+"""
+
+
+def encode(value) -> bytes:
+    # Compact JSON, deflated when that pays off; the first byte says which
+    data = json.dumps(value, separators=(",", ":"), ensure_ascii=False).encode()
+    if len(data) >= COMPRESS_MIN_BYTES:
+        packed = zlib.compress(data, 6)
+        if len(packed) < len(data):
+            return b"z" + packed
+    return b"j" + data
+
+
+def decode(data: bytes):
+    tag, body = data[:1], data[1:]
+    if tag == b"z":
+        body = zlib.decompress(body)
+    elif tag != b"j":
+        raise ValueError(f"Unknown session value encoding {tag!r}")
+    return json.loads(body)
+
+
+class SessionStore:
+    """Interface of a session-state backend shared by every replica.
+
+    Values are opaque bytes keyed by session id and key. A backend for a
+    networked store only has to implement these calls; batching and lazy
+    loading are handled above it.
+    """
+
+    def load(self, sid: str, keys) -> dict:
+        """The stored values of keys for sid; missing keys are left out."""
+        raise NotImplementedError
+
+    def write(self, batch: dict):
+        """Apply {(sid, key): value} in one round-trip; a value of None deletes."""
+        raise NotImplementedError
+
+    def purge(self, older_than: float) -> int:
+        """Drop sessions not written since the older_than timestamp."""
+        raise NotImplementedError
+
+
+class MemorySessionStore(SessionStore):
+    """In-process backend, for a single replica or tests."""
+
+    def __init__(self):
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def load(self, sid: str, keys) -> dict:
+        with self._lock:
+            return {key: self._values[sid, key][0] for key in keys if (sid, key) in self._values}
+
+    def write(self, batch: dict):
+        now = time.time()
+        with self._lock:
+            for item, value in batch.items():
+                if value is None:
+                    self._values.pop(item, None)
+                else:
+                    self._values[item] = (value, now)
+
+    def purge(self, older_than: float) -> int:
+        with self._lock:
+            latest = {}
+            for (sid, _), (_, updated) in self._values.items():
+                latest[sid] = max(latest.get(sid, 0), updated)
+            stale = {sid for sid, updated in latest.items() if updated < older_than}
+            for item in [item for item in self._values if item[0] in stale]:
+                del self._values[item]
+        return len(stale)
+
+
+class SQLiteSessionStore(SessionStore):
+    """Session state in a SQLite table, one row per session key."""
+
+    def __init__(self, path: str = None):
+        self.path = path or database_path()
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        self._writer = connect(self.path)
+        self._writer.executescript(SCHEMA)
+
+    def _reader(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = connect(self.path)
+        return conn
+
+    def load(self, sid: str, keys) -> dict:
+        keys = list(keys)
+        if not keys:
+            return {}
+        rows = self._reader().execute(
+            f"SELECT key, value FROM session_state WHERE sid = ? AND key IN ({', '.join('?' * len(keys))})",
+            (sid, *keys)
+        ).fetchall()
+        return {key: bytes(value) for key, value in rows}
+
+    def write(self, batch: dict):
+        now = time.time()
+        upserts = [(sid, key, value, now) for (sid, key), value in batch.items() if value is not None]
+        deletes = [(sid, key) for (sid, key), value in batch.items() if value is None]
+        with self._write_lock:
+            conn = self._writer
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.executemany(
+                    "INSERT INTO session_state (sid, key, value, updated_at) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT(sid, key) DO UPDATE SET value = excluded.value, updated_at = excluded.updated_at",
+                    upserts
+                )
+                conn.executemany("DELETE FROM session_state WHERE sid = ? AND key = ?", deletes)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+    def purge(self, older_than: float) -> int:
+        with self._write_lock:
+            cursor = self._writer.execute(
+                "DELETE FROM session_state WHERE sid IN "
+                "(SELECT sid FROM session_state GROUP BY sid HAVING MAX(updated_at) < ?)",
+                (older_than,)
+            )
+            return cursor.rowcount
+
+
+class WriteBehindStore(SessionStore):
+    """Buffers writes in memory and flushes them to a backend in batches.
+
+    Repeated writes to the same key between flushes collapse into one, and
+    reruns never wait on the backend. Reads see buffered writes first, so a
+    replica always reads its own writes.
+    """
+
+    def __init__(self, backend: SessionStore, flush_interval: float = 0.5, ttl: float = 7 * 86400):
+        self.backend = backend
+        self.flush_interval = flush_interval
+        self.ttl = ttl
+        self.flushes = 0
+        self._pending = {}
+        self._flushing = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._last_purge = 0.0
+        threading.Thread(target=self._run, name="session-write-behind", daemon=True).start()
+        atexit.register(self.flush)
+
+    def load(self, sid: str, keys) -> dict:
+        keys = list(keys)
+        values = {}
+        with self._lock:
+            for key in keys:
+                if (sid, key) in self._pending:
+                    values[key] = self._pending[sid, key]
+                elif (sid, key) in self._flushing:
+                    values[key] = self._flushing[sid, key]
+        missing = [key for key in keys if key not in values]
+        if missing:
+            values.update(self.backend.load(sid, missing))
+        return {key: value for key, value in values.items() if value is not None}
+
+    def write(self, batch: dict):
+        with self._lock:
+            self._pending.update(batch)
+
+    def purge(self, older_than: float) -> int:
+        return self.backend.purge(older_than)
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                # Stays readable until the backend has it
+                batch = self._flushing = self._pending
+                self._pending = {}
+            if not batch:
+                return
+            try:
+                self.backend.write(batch)
+            except Exception:
+                # Keep the batch unless newer writes replaced it meanwhile
+                with self._lock:
+                    for item, value in batch.items():
+                        self._pending.setdefault(item, value)
+                raise
+            finally:
+                with self._lock:
+                    self._flushing = {}
+            self.flushes += 1
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+                now = time.time()
+                if self.ttl and now - self._last_purge > 3600:
+                    self._last_purge = now
+                    self.purge(now - self.ttl)
+            except Exception:
+                # The backend is unavailable; the batch is retried next interval
+                pass
+
+
+def scoped_sid(token: str, tab: str) -> str:
+    """The store's id for one tab of the browser session whose cookie holds token.
+
+    Every tab shares the cookie, so without the tab they would overwrite each
+    other's state. Hashed, so the store's rows can't be replayed as cookies.
+    """
+    return hashlib.sha256(f"{token}:{tab}".encode()).hexdigest()
+
+
+_ABSENT = object()
+
+
+class Codec:
+    """How one session_state value is stored.
+
+    version() must be cheap: it runs for every persisted key on every rerun,
+    and the value is only encoded when its version changed.
+    """
+
+    def version(self, value):
+        return json.dumps(value, separators=(",", ":"), sort_keys=True, default=str)
+
+    def dump(self, value):
+        return value
+
+    def load(self, state):
+        return state
+
+
+class SessionSync:
+    """Keeps one browser session's st.session_state in a SessionStore.
+
+    Keys are restored lazily: each is fetched from the store at most once
+    per process, the first time a caller asks for it. After every run the
+    keys whose version changed are handed to the store, which writes them
+    behind the rerun.
+    """
+
+    def __init__(self, store: SessionStore, sid: str, codecs: dict):
+        self.store = store
+        self.sid = sid
+        self.codecs = codecs
+        self._loaded = set()
+        self._versions = {}
+
+    def restore(self, state, keys):
+        wanted = [key for key in keys if key not in self._loaded]
+        if not wanted:
+            return
+        self._loaded.update(wanted)
+        for key, data in self.store.load(self.sid, wanted).items():
+            if key in state:
+                # Set during this run before it was asked for; that value wins
+                continue
+            codec = self.codecs[key]
+            try:
+                value = codec.load(decode(data))
+            except Exception:
+                # Unreadable or no longer restorable; the key starts fresh
+                continue
+            state[key] = value
+            self._versions[key] = codec.version(value)
+
+    def persist(self, state):
+        batch = {}
+        for key, codec in self.codecs.items():
+            if key in state:
+                value = state[key]
+                version = codec.version(value)
+            elif key in self._loaded:
+                # Restored or checked earlier and removed since
+                version = _ABSENT
+            else:
+                # Never asked for and never set here; leave the stored copy alone
+                continue
+            if self._versions.get(key, _ABSENT) == version:
+                continue
+            self._loaded.add(key)
+            self._versions[key] = version
+            batch[self.sid, key] = None if version is _ABSENT else encode(codec.dump(value))
+        if batch:
+            self.store.write(batch)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_session_store() -> SessionStore:
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                backend = os.getenv('SESSION_STORE', 'sqlite')
+                if backend == 'sqlite':
+                    store = SQLiteSessionStore(os.getenv('SESSION_DB_PATH') or database_path())
+                elif backend == 'memory':
+                    store = MemorySessionStore()
+                else:
+                    raise ValueError(f"Unknown SESSION_STORE {backend!r}; expected 'sqlite' or 'memory'")
+                _store = WriteBehindStore(
+                    store,
+                    flush_interval=float(os.getenv('SESSION_FLUSH_INTERVAL', '0.5')),
+                    ttl=float(os.getenv('SESSION_TTL', str(7 * 86400)))
+                )
+    return _store
@@ -0,0 +1,99 @@
+import threading
+import time
+from collections import deque
+
+# Recent per-response timings, process-wide
+_recent = deque(maxlen=1000)
+_recent_lock = threading.Lock()
+
+
+class StreamRenderer:
+    """Coalesces streamed LLM chunks into periodic placeholder updates.
+
+    Chunks are buffered in a list and pushed to the placeholder at most every
+    flush_interval seconds or once flush_chars new characters have arrived,
+    instead of re-rendering the whole response for every token.
+    """
+
+    def __init__(self, placeholder, flush_interval: float = 0.05, flush_chars: int = 64):
+        self.placeholder = placeholder
+        self.flush_interval = flush_interval
+        self.flush_chars = flush_chars
+        self.started = time.perf_counter()
+        self.first_token_at = None
+        self.finished_at = None
+        self.flushes = 0
+        self._parts = []
+        self._pending = 0
+        self._last_flush = None
+
+    def write(self, text: str):
+        if not text:
+            return
+        now = time.perf_counter()
+        if self.first_token_at is None:
+            self.first_token_at = now
+        self._parts.append(text)
+        self._pending += len(text)
+        # The first token is shown right away; later ones on the cadence
+        if (
+            self._last_flush is None
+            or self._pending >= self.flush_chars
+            or now - self._last_flush >= self.flush_interval
+        ):
+            self.flush(now)
+
+    def flush(self, now: float = None):
+        if self._pending == 0 and self._last_flush is not None:
+            return
+        text = self.text
+        self.placeholder.markdown(text)
+        self._pending = 0
+        self._last_flush = now or time.perf_counter()
+        self.flushes += 1
+
+    @property
+    def text(self) -> str:
+        if len(self._parts) > 1:
+            self._parts = ["".join(self._parts)]
+        return self._parts[0] if self._parts else ""
+
+    def close(self) -> str:
+        self.flush()
+        self.finished_at = time.perf_counter()
+        with _recent_lock:
+            _recent.append((self.time_to_first_token, self.total_time, len(self.text)))
+        return self.text
+
+    @property
+    def time_to_first_token(self):
+        if self.first_token_at is None:
+            return None
+        return self.first_token_at - self.started
+
+    @property
+    def total_time(self):
+        if self.finished_at is None:
+            return None
+        return self.finished_at - self.started
+
+
+def _percentile(values: list, fraction: float):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+def stream_stats() -> dict:
+    with _recent_lock:
+        recent = list(_recent)
+    ttfts = [ttft for ttft, _, _ in recent if ttft is not None]
+    totals = [total for _, total, _ in recent]
+    return {
+        "responses": len(recent),
+        "ttft_p50": _percentile(ttfts, 0.5),
+        "ttft_p95": _percentile(ttfts, 0.95),
+        "total_p50": _percentile(totals, 0.5),
+        "total_p95": _percentile(totals, 0.95),
+    }
@@ -0,0 +1,63 @@
+import os
+import sys
+
+import pytest
+
+# Modules under src/ import each other flat, as they do when the app runs
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from accounts import AccountStore  # noqa: E402
+from credentials import CredentialService, ScryptParams  # noqa: E402
+from ledger import Ledger  # noqa: E402
+from service import BankingService  # noqa: E402
+
+# Cheapest scrypt cost, so hashing doesn't dominate the suite
+FAST_KDF = ScryptParams(log_n=10, r=8, p=1)
+
+
+@pytest.fixture
+def db_path(tmp_path, monkeypatch):
+    path = str(tmp_path / "bank.db")
+    # Anything that falls back to the default path lands in the scratch directory too
+    monkeypatch.setenv("BANK_DB_PATH", path)
+    return path
+
+
+@pytest.fixture
+def ledger(db_path):
+    return Ledger(db_path)
+
+
+@pytest.fixture
+def accounts(db_path):
+    return AccountStore(db_path)
+
+
+@pytest.fixture
+def credentials():
+    return CredentialService(FAST_KDF, workers=2, max_queue=16)
+
+
+@pytest.fixture
+def service(accounts, ledger, credentials):
+    return BankingService(accounts=accounts, ledger=ledger, credentials=credentials)
+
+
+@pytest.fixture
+def account_data():
+    """Valid create_account fields; each call gets unique identifiers."""
+    counter = iter(range(1, 1_000_000))
+
+    def make(**overrides):
+        n = next(counter)
+        data = {
+            "name": f"Holder {n}",
+            "email": f"holder{n}@example.com",
+            "bank_id": "BANK01",
+            "daily_limit": 1000,
+            "ifsc_code": "IFSC0001",
+            "username": f"holder{n}",
+        }
+        data.update(overrides)
+        return data
+    return make
@@ -0,0 +1,65 @@
+import sqlite3
+
+import pytest
+
+from accounts import DuplicateAccountField, format_account_number, is_valid_account_number, luhn_digit
+
+
+def test_luhn_digit_known_value():
+    # The textbook example: 7992739871 checks with 3
+    assert luhn_digit("7992739871") == "3"
+
+
+def test_account_numbers_carry_a_valid_check_digit():
+    numbers = [format_account_number(sequence) for sequence in (1, 2, 99, 12345678)]
+    assert numbers[0] == "7000000013"
+    assert all(len(number) == 10 and is_valid_account_number(number) for number in numbers)
+
+
+def test_check_digit_catches_typos():
+    number = format_account_number(4321)
+    for i in range(len(number)):
+        for digit in "0123456789":
+            if digit != number[i]:
+                typo = number[:i] + digit + number[i + 1:]
+                assert not is_valid_account_number(typo)
+    assert not is_valid_account_number(number[:-1])
+    assert not is_valid_account_number("70000000a3")
+
+
+def test_create_assigns_sequential_numbers(accounts, account_data):
+    first = accounts.create(account_data())
+    second = accounts.create(account_data())
+    assert (first.account_number, second.account_number) == (format_account_number(1), format_account_number(2))
+    assert accounts.get(first.account_number) == first
+
+
+@pytest.mark.parametrize("field, value", [
+    ("email", "HOLDER1@example.com"),
+    ("username", "Holder1"),
+    ("upi_id", "holder@upi"),
+    ("login_id", "login-1"),
+])
+def test_unique_fields(accounts, account_data, field, value):
+    accounts.create(account_data(upi_id="holder@upi", login_id="login-1"))
+    with pytest.raises(DuplicateAccountField) as error:
+        accounts.create(account_data(**{field: value}))
+    assert error.value.field == field
+    assert accounts.exists(field, value)
+
+
+def test_optional_fields_may_repeat_when_empty(accounts, account_data):
+    accounts.create(account_data(upi_id="", login_id=None))
+    accounts.create(account_data(upi_id="", login_id=None))
+
+
+def test_failed_create_writes_nothing(accounts, account_data, db_path):
+    def fail(conn, account):
+        raise RuntimeError("ledger unavailable")
+
+    with pytest.raises(RuntimeError):
+        accounts.create(account_data(), {"login": "$scrypt$x"}, on_create=fail)
+    conn = sqlite3.connect(db_path)
+    assert conn.execute("SELECT COUNT(*) FROM accounts").fetchone() == (0,)
+    assert conn.execute("SELECT COUNT(*) FROM account_credentials").fetchone() == (0,)
+    conn.close()
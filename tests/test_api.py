@@ -0,0 +1,93 @@
+import http.client
+import json
+
+import pytest
+
+from api import TestServer
+from service import AuthenticationRequired
+
+
+@pytest.fixture
+def client(service):
+    with TestServer(service, workers=4) as server:
+        conn = http.client.HTTPConnection(server.host, server.port)
+
+        def call(method, path, body=None, token=None):
+            headers = {"Content-Type": "application/json"}
+            if token:
+                headers["Authorization"] = f"Bearer {token}"
+            conn.request(method, path, json.dumps(body) if body is not None else None, headers)
+            response = conn.getresponse()
+            return response.status, json.loads(response.read())
+        yield call
+        conn.close()
+
+
+def test_error_statuses(client, account_data):
+    status, account = client("POST", "/accounts", account_data(password="pw", trxn_password="tpw"))
+    assert status == 201 and "password" not in account
+    number = account["account_number"]
+    transactions = f"/accounts/{number}/transactions"
+
+    assert client("POST", "/accounts", account_data(email=account["email"]))[0] == 409
+    assert client("POST", "/accounts", account_data(name={"a": 1}))[0] == 400
+    assert client("POST", "/accounts", account_data(daily_limit="inf"))[0] == 400
+    status, login = client("POST", "/login", {"username": account["username"], "password": "pw"})
+    assert status == 200 and login["account"]["account_number"] == number
+    token = login["token"]
+    assert client("POST", "/login", {"username": account["username"], "password": "no"})[0] == 403
+    assert client("POST", "/login", {"username": ["x"], "password": "pw"})[0] == 400
+
+    def transact(body):
+        return client("POST", transactions, body, token)[0]
+
+    assert transact({"type": "deposit", "amount": 50, "idempotency_key": "k"}) == 201
+    assert transact({"type": "deposit", "amount": 50, "idempotency_key": "k"}) == 200
+    assert transact({"type": "deposit", "amount": 51, "idempotency_key": "k"}) == 409
+    assert transact({"type": "deposit", "amount": 1, "idempotency_key": {"x": 1}}) == 400
+    assert transact({"type": "withdraw", "amount": 1}) == 403
+    assert transact({"type": "withdraw", "amount": 500, "trxn_password": "tpw"}) == 422
+    assert client("POST", "/chat", {"session_id": "s1", "message": 123})[0] == 400
+
+
+def test_account_routes_need_the_owners_token(client, account_data):
+    mine = client("POST", "/accounts", account_data(password="pw"))[1]
+    theirs = client("POST", "/accounts", account_data(password="pw2"))[1]
+    token = client("POST", "/login", {"username": mine["username"], "password": "pw"})[1]["token"]
+    deposit = {"type": "deposit", "amount": 5}
+
+    for path in ("statement", "statement.csv", "analytics"):
+        assert client("GET", f"/accounts/{mine['account_number']}/{path}")[0] == 401
+        assert client("GET", f"/accounts/{theirs['account_number']}/{path}", token=token)[0] == 403
+    assert client("GET", f"/accounts/{mine['account_number']}/analytics", token=token)[0] == 200
+    assert client("POST", f"/accounts/{mine['account_number']}/transactions", deposit)[0] == 401
+    assert client("POST", f"/accounts/{theirs['account_number']}/transactions", deposit, token)[0] == 403
+    # A token for some other account must not reach one that doesn't exist either
+    assert client("POST", "/accounts/7000000000/transactions", deposit, token)[0] == 403
+
+    forged = token.rpartition(".")[0] + "." + "0" * 64
+    assert client("GET", f"/accounts/{mine['account_number']}/analytics", token=forged)[0] == 401
+    retargeted = theirs["account_number"] + token[len(mine["account_number"]):]
+    assert client("GET", f"/accounts/{theirs['account_number']}/analytics", token=retargeted)[0] == 401
+
+
+def test_account_details_are_private_to_the_owner(client, account_data):
+    mine = client("POST", "/accounts", account_data(password="pw", upi_id="holder@upi"))[1]
+    token = client("POST", "/login", {"username": mine["username"], "password": "pw"})[1]["token"]
+    path = f"/accounts/{mine['account_number']}"
+
+    status, owner_view = client("GET", path, token=token)
+    assert status == 200
+    assert (owner_view["email"], owner_view["upi_id"], owner_view["balance"]) == (mine["email"], "holder@upi", 0)
+    status, public_view = client("GET", path)
+    assert status == 200 and public_view["name"] == mine["name"]
+    assert not {"email", "upi_id", "login_id", "username", "balance", "spent_today"} & set(public_view)
+
+
+def test_expired_token_rejected(service, account_data):
+    number = service.create_account(account_data()).account_number
+    token = service.issue_token(number)["token"]
+    service.authorize(token, number)
+    service.token_ttl = -1
+    with pytest.raises(AuthenticationRequired, match="expired"):
+        service.authorize(service.issue_token(number)["token"], number)
@@ -0,0 +1,159 @@
+import csv
+import io
+
+import pytest
+
+from bulk_import import MAX_RETRIES, BulkImportError, BulkImporter
+
+
+COLUMNS = ("account_number", "type", "amount")
+REFERENCED = COLUMNS + ("reference",)
+
+
+def upload(rows, columns=COLUMNS) -> bytes:
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(columns)
+    writer.writerows(rows)
+    return out.getvalue().encode()
+
+
+def referenced(rows) -> bytes:
+    """rows with a reference numbered after the row, as a branch would keep them."""
+    return upload([(*row, f"ref-{i}") for i, row in enumerate(rows, 1)], REFERENCED)
+
+
+def report_reasons(result) -> dict:
+    return {int(row["row"]): row["reason"] for row in csv.DictReader(io.StringIO(result.report.decode()))}
+
+
+@pytest.fixture
+def importer(ledger, accounts):
+    ledger.open_account("A", 100)
+    ledger.open_account("B", 1000)
+    ledger.deposit("A", 150)
+    return BulkImporter(ledger, accounts)
+
+
+def test_reject_reasons(importer, ledger):
+    result = importer.run(referenced([
+        ("A", "deposit", "10"),
+        ("A", "transfer", "10"),
+        ("A", "deposit", "-5"),
+        ("A", "deposit", "abc"),
+        ("A", "deposit", "inf"),
+        ("A", "deposit", "1e300"),
+        ("Z", "deposit", "10"),
+        ("B", "withdraw", "1"),
+        ("A", "withdraw", "90"),
+        ("A", "withdraw", "20"),
+    ]), "branch.csv")
+    assert report_reasons(result) == {
+        2: "unknown transaction type",
+        3: "amount must be a positive number",
+        4: "amount must be a positive number",
+        5: "amount is too large",
+        6: "amount is too large",
+        7: "unknown account",
+        8: "insufficient funds",
+        10: "daily limit exceeded",
+    }
+    assert (result.total, result.accepted, result.rejected) == (10, 2, 8)
+    assert ledger.balance("A") == 70
+
+
+def test_later_rows_see_earlier_rejections(importer, ledger):
+    # Rejecting the large withdrawal leaves room for the ones after it
+    result = importer.run(referenced([
+        ("A", "withdraw", "500"),
+        ("A", "withdraw", "50"),
+        ("A", "withdraw", "50"),
+    ]), "branch.csv")
+    assert report_reasons(result) == {1: "insufficient funds"}
+    assert ledger.balance("A") == 50
+
+
+def test_reupload_posts_nothing_twice(importer, ledger):
+    data = upload([("B", "deposit", "5"), ("B", "deposit", "5")])
+    assert importer.run(data, "branch.csv").accepted == 2
+    again = importer.run(data, "branch.csv")
+    assert again.accepted == 0
+    assert set(report_reasons(again).values()) == {"already posted"}
+    assert ledger.balance("B") == 10
+
+
+def test_references_are_per_account(importer, ledger):
+    result = importer.run(upload([
+        ("A", "deposit", "1", "r1"),
+        ("B", "deposit", "1", "r1"),
+        ("A", "deposit", "1", "r1"),
+    ], REFERENCED), "branch.csv")
+    assert report_reasons(result) == {3: "duplicate reference in file"}
+
+
+def test_withdrawals_need_a_reference(importer, ledger):
+    result = importer.run(upload([
+        ("A", "withdraw", "10", "w1"),
+        ("A", "withdraw", "10", ""),
+        ("B", "deposit", "10", ""),
+    ], REFERENCED), "branch.csv")
+    assert report_reasons(result) == {2: "withdrawal needs a reference"}
+    result = importer.run(upload([("A", "withdraw", "10")]), "branch.csv")
+    assert report_reasons(result) == {1: "withdrawal needs a reference"}
+    assert ledger.balance("A") == 140
+
+
+def test_corrected_reupload_posts_only_the_fix(importer, ledger):
+    rows = [("A", "withdraw", "10"), ("A", "withdraw", "ten"), ("B", "deposit", "5")]
+    assert importer.run(referenced(rows), "branch.csv").accepted == 2
+    rows[1] = ("A", "withdraw", "10")
+    again = importer.run(referenced(rows), "branch-fixed.csv")
+    assert again.accepted == 1
+    assert report_reasons(again) == {1: "already posted", 3: "already posted"}
+    assert (ledger.balance("A"), ledger.balance("B")) == (130, 5)
+
+
+def test_missing_columns(importer):
+    with pytest.raises(BulkImportError):
+        importer.run(b"account_number,amount\nA,1\n", "branch.csv")
+
+
+class Interfering:
+    """Posts to an account between the importer's validation and its commit."""
+
+    def __init__(self, ledger, amount, kind="withdraw", times=1):
+        self.ledger = ledger
+        self.amount = amount
+        self.kind = kind
+        self.times = times
+        self.batches = 0
+
+    def __getattr__(self, name):
+        return getattr(self.ledger, name)
+
+    def post_batch_async(self, entries, accounts):
+        self.batches += 1
+        if self.batches <= self.times:
+            self.ledger.post(next(iter(accounts)), self.kind, self.amount)
+        return self.ledger.post_batch_async(entries, accounts)
+
+
+def test_stale_snapshot_is_revalidated(importer, ledger, accounts):
+    interfering = Interfering(ledger, 100)
+    result = BulkImporter(interfering, accounts).run(referenced([
+        ("A", "withdraw", "40"),
+        ("A", "deposit", "5"),
+    ]), "branch.csv")
+    # The first commit was refused, and the retry saw the other withdrawal
+    assert interfering.batches == 2
+    assert report_reasons(result) == {1: "daily limit exceeded"}
+    assert ledger.balance("A") == 55
+
+
+def test_endless_interference_gives_up(importer, ledger, accounts):
+    interfering = Interfering(ledger, 1, kind="deposit", times=MAX_RETRIES + 1)
+    with pytest.raises(BulkImportError, match="kept changing"):
+        BulkImporter(interfering, accounts).run(upload([("B", "deposit", "5")]), "branch.csv")
+    # The first attempt plus every retry was refused, and none of them posted
+    assert interfering.batches == MAX_RETRIES + 1
+    assert ledger.balance("B") == MAX_RETRIES + 1
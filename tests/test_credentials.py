@@ -0,0 +1,83 @@
+import threading
+
+import pytest
+
+from bulk_import import BulkImporter
+from credentials import (
+    CredentialsBusy, CredentialService, InvalidCredentials, ScryptParams, hash_password, needs_rehash, parse_hash,
+    verify_password,
+)
+
+from conftest import FAST_KDF
+
+
+def test_hash_round_trip():
+    encoded = hash_password("s3cret", FAST_KDF)
+    assert encoded.startswith("$scrypt$ln=10,r=8,p=1$")
+    assert verify_password("s3cret", encoded)
+    assert not verify_password("s3cret ", encoded)
+    # Salted, so the same password never hashes the same twice
+    assert hash_password("s3cret", FAST_KDF) != encoded
+    assert needs_rehash(encoded, ScryptParams(log_n=11))
+    assert not needs_rehash(encoded, FAST_KDF)
+
+
+def test_full_queue_fails_fast():
+    service = CredentialService(FAST_KDF, workers=1, max_queue=1)
+    release = threading.Event()
+    # One call running and one queued fill the pool
+    held = [service._submit("hash", release.wait) for _ in range(2)]
+    with pytest.raises(CredentialsBusy):
+        service.hash_async("one too many")
+    release.set()
+    for future in held:
+        future.result()
+    assert verify_password("pw", service.hash("pw"))
+
+
+def test_passwords_are_stored_hashed(service, account_data, accounts):
+    account = service.create_account(account_data(password="login-pw", trxn_password="trxn-pw"))
+    stored = accounts.credential(account.account_number, "login")
+    assert "login-pw" not in stored
+    parse_hash(stored)
+    assert service.authenticate(account.username, "login-pw") == account
+
+
+@pytest.mark.parametrize("username, password", [
+    ("holder1", "wrong"),
+    ("nobody", "login-pw"),
+    (None, None),
+])
+def test_authenticate_rejects(service, account_data, username, password):
+    service.create_account(account_data(password="login-pw"))
+    with pytest.raises(InvalidCredentials):
+        service.authenticate(username, password)
+
+
+def test_withdrawal_needs_transaction_password(service, account_data):
+    number = service.create_account(account_data(trxn_password="trxn-pw")).account_number
+    service.transact(number, "deposit", 100)
+    for attempt in (None, "wrong"):
+        with pytest.raises(InvalidCredentials):
+            service.transact(number, "withdraw", 10, trxn_password=attempt)
+    assert service.transact(number, "withdraw", 10, trxn_password="trxn-pw").balance == 90
+    check = service.check_transaction_password(number, "trxn-pw")
+    assert service.transact(number, "withdraw", 10, trxn_password=check).balance == 80
+
+
+def test_bulk_withdrawals_from_password_protected_accounts_rejected(service, account_data, ledger, accounts):
+    protected = service.create_account(account_data(trxn_password="secret")).account_number
+    open_account = service.create_account(account_data()).account_number
+    ledger.deposit(protected, 100)
+    ledger.deposit(open_account, 100)
+    data = (
+        "account_number,type,amount,reference\n"
+        f"{protected},withdraw,10,w1\n"
+        f"{protected},deposit,10,\n"
+        f"{open_account},withdraw,10,w2\n"
+    ).encode()
+    result = BulkImporter(ledger, accounts).run(data, "branch.csv")
+    assert (result.accepted, result.rejected) == (2, 1)
+    assert "transaction password required" in result.report.decode()
+    assert ledger.balance(protected) == 110
+    assert ledger.balance(open_account) == 90
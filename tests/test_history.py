@@ -0,0 +1,57 @@
+from history import ChatHistory, HistoryCodec
+from session_store import MemorySessionStore, SessionSync, decode, encode
+
+
+def test_oldest_messages_drop_off():
+    history = ChatHistory(max_messages=3)
+    for i in range(5):
+        history.append(f"message {i}", is_user=i % 2 == 0)
+    assert [message.content for message in history] == ["message 2", "message 3", "message 4"]
+    assert history.last_seq == 5
+    assert [message.seq for message in history.tail(2)] == [4, 5]
+    assert [message.seq for message in history.since(3)] == [4, 5]
+    assert history.since(5) == []
+
+
+def test_reload_keeps_order_and_numbering_but_not_private_messages():
+    codec = HistoryCodec(max_messages=10)
+    history = ChatHistory(10)
+    history.append("open an account", is_user=True)
+    history.append("Account created! Number 7000000013", private=True)
+    history.append("Anything else?")
+
+    restored = codec.load(decode(encode(codec.dump(history))))
+    assert [(m.seq, m.content, m.is_user) for m in restored] == [
+        (1, "open an account", True),
+        (3, "Anything else?", False),
+    ]
+    first, _, last = history
+    assert [m.created for m in restored] == [first.created, last.created]
+    # New messages carry on from where the old session stopped
+    assert restored.append("hello").seq == 4
+
+
+def test_history_survives_a_reconnect():
+    store = MemorySessionStore()
+    codecs = {"messages": HistoryCodec(10)}
+    state = {"messages": ChatHistory(10)}
+    sync = SessionSync(store, "s1", codecs)
+    state["messages"].append("hi", is_user=True)
+    sync.persist(state)
+    state["messages"].append("Hello! How can I help?")
+    sync.persist(state)
+
+    restored = {}
+    SessionSync(store, "s1", codecs).restore(restored, ["messages"])
+    assert [m.content for m in restored["messages"]] == ["hi", "Hello! How can I help?"]
+
+
+def test_codec_version_tracks_changes():
+    codec = HistoryCodec()
+    history = ChatHistory()
+    before = codec.version(history)
+    history.append("hi")
+    assert codec.version(history) != before
+    after_append = codec.version(history)
+    history.clear()
+    assert codec.version(history) != after_append
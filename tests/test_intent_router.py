@@ -0,0 +1,63 @@
+import pytest
+
+from intent_router import IntentRouter
+
+# Passes the Luhn check, as opened accounts do
+ACCOUNT = "7000000013"
+
+
+@pytest.fixture
+def router():
+    return IntentRouter()
+
+
+@pytest.mark.parametrize("text, amount", [
+    ("deposit 500", 500),
+    ("withdraw 1,250.50", 1250.5),
+    ("deposit $75", 75),
+    ("deposit ₹2,000", 2000),
+    ("withdraw 300 rupees", 300),
+    ("make a deposit of 40 dollars", 40),
+    ("cash out 60", 60),
+    ("deposit rs 900 please", 900),
+])
+def test_amount_after_a_verb_or_next_to_a_currency(router, text, amount):
+    route = router.route(text)
+    assert route.action == "switch"
+    assert route.amount == amount
+
+
+@pytest.mark.parametrize("text", [
+    "my 2 deposits",
+    "withdraw from my 3 accounts",
+    "deposit to account 12",
+])
+def test_bare_numbers_are_not_amounts(router, text):
+    route = router.route(text)
+    assert route.action == "switch"
+    assert route.amount is None
+
+
+def test_account_number_is_never_the_amount(router):
+    route = router.route(f"deposit into {ACCOUNT}")
+    assert (route.transaction_type, route.amount, route.account_number) == ("deposit", None, ACCOUNT)
+
+    route = router.route(f"deposit {ACCOUNT} $500")
+    assert (route.amount, route.account_number) == (500, ACCOUNT)
+
+    route = router.route(f"withdraw 200 from {ACCOUNT}")
+    assert (route.transaction_type, route.amount, route.account_number) == ("withdraw", 200, ACCOUNT)
+
+
+def test_mistyped_account_number_is_ignored(router):
+    route = router.route("deposit 7000000014")
+    assert route.action == "switch"
+    assert (route.amount, route.account_number) == (None, None)
+
+
+def test_questions_and_complaints(router):
+    assert router.route("how do I deposit?").action == "reply"
+    assert router.route("how do I deposit $50?").amount == 50
+    assert router.route("my withdrawal failed").action == "llm"
+    assert router.route("what is the weather").action == "refuse"
+    assert router.route("open an account").intent == "account_creation"
@@ -0,0 +1,151 @@
+import sqlite3
+from unittest import mock
+
+import pytest
+
+from ledger import (
+    MAX_CENTS, DailyLimitExceeded, IdempotencyConflict, InsufficientFunds, Ledger, LedgerError, UnknownAccount,
+)
+
+
+@pytest.fixture
+def batching_ledger(db_path):
+    # Long enough that requests enqueued back to back share one batch
+    return Ledger(db_path, batch_wait=0.2)
+
+
+def test_deposit_and_withdraw_track_balance(ledger):
+    ledger.open_account("A", 1000)
+    assert ledger.deposit("A", 100).balance == 100
+    posting = ledger.withdraw("A", 30.25)
+    assert (posting.kind, posting.amount, posting.balance) == ("withdraw", 30.25, 69.75)
+    assert ledger.balance("A") == 69.75
+    assert ledger.spent_today("A") == 30.25
+
+
+def test_unknown_account(ledger):
+    with pytest.raises(UnknownAccount):
+        ledger.deposit("nope", 1)
+    with pytest.raises(UnknownAccount):
+        ledger.balance("nope")
+
+
+def test_insufficient_funds_leaves_balance(ledger):
+    ledger.open_account("A", 1000)
+    ledger.deposit("A", 50)
+    with pytest.raises(InsufficientFunds):
+        ledger.withdraw("A", 50.01)
+    assert ledger.balance("A") == 50
+    assert ledger.spent_today("A") == 0
+
+
+def test_daily_limit_counts_earlier_withdrawals(ledger):
+    ledger.open_account("A", 100)
+    ledger.deposit("A", 500)
+    ledger.withdraw("A", 60)
+    with pytest.raises(DailyLimitExceeded):
+        ledger.withdraw("A", 40.01)
+    ledger.withdraw("A", 40)
+    assert ledger.balance("A") == 400
+
+
+def test_daily_limit_window_rolls_over(ledger):
+    ledger.open_account("A", 100)
+    ledger.deposit("A", 500)
+    with mock.patch("ledger.time.time", return_value=1_000_000.0):
+        ledger.withdraw("A", 100)
+    with mock.patch("ledger.time.time", return_value=1_000_000.0 + 25 * 3600):
+        ledger.withdraw("A", 100)
+    assert ledger.balance("A") == 300
+
+
+@pytest.mark.parametrize("amount", [0, -5, 0.001])
+def test_non_positive_amounts_rejected(ledger, amount):
+    ledger.open_account("A", 1000)
+    with pytest.raises(LedgerError):
+        ledger.deposit("A", amount)
+
+
+@pytest.mark.parametrize("amount", [float("nan"), float("inf"), float("-inf"), 1e300, "5", None, True])
+def test_invalid_amounts_rejected_before_the_writer(ledger, amount):
+    ledger.open_account("A", 1000)
+    with pytest.raises(LedgerError):
+        ledger.deposit("A", amount)
+
+
+def test_balance_overflow_rejected(ledger):
+    ledger.open_account("A", 1000)
+    ledger.deposit("A", 5e16)
+    assert 5e18 < MAX_CENTS < 1e19
+    with pytest.raises(LedgerError):
+        ledger.deposit("A", 5e16)
+    assert ledger.balance("A") == 5e16
+
+
+def test_idempotent_replay_returns_original(ledger):
+    ledger.open_account("A", 1000)
+    first = ledger.deposit("A", 25, idempotency_key="k1")
+    replay = ledger.deposit("A", 25, idempotency_key="k1")
+    assert replay.duplicate and replay.entry_id == first.entry_id
+    assert ledger.balance("A") == 25
+
+
+def test_idempotency_keys_are_scoped_per_account(ledger):
+    ledger.open_account("A", 1000)
+    ledger.open_account("B", 1000)
+    ledger.deposit("A", 25, idempotency_key="k1")
+    other = ledger.deposit("B", 5, idempotency_key="k1")
+    assert not other.duplicate
+    assert (other.account_number, other.balance) == ("B", 5)
+    # B's k1 is now its own deposit, so a withdrawal reusing it conflicts
+    with pytest.raises(IdempotencyConflict):
+        ledger.withdraw("B", 1, idempotency_key="k1")
+    assert ledger.existing_keys([("A", "k1"), ("B", "k1"), ("B", "k2")]) == {("A", "k1"), ("B", "k1")}
+
+
+def test_idempotent_replay_must_match(ledger):
+    ledger.open_account("A", 1000)
+    ledger.deposit("A", 25, idempotency_key="k1")
+    with pytest.raises(IdempotencyConflict):
+        ledger.deposit("A", 26, idempotency_key="k1")
+    with pytest.raises(IdempotencyConflict):
+        ledger.withdraw("A", 25, idempotency_key="k1")
+    assert ledger.balance("A") == 25
+
+
+def test_non_string_idempotency_key_rejected(ledger):
+    ledger.open_account("A", 1000)
+    with pytest.raises(LedgerError):
+        ledger.deposit("A", 1, idempotency_key={"x": 1})
+
+
+def test_entries_are_append_only(ledger, db_path):
+    ledger.open_account("A", 1000)
+    ledger.deposit("A", 10)
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    with pytest.raises(sqlite3.DatabaseError, match="append-only"):
+        conn.execute("UPDATE ledger_entries SET amount = 1")
+    with pytest.raises(sqlite3.DatabaseError, match="append-only"):
+        conn.execute("DELETE FROM ledger_entries")
+    conn.close()
+
+
+def test_failed_request_does_not_fail_its_batch(batching_ledger):
+    ledger = batching_ledger
+    ledger.open_account("A", 1000)
+    ledger.open_account("B", 1000)
+    # Raw requests, past post()'s checks, so the writer meets them as they are
+    good = ledger._enqueue(("post", "A", "deposit", 1000, None))
+    overdrawn = ledger._enqueue(("post", "A", "withdraw", 10 ** 6, None))
+    overflow = ledger._enqueue(("post", "B", "deposit", 10 ** 300, None))
+    bad_key = ledger._enqueue(("post", "B", "deposit", 5, {"x": 1}))
+    also_good = ledger._enqueue(("post", "B", "deposit", 700, None))
+
+    assert good.result().balance == 10
+    assert also_good.result().balance == 7
+    assert isinstance(overdrawn.exception(), InsufficientFunds)
+    assert overflow.exception() is not None
+    assert bad_key.exception() is not None
+    assert ledger.balance("A") == 10
+    assert ledger.balance("B") == 7
+
@@ -0,0 +1,99 @@
+import random
+import sqlite3
+import time
+from unittest import mock
+
+from ledger import GRAINS
+
+DAY = 86400
+START = 1_700_000_000.0
+
+
+def recount(db_path) -> dict:
+    """The totals, computed from scratch from the entries."""
+    conn = sqlite3.connect(db_path)
+    entries = conn.execute(
+        "SELECT e.id, e.account_number, a.agent_id, e.kind, e.amount, e.balance_after, e.created_at "
+        "FROM ledger_entries e JOIN ledger_accounts a USING (account_number) ORDER BY e.id"
+    ).fetchall()
+    conn.close()
+    totals = {}
+    for entry_id, account_number, agent_id, kind, amount, balance, created_at in entries:
+        for grain, pattern in GRAINS.items():
+            period = time.strftime(pattern, time.gmtime(created_at))
+            scopes = [("account", account_number, balance)]
+            if agent_id:
+                scopes.append(("agent", agent_id, None))
+            for scope, key, closing in scopes:
+                row = totals.setdefault((scope, key, grain, period), [0, 0, 0, None, entry_id, entry_id])
+                row[0 if kind == "deposit" else 1] += amount
+                row[2] += 1
+                row[3] = closing
+                row[5] = entry_id
+    return {key: tuple(row) for key, row in totals.items()}
+
+
+def stored(db_path) -> dict:
+    conn = sqlite3.connect(db_path)
+    rows = conn.execute(
+        "SELECT scope, key, grain, period, deposits, withdrawals, entries, closing_balance, first_id, last_id "
+        "FROM ledger_totals"
+    ).fetchall()
+    conn.close()
+    return {row[:4]: row[4:] for row in rows}
+
+
+def fill(ledger):
+    rng = random.Random(7)
+    accounts = {"A1": "AG1", "A2": "AG1", "A3": None}
+    for account_number, agent_id in accounts.items():
+        ledger.open_account(account_number, 10_000, agent_id)
+    now = START
+    for _ in range(300):
+        # Hours to days apart, so days and months both roll over
+        now += rng.uniform(600, 3 * DAY)
+        account_number = rng.choice(list(accounts))
+        with mock.patch("ledger.time.time", return_value=now):
+            if rng.random() < 0.3 and ledger.balance(account_number) > 50:
+                ledger.withdraw(account_number, 50)
+            else:
+                ledger.deposit(account_number, rng.randint(1, 500))
+    # Batched entries update the totals through their own path
+    version = ledger.snapshot(["A1"])["A1"].version
+    balance = ledger.snapshot(["A1"])["A1"].balance
+    batch = []
+    for i in range(20):
+        balance += 100
+        batch.append(("A1", "deposit", 100, balance, f"batch-{i}"))
+    with mock.patch("ledger.time.time", return_value=now + DAY):
+        ledger.post_batch(batch, {"A1": (version, balance, len(batch), 0)})
+
+
+def test_incremental_totals_match_a_recount(ledger, db_path):
+    fill(ledger)
+    expected = recount(db_path)
+    assert len({key[3] for key in expected if key[2] == "month"}) > 3
+    assert stored(db_path) == expected
+
+
+def test_totals_and_statement_readers(ledger, db_path):
+    fill(ledger)
+    months = ledger.totals("account", "A1", "month")
+    entries = sqlite3.connect(db_path).execute(
+        "SELECT COUNT(*), MAX(balance_after) FROM ledger_entries WHERE account_number = 'A1'"
+    ).fetchone()
+    assert sum(month.entries for month in months) == entries[0]
+    assert months[-1].closing_balance == ledger.balance("A1")
+
+    # Keyset pages walk the whole history newest first, without gaps
+    seen = []
+    cursor = None
+    while True:
+        page = ledger.statement("A1", cursor, 17)
+        seen.extend(line.entry_id for line in page)
+        if len(page) < 17:
+            break
+        cursor = page[-1].entry_id
+    assert seen == sorted(seen, reverse=True)
+    assert len(seen) == entries[0]
+    assert [line.entry_id for chunk in ledger.iter_statement("A1", page_size=13) for line in chunk] == seen[::-1]
@@ -0,0 +1,91 @@
+import threading
+import time
+
+import pytest
+
+import llm
+from fake_llm import DEFAULT_REPLIES, FakeProviderError, FakeStreamingChatModel
+from llm import ChatBusyError, ChatResources, ChatSession
+
+
+def make_session(max_concurrency=4, acquire_timeout=5, max_retries=3, scheduler_rpm=0, **model):
+    fake = FakeStreamingChatModel(first_token_latency=0, token_delay=0, jitter=0, **model)
+    resources = ChatResources(
+        fake, max_concurrency=max_concurrency, acquire_timeout=acquire_timeout,
+        requests_per_minute=scheduler_rpm, max_retries=max_retries
+    )
+    return ChatSession(resources), fake
+
+
+def events(session, text="hello"):
+    return list(session.stream({"human_input": text}))
+
+
+def reply(streamed):
+    return "".join(event["text"] for event in streamed if "text" in event)
+
+
+def test_429_throttles_and_retries_after_the_providers_wait():
+    session, fake = make_session(requests_per_minute=1)
+    # The provider's minute is nearly up, so its Retry-After is about 0.1s
+    fake._calls.append(time.monotonic() - 59.9)
+    started = time.monotonic()
+    streamed = events(session)
+    retries = [event for event in streamed if "retry" in event]
+    assert len(retries) == 1 and retries[0]["retry"] == 1
+    assert retries[0]["wait"] == pytest.approx(0.1, abs=0.05)
+    assert time.monotonic() - started >= 0.05
+    assert reply(streamed) in DEFAULT_REPLIES
+    assert session.resources.scheduler.stats()["throttled"] == 1
+    assert len(session.history()) == 2
+
+
+def test_503_backs_off_and_retries(monkeypatch):
+    attempts = []
+    monkeypatch.setattr(llm, "backoff", lambda attempt: attempts.append(attempt) or 0.01)
+    # Seed 1's first draw fails at a 50% error rate and its second succeeds
+    session, fake = make_session(error_rate=0.5, seed=1)
+    streamed = events(session)
+    assert attempts == [0]
+    assert [event for event in streamed if "retry" in event] == [{"retry": 1, "wait": 0.01}]
+    assert reply(streamed) in DEFAULT_REPLIES
+    # Only a 429 pauses everyone else
+    assert session.resources.scheduler.stats()["throttled"] == 0
+
+
+def test_retries_give_up(monkeypatch):
+    monkeypatch.setattr(llm, "backoff", lambda attempt: 0)
+    session, fake = make_session(max_retries=2, error_rate=1.0)
+    with pytest.raises(FakeProviderError):
+        events(session)
+    assert session.resources.scheduler.stats()["in_flight"] == 0
+    assert session.history() == []
+
+
+def test_request_bucket_holds_requests_back(monkeypatch):
+    monkeypatch.setattr(llm, "STATUS_INTERVAL", 0.05)
+    session, fake = make_session(scheduler_rpm=1, acquire_timeout=2, requests_per_minute=1)
+    events(session)
+    # The next slot is a minute away, past the queue timeout, so it is
+    # refused locally instead of being sent for the provider to reject
+    with pytest.raises(ChatBusyError):
+        events(session, "again")
+    assert len(fake._calls) == 1
+    assert session.resources.scheduler.stats()["queued"] == 0
+
+
+def test_queue_position_reported_while_waiting(monkeypatch):
+    monkeypatch.setattr(llm, "STATUS_INTERVAL", 0.05)
+    session, fake = make_session(max_concurrency=1)
+    scheduler = session.resources.scheduler
+    held = scheduler.submit(1)
+    ahead = scheduler.submit(1)
+    stream = session.stream({"human_input": "hello"})
+    assert next(stream) == {"queued": 2, "wait": 0.0}
+
+    scheduler.cancel(ahead)
+    assert next(stream) == {"queued": 1, "wait": 0.0}
+    threading.Timer(0.1, scheduler.release, (held,)).start()
+    rest = list(stream)
+    assert reply(rest) in DEFAULT_REPLIES
+    assert all("queued" in event for event in rest if "text" not in event)
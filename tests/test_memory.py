@@ -0,0 +1,77 @@
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+
+from fake_llm import FakeStreamingChatModel
+from llm import SYSTEM_PROMPT, ChatResources
+from memory import TokenBudgetMemory, count_tokens
+
+
+def talk(memory, turns, first=0):
+    for i in range(first, first + turns):
+        memory.save_context(
+            {"human_input": f"question {i} about deposits and withdrawals"},
+            {"text": f"Answer {i}. Here is a longer explanation that only the verbatim turn keeps."}
+        )
+
+
+def history(memory):
+    return memory.load_memory_variables({})["chat_history"]
+
+
+def test_turns_within_budget_are_kept_verbatim():
+    memory = TokenBudgetMemory(budget=1000)
+    talk(memory, 3)
+    messages = history(memory)
+    assert [type(message) for message in messages] == [HumanMessage, AIMessage] * 3
+    assert messages[0].content == "question 0 about deposits and withdrawals"
+    assert memory.tokens == sum(count_tokens(message.content) for message in messages)
+
+
+def test_trimmed_to_budget_keeping_the_newest_turns():
+    memory = TokenBudgetMemory(budget=120, summary_budget=40)
+    for i in range(10):
+        talk(memory, 1, first=i)
+        assert memory.tokens <= memory.budget
+    messages = history(memory)
+    verbatim = [message.content for message in messages if isinstance(message, HumanMessage)]
+    assert verbatim[-1] == "question 9 about deposits and withdrawals"
+    assert "question 0 about deposits and withdrawals" not in verbatim
+    # Whatever is kept verbatim is a run of the most recent turns
+    numbers = [int(content.split()[1]) for content in verbatim]
+    assert numbers == list(range(10 - len(numbers), 10))
+    assert memory.summary_tokens <= memory.summary_budget
+
+
+def test_folded_turns_survive_as_the_summary():
+    memory = TokenBudgetMemory(budget=100, summary_budget=40)
+    talk(memory, 4)
+    summary, *rest = history(memory)
+    assert isinstance(summary, SystemMessage)
+    assert summary.content.startswith("Summary of the earlier conversation:")
+    # One line per folded turn, with only the answer's first sentence
+    assert "- User: question 0 about deposits and withdrawals / Assistant: Answer 0." in summary.content
+    assert "longer explanation" not in summary.content
+    assert all(not isinstance(message, SystemMessage) for message in rest)
+
+
+def test_system_prompt_stays_first():
+    memory = TokenBudgetMemory(budget=100, summary_budget=40)
+    talk(memory, 4)
+    resources = ChatResources(FakeStreamingChatModel(), max_concurrency=1, acquire_timeout=1)
+    prompt = resources.prompt.format_messages(chat_history=history(memory), human_input="and now?")
+    assert prompt[0].content == SYSTEM_PROMPT
+    assert prompt[1].content.startswith("Summary of the earlier conversation:")
+    assert prompt[-1].content == "and now?"
+
+
+def test_state_round_trip_applies_lowered_budgets():
+    memory = TokenBudgetMemory(budget=200, summary_budget=60)
+    talk(memory, 8)
+    restored = TokenBudgetMemory(budget=200, summary_budget=60)
+    restored.load_state(memory.to_state())
+    assert history(restored) == history(memory)
+    assert restored.tokens == memory.tokens
+
+    smaller = TokenBudgetMemory(budget=60, summary_budget=20)
+    smaller.load_state(memory.to_state())
+    assert smaller.tokens <= 60 and smaller.summary_tokens <= 20
+    assert history(smaller)[-2].content == "question 7 about deposits and withdrawals"
@@ -0,0 +1,72 @@
+import os
+
+import pytest
+
+from qr import QRCache
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+
+@pytest.fixture
+def directory(tmp_path):
+    return str(tmp_path / "qr")
+
+
+def files(directory):
+    return sorted(name for name in os.listdir(directory) if name.endswith(".png"))
+
+
+def test_miss_renders_then_memory_hit(directory):
+    cache = QRCache(directory)
+    image = cache.png("7000000013")
+    assert image.startswith(PNG_SIGNATURE)
+    assert cache.png("7000000013") is image
+    stats = cache.stats()
+    assert (stats["misses"], stats["hits"], stats["disk_hits"]) == (1, 1, 0)
+    assert files(directory) == [f"{cache.make_key('7000000013', 150)}.png"]
+
+
+def test_size_and_payload_are_part_of_the_key(directory):
+    cache = QRCache(directory)
+    small = cache.png("7000000013", size=100)
+    large = cache.png("7000000013", size=300)
+    other = cache.png("7000000021", size=100)
+    assert len({small, large, other}) == 3
+    assert cache.stats()["misses"] == 3
+
+
+def test_disk_tier_serves_a_new_process(directory):
+    image = QRCache(directory).png("7000000013")
+    cache = QRCache(directory)
+    assert cache.png("7000000013") == image
+    stats = cache.stats()
+    assert (stats["misses"], stats["disk_hits"]) == (0, 1)
+
+
+def test_memory_tier_is_bounded(directory):
+    cache = QRCache(directory, max_entries=2)
+    for payload in ("a", "b", "c"):
+        cache.png(payload)
+    assert cache.stats()["entries"] == 2
+    # "a" fell out of memory but is still on disk
+    cache.png("a")
+    assert cache.stats()["disk_hits"] == 1
+
+
+def test_least_recently_used_file_is_evicted(directory):
+    cache = QRCache(directory, max_entries=1, max_files=2)
+    cache.png("a")
+    cache.png("b")
+    cache.png("a")
+    cache.png("c")
+    assert files(directory) == sorted(f"{cache.make_key(payload, 150)}.png" for payload in ("a", "c"))
+    assert cache.stats()["evictions"] == 1
+
+
+def test_missing_file_is_rendered_again(directory):
+    cache = QRCache(directory, max_entries=1)
+    cache.png("a")
+    cache.png("b")
+    os.remove(os.path.join(directory, f"{cache.make_key('a', 150)}.png"))
+    assert cache.png("a").startswith(PNG_SIGNATURE)
+    assert cache.stats()["misses"] == 3
@@ -0,0 +1,124 @@
+import threading
+import time
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+
+import service as service_module
+from fake_llm import FakeProviderError, FakeStreamingChatModel
+from llm import ChatResources, ChatSession
+from response_cache import ResponseCache
+
+
+def answer(cache, key, value):
+    flight, is_leader = cache.join(key)
+    assert is_leader
+    cache.complete(flight, value)
+
+
+def test_keys_ignore_case_and_punctuation_but_not_context():
+    cache = ResponseCache()
+    assert cache.make_key("How do I deposit?", []) == cache.make_key("how do i  deposit", [])
+    earlier = [HumanMessage(content="I want to withdraw"), AIMessage(content="How much?")]
+    assert cache.make_key("how do i deposit", earlier) != cache.make_key("how do i deposit", [])
+
+
+def test_followers_wait_on_the_leaders_call():
+    cache = ResponseCache()
+    leader, is_leader = cache.join("k")
+    assert is_leader
+    results = []
+    followers = []
+    for _ in range(3):
+        flight, is_leader = cache.join("k")
+        assert flight is leader and not is_leader
+        followers.append(threading.Thread(target=lambda f=flight: results.append(f.wait(5))))
+    for thread in followers:
+        thread.start()
+    cache.complete(leader, "the answer")
+    for thread in followers:
+        thread.join()
+    assert results == ["the answer"] * 3
+    assert cache.get("k") == "the answer"
+    stats = cache.stats()
+    assert (stats["misses"], stats["merged"], stats["hits"]) == (1, 3, 1)
+
+
+def test_entries_expire():
+    cache = ResponseCache(ttl=0.05)
+    answer(cache, "k", "the answer")
+    assert cache.get("k") == "the answer"
+    time.sleep(0.1)
+    assert cache.get("k") is None
+    assert cache.stats()["expirations"] == 1
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = ResponseCache(max_entries=2)
+    answer(cache, "a", "A")
+    answer(cache, "b", "B")
+    assert cache.get("a") == "A"
+    answer(cache, "c", "C")
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == ("A", "C")
+    assert cache.stats()["evictions"] == 1
+
+
+def test_failed_calls_are_not_cached():
+    cache = ResponseCache()
+    leader, _ = cache.join("k")
+    follower, _ = cache.join("k")
+    cache.abandon(leader)
+    assert follower.wait(1) is None
+    assert cache.get("k") is None
+    # An empty answer is a failure too
+    flight, is_leader = cache.join("k")
+    assert is_leader
+    cache.complete(flight, "")
+    assert cache.get("k") is None
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    fresh = ResponseCache()
+    monkeypatch.setattr(service_module, "get_response_cache", lambda: fresh)
+    return fresh
+
+
+def chat(**model):
+    # requests_per_minute only so the fake counts the calls that reach it
+    fake = FakeStreamingChatModel(first_token_latency=0.2, token_delay=0, jitter=0, requests_per_minute=1000, **model)
+    resources = ChatResources(fake, max_concurrency=8, acquire_timeout=5, max_retries=0)
+    return lambda: ChatSession(resources), fake
+
+
+def test_concurrent_identical_questions_reach_the_model_once(service, cache):
+    new_session, fake = chat()
+    replies = []
+
+    def ask():
+        replies.append("".join(service.ask_stream(new_session(), "How do I open an account?")))
+
+    askers = [threading.Thread(target=ask) for _ in range(4)]
+    for thread in askers:
+        thread.start()
+    for thread in askers:
+        thread.join()
+    assert len(fake._calls) == 1
+    assert len(set(replies)) == 1 and replies[0]
+    assert cache.stats()["merged"] == 3
+    # Answered from the cache from then on, and still recorded in the conversation
+    session = new_session()
+    assert "".join(service.ask_stream(session, "how do i open an account")) == replies[0]
+    assert len(fake._calls) == 1
+    assert len(session.history()) == 2
+
+
+def test_model_errors_are_not_cached(service, cache):
+    new_session, fake = chat(error_rate=1.0)
+    with pytest.raises(FakeProviderError):
+        "".join(service.ask_stream(new_session(), "hello there"))
+    assert cache.stats()["entries"] == 0
+    fake.error_rate = 0.0
+    assert "".join(service.ask_stream(new_session(), "hello there"))
+    assert cache.stats()["misses"] == 2
@@ -0,0 +1,48 @@
+import pytest
+
+from scheduler import RateLimitScheduler, SchedulerFull
+
+
+def test_request_bucket_holds_back_the_third_request():
+    scheduler = RateLimitScheduler(max_concurrency=10, requests_per_minute=2)
+    first, second, third = (scheduler.submit(10) for _ in range(3))
+    assert first.granted and second.granted
+    assert not third.granted
+    assert not scheduler.wait(third, 0.05)
+    # Two a minute refill one every 30 seconds
+    position, wait = scheduler.position(third)
+    assert position == 1
+    assert wait == pytest.approx(30, abs=0.5)
+
+
+def test_token_estimate_is_corrected_on_release():
+    scheduler = RateLimitScheduler(max_concurrency=10, tokens_per_minute=600)
+    large = scheduler.submit(500)
+    waiting = scheduler.submit(200)
+    assert large.granted and not waiting.granted
+    assert scheduler.position(waiting)[1] == pytest.approx(10, abs=0.5)
+    # It turned out to use 100, so 400 go back and cover the next one
+    scheduler.release(large, used_tokens=100)
+    assert scheduler.wait(waiting, 0.05)
+
+
+def test_queue_is_bounded_and_priority_ordered():
+    scheduler = RateLimitScheduler(max_concurrency=1, max_queue=2)
+    held = scheduler.submit(1)
+    background = scheduler.submit(1, priority=10)
+    interactive = scheduler.submit(1, priority=0)
+    with pytest.raises(SchedulerFull):
+        scheduler.submit(1)
+    assert scheduler.position(interactive)[0] == 1
+    assert scheduler.position(background)[0] == 2
+    scheduler.release(held)
+    assert interactive.granted and not background.granted
+
+
+def test_throttle_pauses_every_grant():
+    scheduler = RateLimitScheduler(max_concurrency=10)
+    scheduler.throttle(0.2)
+    ticket = scheduler.submit(1)
+    assert not ticket.granted
+    assert scheduler.position(ticket)[1] == pytest.approx(0.2, abs=0.05)
+    assert scheduler.wait(ticket, 1)
@@ -0,0 +1,66 @@
+import sqlite3
+
+import pytest
+
+from ledger import IdempotencyConflict, UnknownAccount
+from service import ValidationError
+
+
+def count(db_path, table) -> int:
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_create_account_opens_its_ledger(service, account_data):
+    account = service.create_account(account_data())
+    assert service.transact(account.account_number, "deposit", 10).balance == 10
+    assert service.get_account(account.account_number)["balance"] == 10
+
+
+@pytest.mark.parametrize("daily_limit", ["inf", "nan", "1e300", 0, -1, [1], "abc"])
+def test_invalid_daily_limit_writes_nothing(service, account_data, db_path, daily_limit):
+    with pytest.raises(ValidationError):
+        service.create_account(account_data(daily_limit=daily_limit))
+    assert count(db_path, "accounts") == 0
+    assert count(db_path, "ledger_accounts") == 0
+
+
+@pytest.mark.parametrize("field", ["name", "email", "username", "password", "upi_id"])
+def test_create_account_rejects_non_string_fields(service, account_data, field):
+    with pytest.raises(ValidationError):
+        service.create_account(account_data(**{field: ["x"]}))
+
+
+def test_transact_validates_input(service, account_data):
+    number = service.create_account(account_data()).account_number
+    for kwargs in (
+        {"kind": "transfer", "amount": 1},
+        {"kind": "deposit", "amount": "abc"},
+        {"kind": "deposit", "amount": "nan"},
+        {"kind": "deposit", "amount": 1, "idempotency_key": {"x": 1}},
+    ):
+        with pytest.raises(ValidationError):
+            service.transact(number, **kwargs)
+    with pytest.raises(UnknownAccount):
+        service.transact("7000000000", "deposit", 1)
+
+
+def test_idempotency_keys_never_return_another_accounts_posting(service, account_data):
+    first = service.create_account(account_data()).account_number
+    second = service.create_account(account_data()).account_number
+    service.transact(first, "deposit", 50, idempotency_key="k1")
+    posting = service.transact(second, "deposit", 5, idempotency_key="k1")
+    assert (posting.account_number, posting.balance, posting.duplicate) == (second, 5, False)
+    with pytest.raises(IdempotencyConflict):
+        service.transact(second, "withdraw", 5, idempotency_key="k1")
+    assert service.get_account(first)["balance"] == 50
+
+
+def test_chat_rejects_non_string_message(service):
+    with pytest.raises(ValidationError):
+        service.chat("s1", 123)
+    with pytest.raises(ValidationError):
+        service.chat("s1", "hello", priority=["x"])
@@ -0,0 +1,138 @@
+import time
+
+import pytest
+
+from session_store import (
+    Codec, MemorySessionStore, SessionSync, SQLiteSessionStore, WriteBehindStore, decode, encode, scoped_sid,
+)
+
+CODECS = {"mode": Codec(), "messages": Codec(), "step": Codec()}
+
+
+class RecordingStore(MemorySessionStore):
+    def __init__(self, failures: int = 0):
+        super().__init__()
+        self.batches = []
+        self.failures = failures
+
+    def write(self, batch: dict):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("backend unavailable")
+        self.batches.append(dict(batch))
+        super().write(batch)
+
+
+@pytest.fixture
+def backend():
+    return RecordingStore()
+
+
+@pytest.fixture
+def store(backend):
+    # Flushed by hand; the background thread won't get to it first
+    return WriteBehindStore(backend, flush_interval=3600)
+
+
+def test_values_round_trip_compressed_or_not():
+    small, large = {"a": 1}, ["deposit"] * 500
+    assert encode(small).startswith(b"j")
+    assert encode(large).startswith(b"z")
+    assert decode(encode(small)) == small and decode(encode(large)) == large
+
+
+def test_writes_coalesce_until_flushed(store, backend):
+    for step in ("name", "email", "security"):
+        store.write({("s1", "step"): encode(step)})
+    store.write({("s1", "mode"): encode("account")})
+    # Buffered writes are read back before they reach the backend
+    assert decode(store.load("s1", ["step"])["step"]) == "security"
+    assert backend.batches == []
+
+    store.flush()
+    assert backend.batches == [{("s1", "step"): encode("security"), ("s1", "mode"): encode("account")}]
+    store.flush()
+    assert store.flushes == 1
+
+
+def test_failed_flush_is_retried_without_losing_newer_writes(backend):
+    backend.failures = 1
+    store = WriteBehindStore(backend, flush_interval=3600)
+    store.write({("s1", "step"): encode("name"), ("s1", "mode"): encode("account")})
+    with pytest.raises(ConnectionError):
+        store.flush()
+    store.write({("s1", "step"): encode("email")})
+    assert decode(store.load("s1", ["step"])["step"]) == "email"
+    store.flush()
+    assert backend.batches == [{("s1", "step"): encode("email"), ("s1", "mode"): encode("account")}]
+
+
+def test_deletes_hide_the_stored_value(store):
+    store.write({("s1", "step"): encode("name")})
+    store.flush()
+    store.write({("s1", "step"): None})
+    assert store.load("s1", ["step"]) == {}
+    store.flush()
+    assert store.load("s1", ["step"]) == {}
+
+
+def test_session_restores_after_a_reconnect(store, backend):
+    first = SessionSync(store, "s1", CODECS)
+    state = {"mode": "account", "step": "email"}
+    first.persist(state)
+    store.flush()
+
+    # Another replica, or this one after a restart
+    state = {}
+    SessionSync(store, "s1", CODECS).restore(state, ["mode", "step", "messages"])
+    assert state == {"mode": "account", "step": "email"}
+
+
+def test_persist_writes_only_what_changed(store, backend):
+    sync = SessionSync(store, "s1", CODECS)
+    state = {"mode": "chat", "messages": ["hi"]}
+    sync.persist(state)
+    store.flush()
+    sync.persist(state)
+    store.flush()
+    assert len(backend.batches) == 1
+
+    state["messages"].append("hello")
+    del state["mode"]
+    sync.persist(state)
+    store.flush()
+    assert backend.batches[-1] == {("s1", "messages"): encode(["hi", "hello"]), ("s1", "mode"): None}
+
+
+def test_restore_leaves_values_set_this_run_and_skips_unreadable_ones(store):
+    store.write({("s1", "mode"): encode("chat"), ("s1", "step"): b"?not a value"})
+    state = {"mode": "transaction"}
+    SessionSync(store, "s1", CODECS).restore(state, ["mode", "step"])
+    assert state == {"mode": "transaction"}
+
+
+def test_tabs_of_one_browser_keep_their_own_state(store):
+    token = "0" * 32
+    first = SessionSync(store, scoped_sid(token, "aaaa0000"), CODECS)
+    second = SessionSync(store, scoped_sid(token, "bbbb1111"), CODECS)
+    first.persist({"mode": "account", "step": "email"})
+    second.persist({"mode": "transaction", "step": "amount"})
+    store.flush()
+
+    for tab, expected in (("aaaa0000", "account"), ("bbbb1111", "transaction")):
+        state = {}
+        SessionSync(store, scoped_sid(token, tab), CODECS).restore(state, ["mode"])
+        assert state == {"mode": expected}
+    assert scoped_sid(token, "aaaa0000") != scoped_sid("1" * 32, "aaaa0000")
+
+
+def test_sqlite_backend_writes_and_purges(db_path):
+    store = SQLiteSessionStore(db_path)
+    store.write({("old", "mode"): encode("chat"), ("old", "step"): encode("name")})
+    assert store.load("old", ["mode", "messages"]) == {"mode": encode("chat")}
+    time.sleep(0.01)
+    cutoff = time.time()
+    store.write({("new", "mode"): encode("account")})
+    store.purge(older_than=cutoff)
+    assert store.load("old", ["mode", "step"]) == {}
+    assert store.load("new", ["mode"]) == {"mode": encode("account")}
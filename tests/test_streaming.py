@@ -0,0 +1,74 @@
+from collections import deque
+
+import pytest
+
+import streaming
+from fake_llm import DEFAULT_REPLIES, FakeStreamingChatModel
+from llm import ChatResources, ChatSession
+from streaming import StreamRenderer, stream_stats
+
+
+class Placeholder:
+    def __init__(self):
+        self.shown = []
+
+    def markdown(self, text):
+        self.shown.append(text)
+
+
+@pytest.fixture(autouse=True)
+def fresh_stats(monkeypatch):
+    monkeypatch.setattr(streaming, "_recent", deque(maxlen=1000))
+
+
+def test_chunks_reassemble_into_the_full_reply():
+    placeholder = Placeholder()
+    renderer = StreamRenderer(placeholder, flush_interval=60, flush_chars=20)
+    words = [f"word{i} " for i in range(30)]
+    for word in words:
+        renderer.write(word)
+    assert renderer.close() == "".join(words)
+    assert placeholder.shown[-1] == "".join(words)
+    # The first chunk right away, then about one update per flush_chars
+    assert placeholder.shown[0] == "word0 "
+    assert renderer.flushes < len(words) / 2
+    # Every update shows a longer prefix of the same reply
+    assert all(later.startswith(earlier) for earlier, later in zip(placeholder.shown, placeholder.shown[1:]))
+
+
+def test_updates_follow_the_interval():
+    placeholder = Placeholder()
+    renderer = StreamRenderer(placeholder, flush_interval=0, flush_chars=10 ** 6)
+    for word in ("a", "b", "c"):
+        renderer.write(word)
+    renderer.write("")
+    assert placeholder.shown == ["a", "ab", "abc"]
+    renderer.close()
+    assert renderer.flushes == 3
+
+
+def test_empty_stream_still_clears_the_placeholder():
+    placeholder = Placeholder()
+    renderer = StreamRenderer(placeholder)
+    assert renderer.close() == ""
+    assert placeholder.shown == [""]
+    assert renderer.time_to_first_token is None
+    assert stream_stats()["ttft_p50"] is None
+
+
+def test_streamed_model_reply_is_rendered_and_recorded():
+    fake = FakeStreamingChatModel(first_token_latency=0, token_delay=0.001, jitter=0)
+    session = ChatSession(ChatResources(fake, max_concurrency=1, acquire_timeout=5))
+    placeholder = Placeholder()
+    renderer = StreamRenderer(placeholder, flush_interval=0.005, flush_chars=16)
+    chunks = 0
+    for event in session.stream({"human_input": "how do deposits work"}):
+        renderer.write(event["text"])
+        chunks += 1
+    text = renderer.close()
+    assert text in DEFAULT_REPLIES
+    assert chunks > 1 and renderer.flushes <= chunks
+    assert session.history()[-1].content == text
+    stats = stream_stats()
+    assert stats["responses"] == 1
+    assert stats["ttft_p50"] <= stats["total_p50"]